@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from aiogram import Dispatcher, Router
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_bot import fake_bot  # noqa: E402
+from keyboards.callback_data import LEGACY_CALLBACKS, MenuCallback, PauseCallback, StatsCallback  # noqa: E402
+from utils.callback_router import CallbackRouter  # noqa: E402
+
+"""
+Микробенчмарк маршрутизации callback-кнопок.
+
+Сравнивает прежнюю схему (по обработчику с lambda-фильтром на каждую кнопку
+плюс обработчик по умолчанию) и таблицу CallbackRouter. Обработчики пустые,
+поэтому измеряется только стоимость выбора обработчика: время Dispatcher.feed_update
+за вычетом feed_update с единственным обработчиком без фильтров, и отдельно -
+CallbackRouter.resolve. Синхронные lambda-фильтры aiogram выполняет через
+asyncio.to_thread, поэтому каждая проверка в цепочке стоит переключения потока.
+
+Запуск: python -m benchmarks.callback_routing --iterations 2000 --repeats 3
+"""
+
+
+async def noop(callback: CallbackQuery):
+    return None
+
+
+def filter_chain_router() -> Router:
+    """Маршрутизация как раньше: фильтры проверяются по очереди"""
+    router = Router()
+    for old_data in LEGACY_CALLBACKS:
+        if old_data.startswith("pause_reason:") or old_data == "main_manu":
+            continue
+        router.callback_query.register(noop, lambda c, expected=old_data: c.data == expected)
+    router.callback_query.register(noop, lambda c: c.data.startswith("pause_reason:"))
+    router.callback_query.register(noop)
+    return router
+
+
+def table_router() -> Tuple[Router, CallbackRouter]:
+    """Маршрутизация по таблице с теми же кнопками"""
+    router = Router()
+    callbacks = CallbackRouter(router)
+    factories = {factory.__prefix__: factory for factory in (MenuCallback, StatsCallback, PauseCallback)}
+    for packed in set(LEGACY_CALLBACKS.values()):
+        prefix, key = packed.split(":")[:2]
+        callbacks.handler(factories[prefix], key)(noop)
+    callbacks.fallback(noop)
+    return router, callbacks
+
+
+def baseline_router() -> Router:
+    """Один обработчик без фильтров - собственная стоимость feed_update"""
+    router = Router()
+    router.callback_query.register(noop)
+    return router
+
+
+def make_update(data: str) -> Update:
+    user = User(id=1, is_bot=False, first_name="Bench")
+    message = Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"), text="menu")
+    return Update(
+        update_id=1,
+        callback_query=CallbackQuery(id="1", from_user=user, chat_instance="bench", data=data, message=message)
+    )
+
+
+async def measure(router: Router, data: List[str], iterations: int) -> float:
+    """Среднее время feed_update на один callback, мкс"""
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = fake_bot()
+
+    for item in data:  # Прогрев
+        await dp.feed_update(bot, make_update(item))
+
+    # Апдейты создаются заранее и не переиспользуются: aiogram привязывает их к боту
+    updates = [make_update(data[i % len(data)]) for i in range(iterations)]
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def measure_resolve(resolve: Callable[[str], object], data: List[str], iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        resolve(data[i % len(data)])
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main(iterations: int, repeats: int):
+    old_data = [item for item in LEGACY_CALLBACKS if item != "main_manu"]
+    new_data = [LEGACY_CALLBACKS[item] for item in old_data]
+    last_old, last_new = ["pause_reason:none"], [LEGACY_CALLBACKS["pause_reason:none"]]
+
+    schemes = {
+        "база": (baseline_router, new_data, new_data),
+        "цепочка lambda-фильтров": (filter_chain_router, old_data, last_old),
+        "таблица CallbackRouter": (lambda: table_router()[0], new_data, last_new),
+    }
+
+    # Схемы прогоняются по очереди несколько раз, берется лучший результат -
+    # так меньше влияют шум машины и прогрев
+    best = {title: [float("inf"), float("inf")] for title in schemes}
+    for _ in range(repeats):
+        for title, (make_router, all_buttons, last_button) in schemes.items():
+            best[title][0] = min(best[title][0], await measure(make_router(), all_buttons, iterations))
+            best[title][1] = min(best[title][1], await measure(make_router(), last_button, iterations))
+
+    baseline = best.pop("база")[0]
+    print(f"Кнопок: {len(old_data)}, итераций: {iterations} x {repeats}")
+    print(f"feed_update с одним обработчиком без фильтров (база): {baseline:.1f} мкс")
+    print(f"{'Маршрутизация сверх базы':<28}{'все кнопки, мкс':>18}{'последний фильтр, мкс':>24}")
+    for title, (all_buttons, last_button) in best.items():
+        print(f"{title:<28}{all_buttons - baseline:>18.1f}{last_button - baseline:>24.1f}")
+
+    _, callbacks = table_router()
+    print(f"CallbackRouter.resolve: {measure_resolve(callbacks.resolve, new_data, iterations * 10):.2f} мкс на callback")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Стоимость маршрутизации callback-кнопок")
+    parser.add_argument("--iterations", type=int, default=2000, help="Количество callback в одном прогоне")
+    parser.add_argument("--repeats", type=int, default=3, help="Сколько раз прогнать каждую схему")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.iterations, args.repeats))
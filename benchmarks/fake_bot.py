@@ -0,0 +1,52 @@
+import asyncio
+import itertools
+from datetime import datetime
+from typing import List
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendDocument, SendMessage, TelegramMethod
+from aiogram.types import Chat, Message
+
+"""
+Бот без сети для локальных прогонов: все запросы к Bot API записываются,
+sendMessage/editMessageText/sendDocument возвращают правдоподобное сообщение,
+остальные методы - True.
+"""
+
+MESSAGE_METHODS = (SendMessage, EditMessageText, SendDocument)
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API, которая ничего не отправляет в Telegram"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency  # Имитация сетевой задержки запроса, сек
+        self.calls: List[TelegramMethod] = []
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls.append(method)
+
+        if isinstance(method, MESSAGE_METHODS):
+            return Message(
+                message_id=getattr(method, "message_id", None) or next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=getattr(method, "text", None)
+            )
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def fake_bot(latency: float = 0.0) -> Bot:
+    """Bot с FakeSession (токен произвольный, но валидный по формату)"""
+    return Bot(token="123456:fake-token", session=FakeSession(latency))
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+"""
+Нагрузочный прогон диспетчера целиком.
+
+Собирает настоящий Dispatcher из bot.py (хранилище состояний, middleware,
+роутеры handlers/) с ботом без сети (benchmarks/fake_bot.py) и временной
+SQLite-БД, заранее заполненной --rows рабочими сессиями и паузами
+(как в benchmarks/query_plans.py). Затем --users синтетических пользователей
+одновременно (не больше --concurrency сразу) проходят сценарий:
+
+    /start, /start_work, кнопка "Пауза", причина паузы, "Завершить паузу", /today, /week
+
+Апдейты подаются через dp.feed_update. Шаги одного пользователя идут по порядку,
+как в Telegram. С --pipelined все шаги пользователя подаются сразу, не дожидаясь
+ответа (как пачка апдейтов из одного getUpdates): порядок держит UserOrderIsolation,
+а в конце проверяется, что у каждого пользователя записана завершенная пауза.
+Печатаются p50/p95/p99 времени обработки по шагам и в целом,
+апдейтов в секунду, запросов к Bot API и ошибок обработчиков.
+
+Запуск: python -m benchmarks.load_test --users 2000 --concurrency 100 --rows 100000
+"""
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'load.db')}"
+os.environ["LOG_FILE"] = os.path.join(_tmp.name, "load.log")
+os.environ.setdefault("BOT_TOKEN", "123456:fake-token")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.types import CallbackQuery, Chat, Message, MessageEntity, Update, User  # noqa: E402
+
+from benchmarks.fake_bot import fake_bot  # noqa: E402
+from benchmarks.query_plans import seed  # noqa: E402
+from bot import create_dispatcher  # noqa: E402
+from database import AsyncSessionLocal, engine, init_db, writer  # noqa: E402
+from keyboards.callback_data import MenuAction, MenuCallback, PauseAction, PauseCallback  # noqa: E402
+from services.metrics import ErrorCountHandler, metrics  # noqa: E402
+from services.session_state import session_state  # noqa: E402
+from utils.logger import setup_logging, stop_logging  # noqa: E402
+
+# Сценарий пользователя: (название шага, команда или данные кнопки)
+SCENARIO = [
+    ("/start", "/start"),
+    ("/start_work", "/start_work"),
+    ("menu:pause", MenuCallback(action=MenuAction.PAUSE).pack()),
+    ("pause:reason", PauseCallback(action=PauseAction.REASON, reason="lunch").pack()),
+    ("pause:stop", PauseCallback(action=PauseAction.STOP).pack()),
+    ("/today", "/today"),
+    ("/week", "/week"),
+]
+
+_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name=f"User{user_id}")
+
+
+def message_update(user_id: int, text: str) -> Update:
+    """Апдейт с командой (каждый раз новый объект - aiogram не должен видеть повторы)"""
+    return Update(
+        update_id=next(_ids),
+        message=Message(
+            message_id=next(_ids),
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=_user(user_id),
+            text=text,
+            entities=[MessageEntity(type="bot_command", offset=0, length=len(text.split()[0]))]
+        )
+    )
+
+
+def callback_update(user_id: int, data: str) -> Update:
+    """Апдейт с нажатием кнопки под сообщением бота"""
+    return Update(
+        update_id=next(_ids),
+        callback_query=CallbackQuery(
+            id=str(next(_ids)),
+            from_user=_user(user_id),
+            chat_instance=str(user_id),
+            data=data,
+            message=Message(
+                message_id=1,
+                date=datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                text="menu"
+            )
+        )
+    )
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def report_line(name: str, values: List[float]) -> str:
+    return (f"{name:<14} n={len(values):<7} p50={percentile(values, 0.5) * 1000:7.1f} мс  "
+            f"p95={percentile(values, 0.95) * 1000:7.1f} мс  p99={percentile(values, 0.99) * 1000:7.1f} мс  "
+            f"макс={max(values) * 1000:7.1f} мс")
+
+
+def users_with_finished_pause(path: str, users: int) -> int:
+    """Сколько синтетических пользователей (telegram_id 1..users) прошли сценарий до конца паузы"""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT COUNT(DISTINCT u.telegram_id) FROM users u "
+            "JOIN work_sessions s ON s.user_id = u.id "
+            "JOIN pauses p ON p.session_id = s.id "
+            "WHERE u.telegram_id <= ? AND p.end_time IS NOT NULL",
+            (users,)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def main(users: int, concurrency: int, rows: int, seed_users: int, latency: float,
+               group_commit: bool = True, pipelined: bool = False) -> bool:
+    setup_logging(console=False)
+    error_counter = ErrorCountHandler()
+    logging.getLogger().addHandler(error_counter)
+
+    await init_db()
+    if rows:
+        # Исторические данные других сотрудников (telegram_id от 1 000 001, не пересекаются с синтетическими)
+        print(f"Заполнение БД: {rows} сессий и {rows} пауз для {seed_users} пользователей...")
+        seed(os.environ["DATABASE_URL"].split("///", 1)[1], rows, seed_users)
+    async with AsyncSessionLocal() as db:
+        await session_state.load(db)
+    if group_commit:
+        writer.start()
+
+    bot = fake_bot(latency)
+    dp = create_dispatcher()
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_step(user_id: int, step: str, payload: str):
+        nonlocal failures
+        update = message_update(user_id, payload) if payload.startswith("/") else callback_update(user_id, payload)
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            failures += 1
+        latencies[step].append(time.perf_counter() - started)
+
+    async def run_user(user_id: int):
+        async with semaphore:
+            if pipelined:
+                await asyncio.gather(*(run_step(user_id, step, payload) for step, payload in SCENARIO))
+            else:
+                for step, payload in SCENARIO:
+                    await run_step(user_id, step, payload)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_user(user_id) for user_id in range(1, users + 1)))
+    elapsed = time.perf_counter() - started
+
+    await dp.storage.close()
+    await writer.stop()
+    await engine.dispose()
+    logging.getLogger().removeHandler(error_counter)
+    stop_logging()
+
+    completed = users_with_finished_pause(os.environ["DATABASE_URL"].split("///", 1)[1], users)
+    all_latencies = [value for values in latencies.values() for value in values]
+    handler_errors = sum(metrics.handler_errors.values())
+
+    print(f"Пользователей: {users}, одновременно: {concurrency}, строк в БД: {rows}, "
+          f"задержка Bot API: {latency * 1000:.0f} мс")
+    for step, _ in SCENARIO:
+        print(report_line(step, latencies[step]))
+    print(report_line("всего", all_latencies))
+    print(f"Апдейтов: {len(all_latencies)} за {elapsed:.2f} с, {len(all_latencies) / elapsed:.0f} апдейтов/с "
+          f"(среднее {statistics.mean(all_latencies) * 1000:.1f} мс)")
+    if group_commit:
+        print(f"Групповая фиксация: {writer.writes} записей в {writer.batches} транзакциях, "
+              f"повторов из-за блокировок: {writer.retries}")
+    print(f"Запросов к Bot API: {len(bot.session.calls)}, исключений: {failures}, "
+          f"ошибок обработчиков: {handler_errors}")
+    for handler, count in sorted(metrics.handler_errors.items()):
+        print(f"  {handler}: {count}")
+    print(f"Сценарий пройден до конца паузы: {completed} из {users} пользователей"
+          f"{' (шаги подавались без ожидания ответа)' if pipelined else ''}")
+    return not failures and not handler_errors and completed == users
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон диспетчера синтетическими пользователями")
+    parser.add_argument("--users", type=int, default=2000, help="Количество синтетических пользователей")
+    parser.add_argument("--concurrency", type=int, default=100, help="Пользователей одновременно")
+    parser.add_argument("--rows", type=int, default=100_000, help="Сессий (и пауз) в БД перед прогоном")
+    parser.add_argument("--seed-users", type=int, default=1000, help="Пользователей в исторических данных")
+    parser.add_argument("--latency", type=float, default=0.0, help="Имитация задержки Bot API, сек")
+    parser.add_argument("--no-group-commit", action="store_true", help="Писать без общей пишущей задачи")
+    parser.add_argument("--pipelined", action="store_true", help="Подавать шаги пользователя сразу, не дожидаясь ответа")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args.users, args.concurrency, args.rows, args.seed_users, args.latency,
+                              group_commit=not args.no_group_commit, pipelined=args.pipelined))
+    sys.exit(0 if result else 1)
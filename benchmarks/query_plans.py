@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from migrations import migrate  # noqa: E402
+from services.notification import ReminderScheduler  # noqa: E402
+
+"""
+Проверка планов запросов: каждый горячий запрос должен идти по индексу.
+
+Скрипт создает временную SQLite-БД, заполняет ее --rows рабочими сессиями
+и таким же числом пауз, выполняет реальные функции database.py, которые вызывают
+обработчики, и запросы планировщика напоминаний, перехватывает отправленный SQL
+и прогоняет его через EXPLAIN QUERY PLAN. Полный просмотр таблицы (SCAN без индекса)
+считается ошибкой; просмотр промежуточного результата (SCAN (subquery-N)) - нет.
+
+Запуск: python -m benchmarks.query_plans --rows 1000000
+"""
+
+
+def seed(path: str, rows: int, users: int) -> None:
+    """Быстрое заполнение БД напрямую через sqlite3"""
+    conn = sqlite3.connect(path)
+    now = datetime.utcnow()
+
+    conn.executemany(
+        "INSERT INTO users (id, telegram_id, username, is_admin, created_at, updated_at) VALUES (?, ?, ?, 0, ?, ?)",
+        ((i, 1_000_000 + i, f"user{i}", now, now) for i in range(1, users + 1))
+    )
+
+    def sessions():
+        for i in range(1, rows + 1):
+            user_id = (i % users) + 1
+            start = now - timedelta(days=(rows - i) // users, hours=random.randint(0, 8))
+            # Последняя сессия каждого пользователя остается открытой
+            end = None if i > rows - users else start + timedelta(hours=8)
+            yield i, user_id, start, start, end, "seed", 600, start
+
+    conn.executemany(
+        "INSERT INTO work_sessions (id, user_id, date, start_time, end_time, description, total_pause_seconds, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        sessions()
+    )
+
+    def pauses():
+        for i in range(1, rows + 1):
+            start = now - timedelta(minutes=i % 600)
+            end = None if i > rows - users else start + timedelta(minutes=10)
+            yield i, i, start, end, "seed", start
+
+    conn.executemany(
+        "INSERT INTO pauses (id, session_id, start_time, end_time, reason, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        pauses()
+    )
+    conn.commit()
+    conn.close()
+
+
+class PlanScheduler(ReminderScheduler):
+    """Планировщик, который только выполняет запрос "кому пора" и ничего не рассылает"""
+
+    async def _notify(self, query, kind, now, render) -> int:
+        async with self.session_pool() as db:
+            return len((await db.execute(query)).all())
+
+
+async def capture_queries(url: str, users: int) -> List[Tuple[str, str, tuple]]:
+    """Выполнить горячие функции database.py и вернуть отправленный ими SQL"""
+    engine = create_async_engine(url)
+    session_pool = async_sessionmaker(bind=engine, expire_on_commit=False)
+    captured = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, tuple(parameters)))
+
+    user_id = users // 2
+    now = datetime.utcnow()
+    scheduler = PlanScheduler(bot=None, session_pool=session_pool)
+    # Напоминание "начните день" запрашивает БД только в рабочие часы рабочего дня
+    workday = scheduler._next_workday_start(now - timedelta(days=7)) + timedelta(minutes=1)
+    calls = [
+        ("get_user_by_telegram_id", lambda db: database.get_user_by_telegram_id(db, 1_000_000 + user_id)),
+        ("get_user_state", lambda db: database.get_user_state(db, 1_000_000 + user_id)),
+        ("get_active_session", lambda db: database.get_active_session(db, user_id)),
+        ("get_active_pause", lambda db: database.get_active_pause(db, 12345)),
+        ("get_today_sessions", lambda db: database.get_today_sessions(db, user_id)),
+        ("get_sessions_daily_stats",
+         lambda db: database.get_sessions_daily_stats(db, user_id, since=now - timedelta(days=7))),
+        ("get_period_stats (день)", lambda db: database.get_period_stats(db, user_id, "day", now.date())),
+        ("get_period_stats (недели)",
+         lambda db: database.get_period_stats(db, user_id, "week", now.date().replace(day=1))),
+        ("get_period_stats (месяцы)", lambda db: database.get_period_stats(db, user_id, "month")),
+        ("reminder_start_day", lambda db: scheduler._run_start_day(workday)),
+        ("reminder_long_pause", lambda db: scheduler._run_long_pause(now)),
+        ("reminder_forgot_stop", lambda db: scheduler._run_forgot_stop(now)),
+    ]
+
+    results = []
+    async with session_pool() as db:
+        for name, call in calls:
+            database.user_cache.clear()
+            captured.clear()
+            await call(db)
+            for statement, parameters in captured:
+                results.append((name, statement, parameters))
+
+    await engine.dispose()
+    return results
+
+
+def explain(path: str, queries: List[Tuple[str, str, tuple]]) -> bool:
+    """Напечатать планы запросов; False, если хоть один запрос читает таблицу целиком"""
+    conn = sqlite3.connect(path)
+    all_ok = True
+
+    for name, statement, parameters in queries:
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+        full_scans = [
+            step for step in plan
+            if step.startswith("SCAN") and "USING" not in step and not step.startswith("SCAN (subquery")
+        ]
+        ok = not full_scans
+        all_ok = all_ok and ok
+
+        print(f"{'✅' if ok else '❌'} {name}")
+        for step in plan:
+            print(f"     {step}")
+
+    conn.close()
+    return all_ok
+
+
+async def main(rows: int, users: int, path: str) -> bool:
+    url = f"sqlite+aiosqlite:///{path}"
+
+    # Схема: create_all + миграции, как при запуске бота
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    await migrate(engine)
+    await engine.dispose()
+
+    print(f"Заполнение БД: {rows} сессий и {rows} пауз для {users} пользователей...")
+    seed(path, rows, users)
+
+    # Дневные сводки по заполненным сессиям (как после миграции на рабочей БД)
+    engine = create_async_engine(url)
+    async with async_sessionmaker(bind=engine)() as db:
+        await database.rebuild_daily_stats(db)
+        await db.commit()
+    await engine.dispose()
+
+    queries = await capture_queries(url, users)
+    return explain(path, queries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка использования индексов горячими запросами")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Количество сессий (и пауз)")
+    parser.add_argument("--users", type=int, default=10_000, help="Количество пользователей")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ok = asyncio.run(main(args.rows, args.users, os.path.join(tmp, "plans.db")))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import itertools
+import os
+import re
+import signal
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+"""
+Сравнение одного и N процессов-воркеров (BOT_WORKERS) на одинаковой нагрузке.
+
+Фронт (этот процесс) запускает воркеры через ShardSupervisor - те же
+bot.shard_worker_main, что и в боте, но с ботом без сети (benchmarks/fake_bot.py),
+и раздает им апдейты через ShardRouter по from_user.id. БД - временная SQLite,
+заранее заполненная --rows сессиями и паузами (как в benchmarks/load_test.py).
+
+Каждый прогон - --users новых пользователей, каждый проходит сценарий load_test:
+
+    /start, /start_work, кнопка "Пауза", причина паузы, "Завершить паузу", /today, /week
+
+Все апдейты подаются сразу (порядок шагов пользователя держат фронт и воркер).
+Окончание обработки определяется по счетчикам обработчиков в /metrics воркеров.
+Печатаются апдейтов в секунду для 1 и --workers воркеров и проверяется, что
+у каждого пользователя записана завершенная пауза.
+
+Лимиты отправки Telegram (BOT_GLOBAL_RATE, BOT_CHAT_RATE) в прогоне сняты.
+Масштабирование ограничено числом ядер (os.cpu_count()) и одной пишущей
+транзакцией SQLite на всю БД.
+
+Запуск: python -m benchmarks.sharding --workers 4 --users 1000 --rows 100000
+"""
+
+# Временная БД и порты метрик - общие для фронта и воркеров (spawn наследует окружение)
+if "SHARDING_BENCH_DIR" not in os.environ:
+    _tmp = tempfile.TemporaryDirectory()
+    os.environ["SHARDING_BENCH_DIR"] = _tmp.name
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'sharding.db')}"
+    os.environ["LOG_FILE"] = os.path.join(_tmp.name, "sharding.log")
+    os.environ.setdefault("METRICS_PORT", "9300")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Лимиты Telegram на отправку (OutboundQueue воркеров) ограничили бы прогон ими самими
+    os.environ.setdefault("BOT_GLOBAL_RATE", "1000000")
+    os.environ.setdefault("BOT_CHAT_RATE", "1000000")
+    os.environ.setdefault("BOT_CHAT_BURST", "1000000")
+    os.environ.setdefault("BOT_TOKEN", "123456:fake-token")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession  # noqa: E402
+
+from benchmarks.fake_bot import fake_bot  # noqa: E402
+from benchmarks.query_plans import seed  # noqa: E402
+from bot import shard_worker_main  # noqa: E402
+from config import config  # noqa: E402
+from database import engine, init_db  # noqa: E402
+from keyboards.callback_data import MenuAction, MenuCallback, PauseAction, PauseCallback  # noqa: E402
+from services.sharding import ShardRouter, ShardSupervisor  # noqa: E402
+
+SCENARIO = [
+    "/start",
+    "/start_work",
+    MenuCallback(action=MenuAction.PAUSE).pack(),
+    PauseCallback(action=PauseAction.REASON, reason="lunch").pack(),
+    PauseCallback(action=PauseAction.STOP).pack(),
+    "/today",
+    "/week",
+]
+
+HANDLED_RE = re.compile(r"^bot_handler_duration_seconds_count\{[^}]*\} (\d+)$", re.MULTILINE)
+ERRORS_RE = re.compile(r"^bot_handler_errors_total\{[^}]*\} (\d+)$", re.MULTILINE)
+
+_ids = itertools.count(1)
+
+
+def bench_worker(index: int, workers: int, port: int, secret: str, latency: float) -> None:
+    """Процесс-воркер с ботом без сети"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(shard_worker_main(index, workers, port, secret, bot=fake_bot(latency)))
+
+
+def step_update(user_id: int, payload: str) -> Dict:
+    """Апдейт шага сценария в формате Bot API"""
+    author = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+    chat = {"id": user_id, "type": "private"}
+    now = int(datetime.now().timestamp())
+    if payload.startswith("/"):
+        return {
+            "update_id": next(_ids),
+            "message": {
+                "message_id": next(_ids), "date": now, "chat": chat, "from": author, "text": payload,
+                "entities": [{"type": "bot_command", "offset": 0, "length": len(payload)}]
+            }
+        }
+    return {
+        "update_id": next(_ids),
+        "callback_query": {
+            "id": str(next(_ids)), "from": author, "chat_instance": str(user_id), "data": payload,
+            "message": {"message_id": 1, "date": now, "chat": chat, "text": "menu"}
+        }
+    }
+
+
+async def worker_counters(http: ClientSession, workers: int) -> List[Dict[str, int]]:
+    """Обработано апдейтов и ошибок обработчиков по /metrics каждого воркера"""
+    counters = []
+    for index in range(workers):
+        url = f"http://{config.bot.metrics_host}:{config.bot.metrics_port + 1 + index}/metrics"
+        async with http.get(url) as response:
+            text = await response.text()
+        counters.append({
+            "handled": sum(map(int, HANDLED_RE.findall(text))),
+            "errors": sum(map(int, ERRORS_RE.findall(text))),
+        })
+    return counters
+
+
+def users_with_finished_pause(first_user: int, last_user: int) -> int:
+    conn = sqlite3.connect(config.db.url.split("///", 1)[1])
+    try:
+        return conn.execute(
+            "SELECT COUNT(DISTINCT u.telegram_id) FROM users u "
+            "JOIN work_sessions s ON s.user_id = u.id "
+            "JOIN pauses p ON p.session_id = s.id "
+            "WHERE u.telegram_id BETWEEN ? AND ? AND p.end_time IS NOT NULL",
+            (first_user, last_user)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def run(workers: int, first_user: int, users: int, latency: float, base_port: int,
+              timeout: float) -> Dict:
+    """Один прогон: запустить воркеры, подать сценарий users пользователей, дождаться обработки"""
+    supervisor = ShardSupervisor(workers, target=bench_worker, base_port=base_port, args=(latency,))
+    await supervisor.start()
+    router = ShardRouter(supervisor.urls, config.bot.webhook_path, supervisor.secret)
+    router.start()
+    total = users * len(SCENARIO)
+
+    try:
+        async with ClientSession() as http:
+            started = time.perf_counter()
+            for payload in SCENARIO:
+                for user_id in range(first_user, first_user + users):
+                    await router.route(step_update(user_id, payload))
+            await router.join()
+
+            deadline = started + timeout
+            while True:
+                counters = await worker_counters(http, workers)
+                handled = sum(c["handled"] for c in counters)
+                if handled >= total or time.perf_counter() > deadline:
+                    break
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - started
+    finally:
+        await router.stop()
+        await supervisor.stop()
+
+    return {
+        "workers": workers,
+        "handled": handled,
+        "total": total,
+        "elapsed": elapsed,
+        "per_worker": [c["handled"] for c in counters],
+        "errors": sum(c["errors"] for c in counters),
+        "completed": users_with_finished_pause(first_user, first_user + users - 1),
+        "users": users,
+    }
+
+
+async def main(workers: int, users: int, rows: int, seed_users: int, latency: float, base_port: int,
+               timeout: float) -> bool:
+    await init_db()
+    await engine.dispose()
+    if rows:
+        print(f"Заполнение БД: {rows} сессий и {rows} пауз для {seed_users} пользователей...")
+        seed(config.db.url.split("///", 1)[1], rows, seed_users)
+
+    print(f"Ядер: {os.cpu_count()}, пользователей на прогон: {users}, шагов: {len(SCENARIO)}, "
+          f"задержка Bot API: {latency * 1000:.0f} мс")
+    ok = True
+    results = []
+    # Новые пользователи в каждом прогоне: сценарий начинается с /start и /start_work
+    for run_index, count in enumerate(sorted({1, workers})):
+        result = await run(count, run_index * users + 1, users, latency, base_port, timeout)
+        results.append(result)
+        ok &= result["handled"] >= result["total"] and result["completed"] == users
+        print(f"воркеров: {count:<3} {result['handled']} из {result['total']} апдейтов за "
+              f"{result['elapsed']:.2f} с, {result['handled'] / result['elapsed']:.0f} апдейтов/с; "
+              f"по воркерам: {result['per_worker']}; ошибок обработчиков: {result['errors']}; "
+              f"пауза завершена у {result['completed']} из {users}")
+
+    if len(results) == 2:
+        single, sharded = results
+        speedup = (sharded["handled"] / sharded["elapsed"]) / (single["handled"] / single["elapsed"])
+        print(f"Ускорение {workers} воркеров относительно одного: x{speedup:.2f}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пропускная способность 1 и N процессов-воркеров")
+    # Минимум 2: на одноядерной машине прогоны 1 и N иначе совпали бы и сравнивать было бы нечего
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 2), help="Воркеров во втором прогоне")
+    parser.add_argument("--users", type=int, default=1000, help="Пользователей на прогон")
+    parser.add_argument("--rows", type=int, default=100_000, help="Сессий (и пауз) в БД перед прогоном")
+    parser.add_argument("--seed-users", type=int, default=1000, help="Пользователей в исторических данных")
+    parser.add_argument("--latency", type=float, default=0.0, help="Имитация задержки Bot API, сек")
+    parser.add_argument("--base-port", type=int, default=8300, help="Порт первого воркера")
+    parser.add_argument("--timeout", type=float, default=300, help="Сколько ждать обработки всех апдейтов, сек")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args.workers, args.users, args.rows, args.seed_users, args.latency, args.base_port,
+                              args.timeout))
+    sys.exit(0 if result else 1)
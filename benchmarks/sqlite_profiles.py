@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+from benchmarks.query_plans import seed  # noqa: E402
+from config import SQLITE_PROFILES, DatabaseConfig  # noqa: E402
+from migrations import migrate  # noqa: E402
+from services.write_batcher import GroupCommitWriter  # noqa: E402
+
+"""
+Сравнение профилей SQLite (config.SQLITE_PROFILES) на заполненной БД.
+
+Для каждого профиля создается своя временная БД с --rows сессиями и паузами,
+движок собирается database.make_engine() с этим профилем, затем --concurrency
+задач выполняют:
+
+- запись, транзакция на каждую запись: рабочий день пользователя
+  (create_work_session + stop_work_session, с обновлением daily_stats) + commit();
+- та же запись через GroupCommitWriter (как в боте);
+- чтение: get_active_session + get_period_stats по случайным пользователям.
+
+Печатаются операции в секунду и число ошибок ("database is locked").
+
+Запуск: python -m benchmarks.sqlite_profiles --rows 100000 --writes 2000 --reads 5000
+"""
+
+
+async def run_concurrently(count: int, concurrency: int, operation: Callable[[int], Awaitable[None]]) -> Dict:
+    """Выполнить count операций не больше concurrency одновременно; вернуть скорость и число ошибок"""
+    errors = 0
+    counter = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            try:
+                await operation(i)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"rate": (count - errors) / elapsed, "errors": errors}
+
+
+async def bench_profile(name: str, path: str, rows: int, users: int, writes: int, reads: int,
+                        concurrency: int) -> Dict[str, Dict]:
+    db_config = DatabaseConfig(url=f"sqlite:///{path}", sqlite_profile=name)
+    engine = database.make_engine(db_config)
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.create_all)
+    await migrate(engine)
+    await engine.dispose()
+    seed(path, rows, users)
+    # Закрываем открытые сессии сида: у пользователя может быть только одна открытая
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE work_sessions SET end_time = start_time WHERE end_time IS NULL")
+    conn.commit()
+    conn.close()
+
+    # Новый движок после заполнения. Первое соединение открываем заранее:
+    # SQLAlchemy инициализирует диалект на первом соединении под блокировкой,
+    # и одновременные первые подключения из многих задач зависают (в боте так делает init_db)
+    engine = database.make_engine(db_config)
+    async with engine.connect():
+        pass
+
+    session_pool = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def work_day(db, user_id: int):
+        session = await database.create_work_session(db, user_id, "bench")
+        await database.stop_work_session(db, session.id)
+
+    # Пользователь i-й операции: одновременные операции не касаются одного пользователя
+    async def write_each(i: int):
+        async with session_pool() as db:
+            await work_day(db, i % users + 1)
+            await db.commit()
+
+    writer = GroupCommitWriter(session_pool)
+
+    async def write_grouped(i: int):
+        await writer.run(work_day, i % users + 1)
+
+    async def read(i: int):
+        user_id = i % users + 1
+        async with session_pool() as db:
+            await database.get_active_session(db, user_id)
+            await database.get_period_stats(db, user_id, "day")
+
+    results = {"write": await run_concurrently(writes, concurrency, write_each)}
+    writer.start()
+    results["group"] = await run_concurrently(writes, concurrency, write_grouped)
+    await writer.stop()
+    results["read"] = await run_concurrently(reads, concurrency, read)
+
+    await engine.dispose()
+    return results
+
+
+async def main(rows: int, users: int, writes: int, reads: int, concurrency: int):
+    print(f"БД: {rows} сессий и пауз, {users} пользователей; "
+          f"{writes} записей и {reads} чтений, одновременно {concurrency}")
+    print(f"{'профиль':<12} {'запись/с':>10} {'ошибок':>7} {'group/с':>10} {'ошибок':>7} {'чтение/с':>10} {'ошибок':>7}")
+
+    for name in SQLITE_PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = await bench_profile(name, os.path.join(tmp, f"{name}.db"), rows, users, writes, reads,
+                                          concurrency)
+        write, group, read = results["write"], results["group"], results["read"]
+        print(f"{name:<12} {write['rate']:>10.0f} {write['errors']:>7} {group['rate']:>10.0f} {group['errors']:>7} "
+              f"{read['rate']:>10.0f} {read['errors']:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Скорость записи и чтения для профилей SQLite")
+    parser.add_argument("--rows", type=int, default=100_000, help="Количество сессий (и пауз) в БД")
+    parser.add_argument("--users", type=int, default=1000, help="Количество пользователей")
+    parser.add_argument("--writes", type=int, default=2000, help="Записей на профиль")
+    parser.add_argument("--reads", type=int, default=5000, help="Чтений на профиль")
+    parser.add_argument("--concurrency", type=int, default=20, help="Одновременных операций")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.rows, args.users, args.writes, args.reads, args.concurrency))
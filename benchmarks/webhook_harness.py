@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import itertools
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List
+
+"""
+Локальная проверка режима webhook.
+
+Поднимает то же aiohttp-приложение, что и bot.py в режиме BOT_MODE=webhook
+(тот же Dispatcher с middleware и роутерами), на 127.0.0.1 с ботом без сети
+(benchmarks/fake_bot.py) и временной SQLite-БД, затем POST-ит синтетические
+апдейты /start, /start_work, /today с заголовком секретного токена.
+
+Проверяется: запрос без секрета получает 401, каждый апдейт получает 200,
+на каждый апдейт бот отвечает. Печатается время ответа HTTP и время
+до отправки ответа ботом.
+
+Запуск: python -m benchmarks.webhook_harness --users 200 --concurrency 10
+"""
+
+SECRET = "harness-secret"
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'webhook.db')}"
+os.environ["WEBHOOK_SECRET"] = SECRET
+os.environ.setdefault("BOT_TOKEN", "123456:fake-token")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import ClientSession, web  # noqa: E402
+
+from benchmarks.fake_bot import fake_bot  # noqa: E402
+from bot import create_dispatcher, create_webhook_app  # noqa: E402
+from config import config  # noqa: E402
+from database import AsyncSessionLocal, engine, init_db, writer  # noqa: E402
+from services.session_state import session_state  # noqa: E402
+
+_ids = itertools.count(1)
+
+
+def message_update(user_id: int, text: str) -> dict:
+    """Апдейт с текстовым сообщением в формате Bot API"""
+    return {
+        "update_id": next(_ids),
+        "message": {
+            "message_id": next(_ids),
+            "date": int(datetime.now().timestamp()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        }
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def main(users: int, concurrency: int) -> bool:
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        await session_state.load(db)
+    writer.start()
+
+    bot = fake_bot()
+    dp = create_dispatcher()
+
+    # Счетчик полностью обработанных апдейтов (обработка идет в фоне после ответа 200)
+    handled = 0
+    posted_at = {}  # update_id -> время отправки POST
+    processing_latencies = []
+
+    async def count_handled(handler, event, data):
+        nonlocal handled
+        try:
+            return await handler(event, data)
+        finally:
+            handled += 1
+            processing_latencies.append(time.perf_counter() - posted_at[event.update_id])
+
+    dp.update.outer_middleware(count_handled)
+    runner = web.AppRunner(create_webhook_app(dp, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, host="127.0.0.1", port=0)
+    await site.start()
+    port = runner.addresses[0][1]
+    url = f"http://127.0.0.1:{port}{config.bot.webhook_path}"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    ok = True
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with ClientSession() as http:
+        async with http.post(url, json=message_update(1, "/start")) as response:
+            print(f"Без секретного токена: HTTP {response.status}")
+            ok &= response.status == 401
+
+        async def post(update: dict):
+            async with semaphore:
+                started = posted_at[update["update_id"]] = time.perf_counter()
+                async with http.post(url, json=update, headers=headers) as response:
+                    latencies.append(time.perf_counter() - started)
+                    return response.status
+
+        started = time.perf_counter()
+        statuses = []
+        # Команды одного пользователя идут по порядку, пользователи - параллельно
+        for command in ("/start", "/start_work", "/today"):
+            statuses += await asyncio.gather(*(post(message_update(user_id, command))
+                                               for user_id in range(1, users + 1)))
+            # Ждем, пока фоновые обработчики закончат все апдейты этой волны
+            while handled < len(statuses):
+                await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+
+    await runner.cleanup()
+    await writer.stop()
+    await engine.dispose()
+
+    total = len(statuses)
+    ok &= all(status == 200 for status in statuses)
+    print(f"Апдейтов: {total}, HTTP 200: {statuses.count(200)}, обработано: {handled}, "
+          f"запросов к Bot API: {len(bot.session.calls)}")
+    print(f"Время ответа HTTP: p50={percentile(latencies, 0.5) * 1000:.1f} мс, "
+          f"p95={percentile(latencies, 0.95) * 1000:.1f} мс, "
+          f"p99={percentile(latencies, 0.99) * 1000:.1f} мс, "
+          f"среднее={statistics.mean(latencies) * 1000:.1f} мс")
+    print(f"До окончания обработки: p50={percentile(processing_latencies, 0.5) * 1000:.1f} мс, "
+          f"p95={percentile(processing_latencies, 0.95) * 1000:.1f} мс, "
+          f"p99={percentile(processing_latencies, 0.99) * 1000:.1f} мс")
+    print(f"Всего: {elapsed:.2f} с, {total / elapsed:.0f} апдейтов/с")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Прогон синтетических апдейтов через webhook-сервер")
+    parser.add_argument("--users", type=int, default=200, help="Количество пользователей")
+    parser.add_argument("--concurrency", type=int, default=10, help="Одновременных HTTP-запросов")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(args.users, args.concurrency))
+    sys.exit(0 if result else 1)
@@ -1,56 +1,69 @@
 import asyncio
 import logging
+import signal
+from dataclasses import replace
+from typing import Optional
+
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.fsm.middleware import FSMContextMiddleware
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
+from aiogram.utils.backoff import Backoff, BackoffConfig
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
 from config import config
-from database import init_db
+from database import init_db, engine, AsyncSessionLocal, writer
+from middlewares.database import DbSessionMiddleware
+from middlewares.idempotency import IdempotencyMiddleware
+from middlewares.log_context import LogContextMiddleware
+from middlewares.metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from services.fsm_storage import DatabaseStorage
+from services.session_state import session_state
+from services.sharding import ShardRouter, ShardSupervisor
+from services.update_order import UserOrderIsolation
+from services.notification import ReminderScheduler
+from services.metrics import ErrorCountHandler, metrics, start_metrics_server
+from services.outbound_queue import OutboundQueue, OutboundQueueMiddleware, bulk_sends
+from utils.logger import get_logger, setup_logging, stop_logging
 
 """
 Основной файл для запуска Telegram бота.
 Точка входа в приложение.
 """
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
-async def main():
-    """Основная асинхронная функция запуска бота"""
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми middleware и роутерами (общий для polling и webhook)"""
 
-    logger.info("=" * 50)
-    logger.info("Запуск бота учета рабочего времени")
-    logger.info("=" * 50)
+    # 3. Создание диспетчера с хранилищем состояний
+    # (состояния в БД: переживают перезапуск, брошенные диалоги удаляются по TTL)
+    storage = DatabaseStorage(AsyncSessionLocal, writer=writer)
+    # Апдейты одного пользователя - строго по порядку (с его состоянием FSM),
+    # разных пользователей - параллельно, не больше max_concurrent_updates сразу
+    isolation = UserOrderIsolation(config.bot.max_concurrent_updates, registry=metrics)
+    dp = Dispatcher(storage=storage, events_isolation=isolation)
 
-    # 1. Инициализация базы данных
-    try:
-        init_db()
-        logger.info("✅ База данных инициализирована")
-    except Exception as e:
-        logger.error(f"❌ Ошибка инициализации БД: {e}")
-        return
+    # update_id и user_id апдейта в каждой записи лога
+    dp.update.outer_middleware(LogContextMiddleware())
 
-    # 2. Создание экземпляра бота с настройками
-    bot = Bot(
-        token=config.bot.token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    # Метрики: апдейты по типам, время и ошибки каждого обработчика
+    dp.update.outer_middleware(UpdateMetricsMiddleware(metrics))
+    dp.message.middleware(HandlerMetricsMiddleware(metrics))
+    dp.callback_query.middleware(HandlerMetricsMiddleware(metrics))
 
-    # 3. Создание диспетчера с хранилищем состояний
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    # Повторно доставленные апдейты и двойные нажатия не доходят до обработчиков и БД
+    dp.update.outer_middleware(IdempotencyMiddleware(
+        ring_size=config.bot.update_ring_size,
+        window=config.bot.double_tap_window,
+        registry=metrics
+    ))
+
+    # Одна сессия БД на каждый апдейт (передается в хендлеры аргументом db)
+    dp.update.middleware(DbSessionMiddleware(AsyncSessionLocal))
 
     # 4. Регистрация роутеров (handlers)
     # Сначала импортируем их
@@ -59,10 +72,12 @@ async def main():
         from handlers.time_tracking import router as time_router
         from handlers.stats import router as stats_router
         from handlers.callbacks import router as callbacks_router
+        from handlers.admin import router as admin_router
 
         dp.include_router(start_router)
         dp.include_router(time_router)
         dp.include_router(stats_router)
+        dp.include_router(admin_router)
         dp.include_router(callbacks_router)
 
         logger.info("✅ Роутеры зарегистрированы")
@@ -70,6 +85,264 @@ async def main():
         logger.warning(f"⚠️ Некоторые handlers не найдены: {e}")
         logger.warning("Создайте базовые handlers для продолжения")
 
+    return dp
+
+
+def create_webhook_app(dp: Dispatcher, bot: Bot, secret: Optional[str] = None) -> web.Application:
+    """
+    aiohttp-приложение, принимающее апдейты от Telegram на config.bot.webhook_path
+    (или от фронта в режиме воркеров - тогда со своим secret).
+
+    Запросы без правильного X-Telegram-Bot-Api-Secret-Token отклоняются (401).
+    Апдейт обрабатывается в фоне, Telegram сразу получает 200 OK.
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=secret or config.bot.webhook_secret or None,
+        handle_in_background=True
+    ).register(app, path=config.bot.webhook_path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def serve_webhook(dp: Dispatcher, bot: Bot, app: web.Application):
+    """
+    Регистрация вебхука в Telegram и HTTP-сервер с app до остановки процесса
+    (общее для одного процесса и фронта с воркерами)
+    """
+    if not config.bot.webhook_url:
+        raise ValueError("Для BOT_MODE=webhook нужно указать WEBHOOK_URL")
+
+    await bot.set_webhook(
+        url=config.bot.webhook_url.rstrip("/") + config.bot.webhook_path,
+        secret_token=config.bot.webhook_secret or None,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=False
+    )
+    logger.info(f"✅ Вебхук установлен: {config.bot.webhook_url.rstrip('/')}{config.bot.webhook_path}")
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.bot.webhook_host, port=config.bot.webhook_port)
+    await site.start()
+    logger.info(f"✅ HTTP-сервер слушает {config.bot.webhook_host}:{config.bot.webhook_port}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Вебхук в одном процессе: апдейты обрабатывает этот же диспетчер"""
+    await serve_webhook(dp, bot, create_webhook_app(dp, bot))
+
+
+def start_outbound(bot: Bot, global_rate: float) -> OutboundQueue:
+    """
+    Все исходящие сообщения бота - через очередь с лимитами Telegram (общий и на чат).
+    Время запросов к Bot API меряется без ожидания в очереди (middleware внутри очереди)
+    """
+    outbound = OutboundQueue(
+        global_rate=global_rate,
+        chat_rate=config.bot.chat_rate,
+        chat_burst=config.bot.chat_burst
+    )
+    bot.session.middleware(OutboundQueueMiddleware(outbound))
+    bot.session.middleware(ApiMetricsMiddleware(metrics))
+    outbound.start()
+    return outbound
+
+
+async def start_metrics(port: int) -> Optional[web.AppRunner]:
+    """Задержка event loop и HTTP-эндпоинт для Prometheus (port 0 - без эндпоинта)"""
+    metrics.start_loop_monitor()
+    if not port:
+        return None
+    try:
+        runner = await start_metrics_server(metrics, config.bot.metrics_host, port)
+    except OSError as e:
+        logger.error(f"❌ Не удалось запустить сервер метрик на порту {port}: {e}")
+        return None
+    logger.info(f"✅ Метрики: http://{config.bot.metrics_host}:{port}/metrics")
+    return runner
+
+
+# ==================== НЕСКОЛЬКО ПРОЦЕССОВ (BOT_WORKERS > 1) ====================
+
+async def poll_to_workers(dp: Dispatcher, bot: Bot, router: ShardRouter, polling_timeout: int = 30):
+    """Фронт в режиме polling: getUpdates и раздача апдейтов воркерам"""
+    await bot.delete_webhook()
+    allowed_updates = dp.resolve_used_update_types()
+    backoff = Backoff(BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1))
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=polling_timeout,
+                allowed_updates=allowed_updates,
+                request_timeout=int(bot.session.timeout + polling_timeout)
+            )
+        except Exception as e:
+            logger.error(f"❌ Не удалось получить апдейты: {e}, повтор через {backoff.next_delay:.1f} с")
+            await backoff.asleep()
+            continue
+        backoff.reset()
+        for update in updates:
+            offset = update.update_id + 1
+            await router.route(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+
+
+async def run_webhook_front(dp: Dispatcher, bot: Bot, router: ShardRouter):
+    """Фронт в режиме webhook: принимает апдейты от Telegram и раздает их воркерам"""
+    async def handle(request: web.Request) -> web.Response:
+        secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if config.bot.webhook_secret and secret != config.bot.webhook_secret:
+            return web.Response(status=401, text="Unauthorized")
+        await router.route(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(config.bot.webhook_path, handle)
+    await serve_webhook(dp, bot, app)
+
+
+async def run_sharded(dp: Dispatcher, bot: Bot):
+    """
+    Фронт: запускает config.bot.workers воркеров и раздает им апдейты по from_user.id.
+    Сам фронт апдейты не обрабатывает (только напоминания и служебные запросы).
+    """
+    supervisor = ShardSupervisor(config.bot.workers, target=run_shard_worker, base_port=config.bot.shard_base_port,
+                                 max_restarts=config.bot.worker_max_restarts)
+    await supervisor.start()
+    logger.info(f"✅ Воркеров запущено: {config.bot.workers}")
+
+    router = ShardRouter(supervisor.urls, config.bot.webhook_path, supervisor.secret,
+                         max_pending=config.bot.max_pending_updates)
+    router.start()
+    front = run_webhook_front(dp, bot, router) if config.bot.mode == "webhook" else poll_to_workers(dp, bot, router)
+    # Фронт работает, пока супервизор может держать воркеры запущенными
+    tasks = [asyncio.create_task(front), asyncio.create_task(supervisor.join())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await router.stop()
+        await supervisor.stop()
+
+
+def run_shard_worker(index: int, workers: int, port: int, secret: str) -> None:
+    """Точка входа процесса-воркера (запускается ShardSupervisor через multiprocessing)"""
+    # Ctrl+C получает вся группа процессов; воркеры останавливает фронт (SIGTERM)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(shard_worker_main(index, workers, port, secret))
+
+
+async def shard_worker_main(index: int, workers: int, port: int, secret: str, bot: Optional[Bot] = None):
+    """
+    Воркер: полный диспетчер, принимающий апдейты своей доли пользователей от фронта
+    на 127.0.0.1:port. Таблицы и миграции уже подготовлены фронтом, напоминания
+    отправляет фронт. Лимит сообщений бота в секунду делится между воркерами.
+    Останавливается по SIGTERM.
+    """
+    base, dot, ext = config.log.file.rpartition(".")
+    log_file = f"{base}.worker{index}.{ext}" if dot else f"{config.log.file}.worker{index}"
+    setup_logging(replace(config.log, file=log_file))
+    error_counter = ErrorCountHandler()
+    logging.getLogger().addHandler(error_counter)
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    # Первое соединение - заранее, до параллельной обработки апдейтов
+    async with engine.connect():
+        pass
+    async with AsyncSessionLocal() as db:
+        await session_state.load(db)
+    writer.start()
+
+    bot = bot or Bot(
+        token=config.bot.token,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    outbound = start_outbound(bot, config.bot.global_rate / workers)
+    # У каждого воркера свой эндпоинт: порт фронта + 1 + номер воркера
+    metrics_runner = await start_metrics(config.bot.metrics_port + 1 + index if config.bot.metrics_port else 0)
+
+    dp = create_dispatcher()
+    runner = web.AppRunner(create_webhook_app(dp, bot, secret))
+    await runner.setup()
+    await web.TCPSite(runner, host="127.0.0.1", port=port).start()
+    logger.info(f"✅ Воркер {index}/{workers} принимает апдейты на 127.0.0.1:{port}")
+
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()  # Закрывает и хранилище состояний (shutdown диспетчера)
+        await outbound.stop()
+        await writer.stop()
+        await metrics.stop_loop_monitor()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await bot.session.close()
+        await engine.dispose()
+        logger.info(f"Воркер {index} остановлен")
+        logging.getLogger().removeHandler(error_counter)
+        stop_logging()
+
+
+async def main():
+    """Основная асинхронная функция запуска бота"""
+
+    # Логи пишет фоновый поток (JSON в файл с ротацией + консоль)
+    setup_logging()
+    # Записи уровня ERROR во время обработки апдейта считаются ошибкой обработчика
+    error_counter = ErrorCountHandler()
+    logging.getLogger().addHandler(error_counter)
+
+    logger.info("=" * 50)
+    logger.info("Запуск бота учета рабочего времени")
+    logger.info("=" * 50)
+
+    # 1. Инициализация базы данных
+    try:
+        await init_db()
+        logger.info("✅ База данных инициализирована")
+
+        # Восстанавливаем активные сессии и паузы в память
+        async with AsyncSessionLocal() as db:
+            await session_state.load(db)
+        logger.info(f"✅ Активных сессий загружено: {len(session_state)}")
+
+        # Все записи из хендлеров - через одну пишущую задачу (групповая фиксация)
+        writer.start()
+    except Exception as e:
+        logger.error(f"❌ Ошибка инициализации БД: {e}")
+        await writer.stop()
+        await engine.dispose()
+        stop_logging()
+        return
+
+    # 2. Создание экземпляра бота с настройками
+    bot = Bot(
+        token=config.bot.token,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+    # Исходящие сообщения - через очередь с лимитами Telegram, метрики - на METRICS_PORT
+    outbound = start_outbound(bot, config.bot.global_rate)
+    metrics_runner = await start_metrics(config.bot.metrics_port)
+
+    # 3-4. Диспетчер с хранилищем состояний, middleware и роутерами
+    dp = create_dispatcher()
+
     # 5. Команды бота (отобразятся в интерфейсе Telegram)
     commands = [
         {"command": "start", "description": "Запустить бота с меню"},
@@ -80,6 +353,8 @@ async def main():
         {"command": "pause", "description": "Начать/закончить перерыв"},
         {"command": "today", "description": "Статистика за сегодня"},
         {"command": "week", "description": "Статистика за неделю"},
+        {"command": "export", "description": "Выгрузить табель (CSV/JSONL)"},
+        {"command": "metrics", "description": "Метрики бота (для админов)"},
     ]
 
     try:
@@ -88,31 +363,59 @@ async def main():
     except Exception as e:
         logger.error(f"❌ Ошибка установки команд: {e}")
 
-    # 6. Уведомление админам о запуске
+    # 6. Уведомление админам о запуске (параллельно, с низким приоритетом)
+    async def notify_admin(admin_id: int):
+        try:
+            await bot.send_message(
+                admin_id,
+                "🤖 Бот учета рабочего времени запущен!\n"
+                f"⏰ Время: {config.time.timezone}"
+            )
+            logger.info(f"✅ Уведомление отправлено админу {admin_id}")
+        except Exception as e:
+            logger.error(f"❌ Не удалось отправить уведомление админу {admin_id}: {e}")
+
     if config.bot.admin_ids:
-        for admin_id in config.bot.admin_ids:
-            try:
-                await bot.send_message(
-                    admin_id,
-                    "🤖 Бот учета рабочего времени запущен!\n"
-                    f"⏰ Время: {config.time.timezone}"
-                )
-                logger.info(f"✅ Уведомление отправлено админу {admin_id}")
-            except Exception as e:
-                logger.error(f"❌ Не удалось отправить уведомление админу {admin_id}: {e}")
-
-    # 7. Запуск поллинга (опрос сервера Telegram)
+        with bulk_sends():
+            await asyncio.gather(*(notify_admin(admin_id) for admin_id in config.bot.admin_ids))
+
+    # 7. Планировщик напоминаний (начало дня, длинная пауза, незавершенный день)
+    reminders = ReminderScheduler(bot, AsyncSessionLocal, writer=writer)
+    reminders.start()
+
+    # 8. Запуск поллинга (опрос сервера Telegram) или вебхука
     logger.info("✅ Бот запущен и ожидает сообщений...")
     logger.info("=" * 50)
 
     try:
-        await dp.start_polling(bot)
+        if config.bot.workers > 1:
+            # Апдейты обрабатывают процессы-воркеры, этот процесс только раздает их
+            await run_sharded(dp, bot)
+        elif config.bot.mode == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            # Если раньше работали через вебхук - снимаем его, иначе getUpdates не работает
+            await bot.delete_webhook()
+            # handle_as_tasks=True: каждый апдейт обрабатывается в своей задаче,
+            # безопасно благодаря сессии БД на апдейт; порядок и число одновременных
+            # обработок задает UserOrderIsolation, а лимит задач не дает бесконечно
+            # набирать апдейты, если обработка не успевает
+            await dp.start_polling(bot, handle_as_tasks=True, tasks_concurrency_limit=config.bot.max_pending_updates)
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}")
     finally:
         # Корректное завершение
+        await reminders.stop()
+        await outbound.stop()
+        await writer.stop()
+        await metrics.stop_loop_monitor()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         await bot.session.close()
+        await engine.dispose()
         logger.info("Бот остановлен")
+        logging.getLogger().removeHandler(error_counter)
+        stop_logging()
 
 
 if __name__ == "__main__":
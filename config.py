@@ -1,16 +1,88 @@
+import logging
 import os
 from dataclasses import dataclass, field
-from typing import List
+from typing import Any, Dict, List
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+# Наборы PRAGMA для SQLite, выполняются на каждом новом соединении (см. database.make_engine)
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Встроенные настройки SQLite: журнал отката, fsync на каждый commit
+    "default": {},
+    # WAL (читатели не ждут писателя), но fsync на каждый commit
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    # WAL + synchronous=NORMAL: fsync только при checkpoint (при сбое питания можно
+    # потерять последние транзакции, но не целостность БД), большой кэш и mmap
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,  # В КиБ (отрицательное значение): 64 МБ
+        "mmap_size": 268435456,  # 256 МБ
+        "temp_store": "MEMORY",
+    },
+}
+
+
 @dataclass
 class DatabaseConfig:
     """Конфигурация базы данных"""
     url: str = os.getenv("DATABASE_URL", "sqlite:///worktime.db")
     echo: bool = os.getenv("DATABASE_ECHO", "False").lower() == "true"
+    user_cache_size: int = int(os.getenv("USER_CACHE_SIZE", "10000"))  # Сколько пользователей держать в памяти
+    user_cache_ttl: int = int(os.getenv("USER_CACHE_TTL", "3600"))  # Время жизни записи кэша в секундах
+    fsm_state_ttl: int = int(os.getenv("FSM_STATE_TTL", "86400"))  # Через сколько секунд брошенный диалог удаляется
+    fsm_flush_interval: float = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))  # Как часто сбрасывать состояния FSM в БД
+    fsm_cache_size: int = int(os.getenv("FSM_CACHE_SIZE", "10000"))  # Сколько состояний FSM держать в памяти
+    # Групповая фиксация записей: одна транзакция на все записи за write_batch_delay секунд
+    write_batch_delay: float = float(os.getenv("DB_WRITE_BATCH_DELAY", "0.005"))
+    write_batch_size: int = int(os.getenv("DB_WRITE_BATCH_SIZE", "100"))  # Максимум записей в одной транзакции
+    write_retries: int = int(os.getenv("DB_WRITE_RETRIES", "5"))  # Повторов пакета при "database is locked"
+    write_retry_backoff: float = float(os.getenv("DB_WRITE_RETRY_BACKOFF", "0.01"))  # Первая задержка повтора, сек
+
+    # Профиль SQLite (см. SQLITE_PROFILES); отдельные PRAGMA можно переопределить ниже
+    sqlite_profile: str = os.getenv("DB_SQLITE_PROFILE", "production")
+    journal_mode: str = os.getenv("DB_JOURNAL_MODE", "")  # WAL / DELETE / ...
+    synchronous: str = os.getenv("DB_SYNCHRONOUS", "")  # OFF / NORMAL / FULL
+    busy_timeout: str = os.getenv("DB_BUSY_TIMEOUT", "")  # Сколько ждать блокировку, мс
+    cache_size: str = os.getenv("DB_CACHE_SIZE", "")  # Страниц или -КиБ
+    mmap_size: str = os.getenv("DB_MMAP_SIZE", "")  # Байт
+    temp_store: str = os.getenv("DB_TEMP_STORE", "")  # DEFAULT / FILE / MEMORY
+
+    # Пул соединений
+    pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # Пересоздавать соединение через N секунд (-1 - никогда)
+    # Проверка соединения перед выдачей из пула - лишний запрос на каждый апдейт;
+    # для локального файла SQLite не нужна, для сетевого PostgreSQL можно включить
+    pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "False").lower() == "true"
+
+    @property
+    def async_url(self) -> str:
+        """URL с асинхронным драйвером (sqlite -> aiosqlite, postgresql -> asyncpg)"""
+        if self.url.startswith("sqlite:"):
+            return self.url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+        if self.url.startswith("postgresql:"):
+            return self.url.replace("postgresql:", "postgresql+asyncpg:", 1)
+        return self.url
+
+    @property
+    def sqlite_pragmas(self) -> Dict[str, Any]:
+        """PRAGMA выбранного профиля с переопределениями из переменных окружения"""
+        if self.sqlite_profile not in SQLITE_PROFILES:
+            raise ValueError(f"Неизвестный профиль SQLite: {self.sqlite_profile} (есть: {', '.join(SQLITE_PROFILES)})")
+        pragmas = dict(SQLITE_PROFILES[self.sqlite_profile])
+        for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store"):
+            value = getattr(self, name)
+            if value:
+                pragmas[name] = value
+        return pragmas
 
 
 @dataclass
@@ -18,6 +90,32 @@ class BotConfig:
     """Конфигурация бота"""
     token: str = os.getenv("BOT_TOKEN")
     admin_ids: List[int] = field(default_factory=list)
+    global_rate: float = float(os.getenv("BOT_GLOBAL_RATE", "30"))  # Сообщений в секунду на весь бот
+    chat_rate: float = float(os.getenv("BOT_CHAT_RATE", "1"))  # Сообщений в секунду в один чат
+    chat_burst: int = int(os.getenv("BOT_CHAT_BURST", "3"))  # Сколько сообщений в чат можно отправить подряд
+    max_concurrent_updates: int = int(os.getenv("BOT_MAX_CONCURRENT_UPDATES", "64"))  # Апдейтов в обработке одновременно
+    max_pending_updates: int = int(os.getenv("BOT_MAX_PENDING_UPDATES", "1000"))  # Принятых, но не обработанных (polling)
+    update_ring_size: int = int(os.getenv("BOT_UPDATE_RING_SIZE", "1024"))  # Сколько последних update_id помнить
+    double_tap_window: float = float(os.getenv("BOT_DOUBLE_TAP_WINDOW", "1"))  # Окно склейки одинаковых нажатий, сек
+    edit_in_place: bool = os.getenv("BOT_EDIT_IN_PLACE", "True").lower() == "true"  # Кнопки редактируют свое сообщение
+
+    # Процессы-воркеры: при workers > 1 этот процесс получает апдейты и раздает их
+    # воркерам по from_user.id (воркер i слушает 127.0.0.1:shard_base_port + i)
+    workers: int = int(os.getenv("BOT_WORKERS", "1"))
+    shard_base_port: int = int(os.getenv("SHARD_BASE_PORT", "8200"))
+    worker_max_restarts: int = int(os.getenv("BOT_WORKER_MAX_RESTARTS", "5"))  # Падений воркера подряд до остановки
+
+    # Режим получения апдейтов: polling (getUpdates) или webhook
+    mode: str = os.getenv("BOT_MODE", "polling").lower()
+    webhook_url: str = os.getenv("WEBHOOK_URL", "")  # Публичный адрес (https://bot.example.com), без пути
+    webhook_path: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    webhook_host: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")  # Где слушает HTTP-сервер
+    webhook_port: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    webhook_secret: str = os.getenv("WEBHOOK_SECRET", "")  # Проверяется в заголовке X-Telegram-Bot-Api-Secret-Token
+
+    # Метрики в формате Prometheus: GET http://METRICS_HOST:METRICS_PORT/metrics (0 - выключено)
+    metrics_host: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    metrics_port: int = int(os.getenv("METRICS_PORT", "9100"))
 
     def __post_init__(self):
         """Парсим список ID админов из строки"""
@@ -35,12 +133,22 @@ class TimeConfig:
     notification_interval: int = int(os.getenv("NOTIFICATION_INTERVAL", "60"))
 
 
+@dataclass
+class LogConfig:
+    """Конфигурация логирования"""
+    level: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    file: str = os.getenv("LOG_FILE", "bot.log")
+    max_bytes: int = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # Размер файла до ротации
+    backup_count: int = int(os.getenv("LOG_BACKUP_COUNT", "5"))  # Сколько старых файлов хранить
+
+
 @dataclass
 class Config:
     """Основной класс конфигурации"""
     bot: BotConfig = field(default_factory=BotConfig)
     db: DatabaseConfig = field(default_factory=DatabaseConfig)
     time: TimeConfig = field(default_factory=TimeConfig)
+    log: LogConfig = field(default_factory=LogConfig)
 
 
 def load_config() -> Config:
@@ -75,4 +183,4 @@ def validate_config():
 try:
     validate_config()
 except ValueError as e:
-    print(f"Внимание: {e}")
+    logging.getLogger(__name__).warning(f"Внимание: {e}")
@@ -1,17 +1,29 @@
 # 1. Импорты стандартных библиотек
+import asyncio
 import os
+import sys
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
 
 # 2. Импорты SQLAlchemy (ORM для работы с БД)
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey, Float, Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Float, Text, Index, select, insert, update, delete, func, case, cast, literal, and_, or_, event
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert  # UPSERT для PostgreSQL
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert  # UPSERT для SQLite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine  # Асинхронный движок и сессии
 from sqlalchemy.ext.declarative import declarative_base  # Для создания базового класса моделей
-from sqlalchemy.orm import sessionmaker, scoped_session, Session, relationship  # Для работы с сессиями и связями
+from sqlalchemy.pool import AsyncAdaptedQueuePool  # Пул соединений для asyncio
+from sqlalchemy.orm import relationship, Session, aliased  # Для работы со связями и событиями сессий
 from sqlalchemy.exc import SQLAlchemyError  # Для отлова ошибок БД
 from sqlalchemy import text  # Для теста
 
 # 3. Импорт нашей конфигурации
-from config import config
+from config import config, DatabaseConfig
+from utils.cache import TTLCache
+from utils.logger import get_logger, setup_logging
+from services.session_state import session_state
+from services.write_batcher import GroupCommitWriter
+
+logger = get_logger(__name__)
 
 # 4. Создаем базовый класс для всех моделей
 # Все классы-модели будут наследоваться от Base
@@ -42,6 +54,16 @@ class WorkSession(Base):
     """Модель рабочей сессии (от начала до конца рабочего дня)"""
     # Наименование таблицы
     __tablename__ = "work_sessions"
+    __table_args__ = (
+        # Не больше одной незавершенной сессии на пользователя (get_active_session)
+        Index(
+            "ix_work_sessions_user_open", "user_id", unique=True,
+            sqlite_where=text("end_time IS NULL"), postgresql_where=text("end_time IS NULL")
+        ),
+        # Сессии пользователя за период (get_today_sessions / get_week_sessions)
+        Index("ix_work_sessions_user_date", "user_id", "date"),
+        Index("ix_work_sessions_user_created", "user_id", "created_at"),
+    )
     # Аргументы таблицы
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -76,6 +98,13 @@ class WorkSession(Base):
 class Pause(Base):
     """Модель паузы в работе"""
     __tablename__ = 'pauses'
+    __table_args__ = (
+        # Незавершенная пауза сессии (get_active_pause)
+        Index(
+            "ix_pauses_session_open", "session_id",
+            sqlite_where=text("end_time IS NULL"), postgresql_where=text("end_time IS NULL")
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     session_id = Column(Integer, ForeignKey('work_sessions.id', ondelete="CASCADE"), nullable=False, index=True)
@@ -103,52 +132,185 @@ class Pause(Base):
         return None
 
 
+class DailyStats(Base):
+    """
+    Дневная сводка пользователя (пред-агрегированная статистика).
+    Обновляется инкрементально в той же транзакции, что и stop_work_session:
+    work_seconds, pause_seconds и sessions_count прибавляются вместе при завершении
+    рабочей сессии, поэтому паузы незавершенной сессии в сводку не попадают.
+    День - дата рабочей сессии (WorkSession.date, UTC).
+    """
+    __tablename__ = 'daily_stats'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    work_seconds = Column(Integer, nullable=False, default=0)  # Чистое время работы завершенных сессий
+    pause_seconds = Column(Integer, nullable=False, default=0)  # Время пауз завершенных сессий
+    sessions_count = Column(Integer, nullable=False, default=0)  # Количество завершенных сессий
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DailyStats(user_id={self.user_id}, day={self.day})>"
+
+
+class Reminder(Base):
+    """
+    Когда пользователю последний раз отправлялось напоминание данного вида.
+    Хранится в БД, чтобы после перезапуска бот не повторял уже отправленные напоминания.
+    """
+    __tablename__ = 'reminders'
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), primary_key=True)
+    kind = Column(String(30), primary_key=True)  # start_day / long_pause / forgot_stop
+    sent_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<Reminder(user_id={self.user_id}, kind='{self.kind}')>"
+
+
+class FsmState(Base):
+    """
+    Состояние FSM (aiogram) пользователя: текущий шаг диалога и его данные.
+    Записи старше FSM_STATE_TTL считаются брошенными и удаляются.
+    """
+    __tablename__ = 'fsm_states'
+
+    key = Column(String(255), primary_key=True)  # bot_id:chat_id:user_id:destiny
+    state = Column(String(255), nullable=True)
+    data = Column(Text, nullable=False, default="{}")  # JSON
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f"<FsmState(key='{self.key}', state='{self.state}')>"
+
+
 # ==================== ДВИЖОК И СЕССИИ ====================
 
-# Создаем движок (подключение к БД)
-engine = create_engine(
-    config.db.url,  # URL из конфига, например "sqlite:///worktime.db"
-    echo=config.db.echo,  # Если True, выводит все SQL-запросы в консоль
-    pool_pre_ping=True,  # Проверяет живое ли соединение перед использованием
-    connect_args={"check_same_thread": False} if "sqlite" in config.db.url else {}  # Для SQLite в многопоточке
+def make_engine(db_config: DatabaseConfig = config.db) -> AsyncEngine:
+    """
+    Создать асинхронный движок с настройками пула из конфига.
+    Для SQLite на каждом новом соединении выполняются PRAGMA профиля
+    (config.db.sqlite_profile: WAL, synchronous, кэш, mmap, busy_timeout).
+    """
+    url = db_config.async_url
+    options = {
+        "echo": db_config.echo,  # Если True, выводит все SQL-запросы в консоль
+        "pool_pre_ping": db_config.pool_pre_ping,
+        "pool_recycle": db_config.pool_recycle,
+    }
+    if ":memory:" not in url:  # Для БД в памяти SQLAlchemy использует одно соединение без пула
+        options.update(pool_size=db_config.pool_size, max_overflow=db_config.max_overflow)
+        if url.startswith("sqlite"):
+            # По умолчанию aiosqlite работает без пула (NullPool): каждая сессия открывала
+            # новое соединение (и поток) и заново выполняла PRAGMA
+            options["poolclass"] = AsyncAdaptedQueuePool
+
+    new_engine = create_async_engine(url, **options)
+
+    if new_engine.dialect.name == "sqlite":
+        pragmas = db_config.sqlite_pragmas
+
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+
+    return new_engine
+
+
+# Создаем асинхронный движок (подключение к БД).
+# Для SQLite используется драйвер aiosqlite: запросы выполняются в отдельном потоке,
+# поэтому медленный fsync одного пользователя не блокирует event loop для остальных.
+engine = make_engine()
+
+# Создаем фабрику асинхронных сессий.
+# expire_on_commit=False - после commit() объекты остаются читаемыми без повторного запроса
+# (в async-режиме ленивая подгрузка атрибутов недоступна).
+AsyncSessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+# Кэш telegram_id -> User: строка пользователя почти не меняется,
+# поэтому не ходим за ней в БД на каждое нажатие кнопки
+user_cache = TTLCache(maxsize=config.db.user_cache_size, ttl=config.db.user_cache_ttl)
+
+# Единственная пишущая задача: изменения из хендлеров (начало/конец дня, паузы,
+# регистрация) собираются в одну транзакцию на несколько миллисекунд.
+# Запускается в bot.py; без запуска writer.run() пишет сразу отдельной транзакцией.
+writer = GroupCommitWriter(
+    AsyncSessionLocal,
+    delay=config.db.write_batch_delay,
+    max_batch=config.db.write_batch_size,
+    max_retries=config.db.write_retries,
+    retry_backoff=config.db.write_retry_backoff
 )
 
-# Создаем сессии
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
-# Безопасность. Scoped session - гарантирует, что в одном потоке всегда одна и та же сессия
-SessionScoped = scoped_session(SessionLocal)
+# ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
 
+def get_db() -> AsyncSession:
+    """
+    Получить асинхронную сессию БД для кода вне хендлеров (скрипты, фоновые задачи).
+    В хендлерах сессию открывает DbSessionMiddleware - по одной на апдейт.
+    Функции этого модуля только делают flush(), фиксирует транзакцию вызывающий код:
+
+        db = get_db()
+        try:
+            ...
+            await db.commit()
+        finally:
+            await db.close()
+    """
+    return AsyncSessionLocal()
 
-# ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
 
-def get_db() -> Session:
+def after_commit(db: AsyncSession, callback: Callable[[], None]) -> None:
     """
-    Генератор для получения сессии БД.
-    Паттерн "Dependency Injection" (как в FastAPI).
+    Выполнить callback после успешного commit() этой сессии.
+    Так кэши и состояние в памяти обновляются только закрепленными в БД данными;
+    при rollback() отложенные callback-и отбрасываются.
     """
-    db = SessionScoped()  # Создаем или получаем существующую сессию для этого потока
-    try:
-        yield db  # Отдаем сессию вызывающему коду
-    finally:
-        db.close()  # Гарантированно закрываем сессию в конце
+    db.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    for callback in session.info.pop("after_commit", ()):
+        callback()
 
 
-def init_db():
-    """Инициализация базы данных (создание всех таблиц)"""
-    print(f"Инициализация БД по адресу: {config.db.url}")
-    Base.metadata.create_all(bind=engine)
-    print("Таблицы созданы успешно!")
+@event.listens_for(Session, "after_rollback")
+def _drop_after_commit(session: Session) -> None:
+    session.info.pop("after_commit", None)
 
 
-def drop_db():
+async def init_db():
+    """
+    Инициализация базы данных: создание недостающих таблиц
+    и применение миграций схемы (индексы и т.п. для уже существующих файлов БД)
+    """
+    # Импортируем здесь, чтобы избежать циклических импортов
+    from migrations import migrate
+
+    logger.info(f"Инициализация БД по адресу: {config.db.url}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    logger.info("Таблицы созданы успешно!")
+
+    applied = await migrate(engine)
+    if applied:
+        logger.info(f"Применены миграции: {', '.join(map(str, applied))}")
+
+
+async def drop_db():
     """Удаление всех таблиц (только для разработки!)"""
-    Base.metadata.drop_all(bind=engine)
-    print("Все таблицы удалены!")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    logger.warning("Все таблицы удалены!")
 
 
-def add_user(
-        db: Session,
+async def add_user(
+        db: AsyncSession,
         telegram_id: int,
         username: Optional[str] = None,
         first_name: Optional[str] = None,
@@ -156,154 +318,521 @@ def add_user(
 ) -> User:
     """
     Добавить нового пользователя или получить существующего.
+    Выполняется одним UPSERT-запросом: запись обновляется (вместе с updated_at)
+    только если username/имя/фамилия действительно изменились.
+    Если пользователь есть в кэше и данные не менялись - в БД не ходим вовсе.
     Возвращает объект User
     """
-    # Проверяем, существует ли пользователь
-    user = db.query(User).filter(User.telegram_id == telegram_id).first()
-
-    if not user:
-        # Создаем нового
-        user = User(
-            telegram_id=telegram_id,
-            username=username,
-            first_name=first_name,
-            last_name=last_name
-        )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        print(f"Создан новый пользователь: {user}")
+    cached = user_cache.get(telegram_id)
+    if cached is not None and not _profile_changed(cached, username, first_name, last_name):
+        return cached
+
+    stmt = dialect_insert(db.bind.dialect.name)(User).values(
+        telegram_id=telegram_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name
+    )
+    # Пустые значения не затирают сохраненные (как и раньше)
+    new_values = {
+        "username": func.coalesce(stmt.excluded.username, User.username),
+        "first_name": func.coalesce(stmt.excluded.first_name, User.first_name),
+        "last_name": func.coalesce(stmt.excluded.last_name, User.last_name),
+    }
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={**new_values, "updated_at": datetime.utcnow()},
+        where=or_(*(getattr(User, name).is_distinct_from(value) for name, value in new_values.items()))
+    ).returning(User)
+
+    result = await db.execute(stmt, execution_options={"populate_existing": True})
+    user = result.scalars().first()
+
+    if user is None:
+        # Конфликт без изменений: UPDATE не выполнялся, RETURNING пуст
+        result = await db.execute(select(User).where(User.telegram_id == telegram_id).limit(1))
+        user = result.scalars().first()
+        user_cache.set(telegram_id, user)
     else:
-        # Обновляем данные существующего
-        if username and user.username != username:
-            user.username = username
-        if first_name and user.first_name != first_name:
-            user.first_name = first_name
-        if last_name and user.last_name != last_name:
-            user.last_name = last_name
-
-        user.updated_at = datetime.utcnow()
-        db.commit()
-        print(f"Обновлен пользователь: {user}")
+        # Запись создана или изменена - в кэш попадет только после commit
+        after_commit(db, lambda: user_cache.set(telegram_id, user))
+        logger.debug("Сохранен пользователь: %s", user)
 
     return user
 
 
-def get_user_by_telegram_id(db: Session, telegram_id: int) -> Optional[User]:
-    """Найти пользователя по telegram_id"""
-    return db.query(User).filter(User.telegram_id == telegram_id).first()
+async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int) -> Optional[User]:
+    """
+    Найти пользователя по telegram_id.
+    Сначала смотрим в кэш; объект из кэша отсоединен от сессии - только для чтения.
+    """
+    user = user_cache.get(telegram_id)
+    if user is not None:
+        return user
+
+    result = await db.execute(select(User).where(User.telegram_id == telegram_id).limit(1))
+    user = result.scalars().first()
+    if user is not None:
+        user_cache.set(telegram_id, user)
+    return user
 
 
-def get_active_session(db: Session, user_id: int) -> Optional[WorkSession]:
+def _profile_changed(user: User, username: Optional[str], first_name: Optional[str],
+                     last_name: Optional[str]) -> bool:
+    """Изменились ли данные профиля (пустые значения изменением не считаются)"""
+    return any(
+        value and getattr(user, name) != value
+        for name, value in (("username", username), ("first_name", first_name), ("last_name", last_name))
+    )
+
+
+async def get_user_state(db: AsyncSession, telegram_id: int):
+    """
+    Пользователь, его незавершенная сессия, незавершенная пауза и число завершенных
+    пауз сессии - одним запросом (LEFT JOIN по частичным индексам открытых записей).
+    Возвращает строку (User, WorkSession | None, Pause | None, pauses_count) или None,
+    если пользователь не зарегистрирован.
+    """
+    done = aliased(Pause)  # Завершенные паузы (Pause во внешнем запросе - открытая пауза)
+    completed_pauses = (
+        select(func.count(done.id))
+        .where(done.session_id == WorkSession.id, done.end_time.isnot(None))
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        select(User, WorkSession, Pause, completed_pauses)
+        .outerjoin(WorkSession, and_(WorkSession.user_id == User.id, WorkSession.end_time.is_(None)))
+        .outerjoin(Pause, and_(Pause.session_id == WorkSession.id, Pause.end_time.is_(None)))
+        .where(User.telegram_id == telegram_id)
+        .limit(1)
+    )
+    return result.first()
+
+
+async def get_active_session(db: AsyncSession, user_id: int) -> Optional[WorkSession]:
     """
     Получить активную рабочую сессию пользователя
     (сессию, которая начата, но не завершена)
     """
-    return db.query(WorkSession).filter(
-        WorkSession.user_id == user_id,
-        WorkSession.end_time.is_(None)
-    ).first()
+    result = await db.execute(
+        select(WorkSession).where(
+            WorkSession.user_id == user_id,
+            WorkSession.end_time.is_(None)
+        ).limit(1)
+    )
+    return result.scalars().first()
 
-def create_work_session(db: Session, user_id: int, description: str) -> WorkSession:
-    """Создаем новую рабочую сессию"""
-    session = WorkSession(
+async def create_work_session(db: AsyncSession, user_id: int, description: str) -> Optional[WorkSession]:
+    """
+    Создаем новую рабочую сессию одним INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Если у пользователя уже есть незавершенная сессия (уникальный частичный индекс
+    ix_work_sessions_user_open), ничего не вставляется и возвращается None.
+    """
+    now = datetime.utcnow()
+    stmt = dialect_insert(db.bind.dialect.name)(WorkSession).values(
         user_id=user_id,
-        start_time=datetime.utcnow(),
-        date=datetime.utcnow(),
+        start_time=now,
+        date=now,
         description=description
-    )
-    print(f"Новая рабочая сессия создана для пользователя id={user_id}")
-    db.add(session)
-    db.commit()
-    db.refresh(session)
-    print(f"Рабочая сессия добавлена в базу данных для пользователя id={user_id}")
+    ).on_conflict_do_nothing(
+        index_elements=[WorkSession.user_id],
+        index_where=WorkSession.end_time.is_(None)
+    ).returning(WorkSession)
+
+    session = (await db.execute(stmt)).scalars().first()
+    if session is None:
+        return None
+    after_commit(db, lambda: session_state.session_started(session))
+    logger.debug("Рабочая сессия id=%s создана для пользователя id=%s", session.id, user_id)
     return session
 
-def stop_work_session(db: Session, session_id: int) -> WorkSession:
-    """Прекращаем работу сессии пользователя"""
-    session = db.query(WorkSession).filter(WorkSession.id == session_id).first()
-    if session:
-        session.end_time = datetime.utcnow()
-        db.commit()
-        db.refresh(session)
+async def stop_work_session(db: AsyncSession, session_id: int) -> Optional[WorkSession]:
+    """
+    Прекращаем работу сессии пользователя одним условным UPDATE ... RETURNING
+    (только если сессия еще не завершена). Повторное завершение возвращает None.
+    Незавершенная пауза закрывается тем же временем окончания, и ее длительность
+    входит в паузы сессии до расчета времени работы и дневной сводки.
+    """
+    now = datetime.utcnow()
+    session = (await db.execute(
+        update(WorkSession)
+        .where(WorkSession.id == session_id, WorkSession.end_time.is_(None))
+        .values(end_time=now)
+        .returning(WorkSession),
+        execution_options={"populate_existing": True}
+    )).scalars().first()
+    if session is None:
+        return None
+
+    open_pause_start = (await db.execute(
+        update(Pause)
+        .where(Pause.session_id == session_id, Pause.end_time.is_(None))
+        .values(end_time=now)
+        .returning(Pause.start_time)
+    )).scalar()
+    if open_pause_start is not None:
+        pause_duration = int((now - open_pause_start).total_seconds())
+        session = (await db.execute(
+            update(WorkSession)
+            .where(WorkSession.id == session_id)
+            .values(total_pause_seconds=func.coalesce(WorkSession.total_pause_seconds, 0) + pause_duration)
+            .returning(WorkSession),
+            execution_options={"populate_existing": True}
+        )).scalars().one()
+
+    await _add_daily_stats(
+        db, session.user_id, session.date.date(),
+        work_seconds=session.total_work_seconds or 0,
+        pause_seconds=session.total_pause_seconds or 0,
+        sessions_count=1
+    )
+    after_commit(db, lambda: session_state.session_stopped(session_id))
     return session
 #--------------------------------------------PAUSE-----------------------------------------------#
-def start_pause(db: Session, session_id: int, reason: str = None) -> Pause:
-    """Начать паузу в рабочей сессии"""
-    pause = Pause(
-        session_id=session_id,
-        start_time=datetime.utcnow(),
-        reason=reason
-    )
-    db.add(pause)
-    db.commit()
-    db.refresh(pause)
+async def start_pause(db: AsyncSession, session_id: int, reason: str = None) -> Optional[Pause]:
+    """
+    Начать паузу в рабочей сессии одним INSERT ... SELECT ... RETURNING:
+    строка вставляется, только если сессия не завершена и в ней нет незавершенной паузы.
+    Иначе возвращается None.
+    """
+    now = datetime.utcnow()
+    session_open = select(WorkSession.id).where(
+        WorkSession.id == session_id, WorkSession.end_time.is_(None)
+    ).exists()
+    pause_open = select(Pause.id).where(Pause.session_id == session_id, Pause.end_time.is_(None)).exists()
+
+    stmt = insert(Pause).from_select(
+        ["session_id", "start_time", "reason", "created_at"],
+        select(
+            literal(session_id, Integer), literal(now, DateTime), literal(reason, String), literal(now, DateTime)
+        ).where(session_open, ~pause_open)
+    ).returning(Pause)
+
+    pause = (await db.execute(stmt)).scalars().first()
+    if pause is None:
+        return None
+    after_commit(db, lambda: session_state.pause_started(pause))
     return pause
 
-def stop_pause(db: Session, pause_id: int) -> Pause:
-    """Завершить паузу"""
-    pause = db.query(Pause).filter(Pause.id == pause_id).first()
-    if pause and pause.end_time is None:
-        pause.end_time = datetime.utcnow()
+async def stop_pause(db: AsyncSession, pause_id: int) -> Optional[Pause]:
+    """
+    Завершить паузу. Все изменения - условными запросами без чтения перед записью:
+    UPDATE паузы (только если она еще не завершена) ... RETURNING,
+    и прибавление длительности к сессии в SQL. В дневную сводку паузы попадают
+    вместе с работой при завершении сессии (stop_work_session).
+    Повторное завершение (двойное нажатие) возвращает None и ничего не меняет.
+    """
+    pause = (await db.execute(
+        update(Pause)
+        .where(Pause.id == pause_id, Pause.end_time.is_(None))
+        .values(end_time=datetime.utcnow())
+        .returning(Pause),
+        execution_options={"populate_existing": True}
+    )).scalars().first()
+    if pause is None:
+        return None
+
+    pause_duration = pause.duration_seconds
 
-    # Обновляем общее время пауз в сессии
-    session = db.query(WorkSession).filter(WorkSession.id == pause.session_id).first()
-    if session:
-        pause_duration = (pause.end_time - pause.start_time).total_seconds()
-        session.total_pause_seconds += int(pause_duration)
+    # Прибавляем паузу к сессии в SQL
+    await db.execute(
+        update(WorkSession)
+        .where(WorkSession.id == pause.session_id)
+        .values(total_pause_seconds=func.coalesce(WorkSession.total_pause_seconds, 0) + pause_duration)
+    )
 
-    db.commit()
-    db.refresh(pause)
+    after_commit(db, lambda: session_state.pause_stopped(pause.session_id, pause_duration))
     return pause
 
 
-def get_active_pause(db: Session, session_id: int) -> Optional[Pause]:
+async def get_active_pause(db: AsyncSession, session_id: int) -> Optional[Pause]:
     """Получить активную паузу сессии"""
-    return db.query(Pause).filter(
-        Pause.session_id == session_id,
-        Pause.end_time.is_(None)
-    ).first()
+    result = await db.execute(
+        select(Pause).where(
+            Pause.session_id == session_id,
+            Pause.end_time.is_(None)
+        ).limit(1)
+    )
+    return result.scalars().first()
 
-def get_session_pauses(db: Session, session_id: int) -> List[Pause]:
+async def get_session_pauses(db: AsyncSession, session_id: int) -> List[Pause]:
     """Получить все паузы сессии"""
-    return db.query(Pause).filter(Pause.session_id == session_id).all()
+    result = await db.execute(select(Pause).where(Pause.session_id == session_id))
+    return list(result.scalars().all())
 
-def get_today_pauses(db: Session, user_id: int) -> List[Pause]:
+async def get_today_pauses(db: AsyncSession, user_id: int) -> List[Pause]:
     """Получить все паузы пользователя за сегодня"""
     today = datetime.utcnow().date()
 
-    # Находим все сессии пользователя за сегодня
-    sessions = db.query(WorkSession).filter(
-        WorkSession.user_id == user_id,
-        WorkSession.date >= today
-    ).all()
-
-    # Берем все паузы с сессии
-    all_pauses = list()
-    for session in sessions:
-        session_pauses = get_session_pauses(db=db, session_id=session.id)
-        all_pauses.extend(session_pauses)
-
-    return all_pauses
+    # Находим все паузы сессий пользователя за сегодня одним запросом
+    result = await db.execute(
+        select(Pause).join(WorkSession, Pause.session_id == WorkSession.id).where(
+            WorkSession.user_id == user_id,
+            WorkSession.date >= today
+        )
+    )
+    return list(result.scalars().all())
 
 # ==================== ФУНКЦИИ СЕССИЙ ====================
-def get_today_sessions(db: Session, user_id: int) -> List[WorkSession]:
+async def get_today_sessions(db: AsyncSession, user_id: int) -> List[WorkSession]:
     """Получить все сессии пользователя за сегодня"""
     today = datetime.utcnow().date()
-    return db.query(WorkSession).filter(
-        WorkSession.user_id == user_id,
-        WorkSession.date >= today,
-        WorkSession.end_time.isnot(None)  # Только завершенные
-    ).all()
+    result = await db.execute(
+        select(WorkSession).where(
+            WorkSession.user_id == user_id,
+            WorkSession.date >= today,
+            WorkSession.end_time.isnot(None)  # Только завершенные
+        )
+    )
+    return list(result.scalars().all())
 
-def get_week_sessions(db: Session, user_id: int) -> List[WorkSession]:
+async def get_week_sessions(db: AsyncSession, user_id: int) -> List[WorkSession]:
     """Получить все сессии пользователя за последние 7 дней"""
     week_ago = datetime.utcnow() - timedelta(days=7)
-    return db.query(WorkSession).filter(
+    result = await db.execute(
+        select(WorkSession).where(
+            WorkSession.user_id == user_id,
+            WorkSession.created_at >= week_ago,
+            WorkSession.end_time.isnot(None)
+        )
+    )
+    return list(result.scalars().all())
+
+# ==================== ДНЕВНЫЕ СВОДКИ ====================
+def dialect_insert(dialect_name: str):
+    """insert() с поддержкой ON CONFLICT для текущего диалекта (SQLite / PostgreSQL)"""
+    return sqlite_insert if dialect_name == "sqlite" else postgresql_insert
+
+
+def seconds_between(start, end, dialect_name: str):
+    """SQL-выражение: число секунд между двумя DateTime-колонками"""
+    if dialect_name == "sqlite":
+        # Целочисленно, с микросекундами (SQLAlchemy хранит 'YYYY-MM-DD HH:MM:SS.ffffff'),
+        # чтобы результат совпадал с int(timedelta.total_seconds()) в Python
+        def micros(column):
+            return (
+                cast(func.strftime("%s", column), Integer) * 1000000
+                + cast(func.substr(column, 21, 6), Integer)
+            )
+        return (micros(end) - micros(start)) // 1000000
+    return cast(func.extract("epoch", end - start), Integer)
+
+
+def day_of(column, dialect_name: str):
+    """SQL-выражение: дата (без времени) DateTime-колонки"""
+    if dialect_name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+
+async def _add_daily_stats(
+        db: AsyncSession,
+        user_id: int,
+        day,
+        work_seconds: int = 0,
+        pause_seconds: int = 0,
+        sessions_count: int = 0
+) -> None:
+    """Инкрементально прибавить значения к дневной сводке (UPSERT одним запросом)"""
+    stmt = dialect_insert(db.bind.dialect.name)(DailyStats).values(
+        user_id=user_id,
+        day=day,
+        work_seconds=work_seconds,
+        pause_seconds=pause_seconds,
+        sessions_count=sessions_count
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyStats.user_id, DailyStats.day],
+        set_={
+            "work_seconds": DailyStats.work_seconds + stmt.excluded.work_seconds,
+            "pause_seconds": DailyStats.pause_seconds + stmt.excluded.pause_seconds,
+            "sessions_count": DailyStats.sessions_count + stmt.excluded.sessions_count,
+            "updated_at": datetime.utcnow(),
+        }
+    )
+    await db.execute(stmt)
+
+
+def daily_stats_backfill_statements(dialect_name: str, user_id: Optional[int] = None) -> list:
+    """
+    Запросы полного пересчета daily_stats из work_sessions (DELETE + INSERT ... SELECT).
+    Используются командой пересчета и миграцией.
+    """
+    finished = WorkSession.end_time.isnot(None)
+    work_seconds = (
+        seconds_between(WorkSession.start_time, WorkSession.end_time, dialect_name)
+        - func.coalesce(WorkSession.total_pause_seconds, 0)
+    )
+    source = select(
+        WorkSession.user_id,
+        day_of(WorkSession.date, dialect_name),
+        func.sum(case((finished, work_seconds), else_=0)),
+        func.sum(case((finished, func.coalesce(WorkSession.total_pause_seconds, 0)), else_=0)),
+        func.sum(case((finished, 1), else_=0)),
+        literal(datetime.utcnow(), DateTime),
+    ).group_by(WorkSession.user_id, day_of(WorkSession.date, dialect_name))
+
+    clear = delete(DailyStats)
+    if user_id is not None:
+        source = source.where(WorkSession.user_id == user_id)
+        clear = clear.where(DailyStats.user_id == user_id)
+
+    fill = DailyStats.__table__.insert().from_select(
+        ["user_id", "day", "work_seconds", "pause_seconds", "sessions_count", "updated_at"],
+        source
+    )
+    return [clear, fill]
+
+
+async def get_daily_stats(
+        db: AsyncSession,
+        user_id: int,
+        date_from=None,
+        date_to=None
+) -> List[DailyStats]:
+    """Дневные сводки пользователя за период (по индексу первичного ключа), новые первыми"""
+    query = select(DailyStats).where(DailyStats.user_id == user_id)
+    if date_from is not None:
+        query = query.where(DailyStats.day >= date_from)
+    if date_to is not None:
+        query = query.where(DailyStats.day <= date_to)
+    result = await db.execute(query.order_by(DailyStats.day.desc()))
+    return list(result.scalars().all())
+
+
+def bucket_of(day_column, bucket: str, dialect_name: str):
+    """
+    SQL-выражение: начало периода для даты в виде строки.
+    bucket: "day" -> 'YYYY-MM-DD', "week" -> понедельник недели 'YYYY-MM-DD', "month" -> 'YYYY-MM'
+    """
+    if dialect_name == "sqlite":
+        if bucket == "week":
+            return func.date(day_column, "weekday 0", "-6 days")
+        if bucket == "month":
+            return func.strftime("%Y-%m", day_column)
+        return func.date(day_column)
+
+    if bucket == "week":
+        return func.to_char(func.date_trunc("week", day_column), "YYYY-MM-DD")
+    if bucket == "month":
+        return func.to_char(day_column, "YYYY-MM")
+    return func.to_char(day_column, "YYYY-MM-DD")
+
+
+def productivity_of(work_seconds, pause_seconds):
+    """SQL-выражение: продуктивность в процентах (работа / (работа + паузы))"""
+    return func.coalesce(
+        cast(work_seconds * 100 / func.nullif(work_seconds + pause_seconds, 0), Integer), 0
+    )
+
+
+def _stats_from_rows(rows, days_per_row: bool = False) -> Dict[str, Any]:
+    """Собрать результат get_period_stats / get_sessions_daily_stats из строк запроса"""
+    buckets = [
+        {
+            'period': row.period,
+            'work_seconds': row.work_seconds,
+            'pause_seconds': row.pause_seconds,
+            'sessions_count': row.sessions_count,
+            'days_count': 1 if days_per_row else row.days_count,
+            'productivity': row.productivity,
+        }
+        for row in rows
+    ]
+
+    first = rows[0] if rows else None
+    total_work = first.total_work_seconds if first else 0
+    total_pause = first.total_pause_seconds if first else 0
+    totals = {
+        'total_work_seconds': total_work,
+        'total_pause_seconds': total_pause,
+        'sessions_count': first.total_sessions_count if first else 0,
+        'days_count': first.total_days_count if first else 0,
+        'productivity': int(total_work * 100 / (total_work + total_pause)) if total_work + total_pause > 0 else 0,
+    }
+    return {'buckets': buckets, 'totals': totals}
+
+
+async def get_period_stats(
+        db: AsyncSession,
+        user_id: int,
+        bucket: str,
+        date_from=None
+) -> Dict[str, Any]:
+    """
+    Статистика по периодам (дни / недели / месяцы) и итог - одним GROUP BY-запросом
+    к daily_stats. Из БД приходят только агрегированные строки (по одной на период),
+    поэтому объем памяти не зависит от длины истории пользователя.
+    """
+    period = bucket_of(DailyStats.day, bucket, db.bind.dialect.name).label("period")
+    work = func.sum(DailyStats.work_seconds)
+    pause = func.sum(DailyStats.pause_seconds)
+    sessions = func.sum(DailyStats.sessions_count)
+    days = func.count(case((DailyStats.sessions_count > 0, 1)))
+
+    query = select(
+        period,
+        work.label("work_seconds"),
+        pause.label("pause_seconds"),
+        sessions.label("sessions_count"),
+        days.label("days_count"),
+        productivity_of(work, pause).label("productivity"),
+        # Итоги по всем периодам - оконными функциями в том же запросе
+        func.sum(work).over().label("total_work_seconds"),
+        func.sum(pause).over().label("total_pause_seconds"),
+        func.sum(sessions).over().label("total_sessions_count"),
+        func.sum(days).over().label("total_days_count"),
+    ).where(DailyStats.user_id == user_id)
+    if date_from is not None:
+        query = query.where(DailyStats.day >= date_from)
+    query = query.group_by(period).order_by(period.desc())
+
+    rows = (await db.execute(query)).all()
+    return _stats_from_rows(rows)
+
+
+async def get_sessions_daily_stats(db: AsyncSession, user_id: int, since: datetime) -> Dict[str, Any]:
+    """
+    Статистика по дням для завершенных сессий, созданных начиная с since, - одним запросом.
+    Чистое время работы (конец - начало - паузы) считается в SQL,
+    итоги по всем дням - оконными функциями. Формат как у get_period_stats.
+    """
+    dialect_name = db.bind.dialect.name
+    day = day_of(WorkSession.date, dialect_name).label("period")
+    session_work = (
+        seconds_between(WorkSession.start_time, WorkSession.end_time, dialect_name)
+        - func.coalesce(WorkSession.total_pause_seconds, 0)
+    )
+    work = func.sum(session_work)
+    pause = func.sum(func.coalesce(WorkSession.total_pause_seconds, 0))
+    sessions = func.count(WorkSession.id)
+
+    query = select(
+        day,
+        work.label("work_seconds"),
+        pause.label("pause_seconds"),
+        sessions.label("sessions_count"),
+        productivity_of(work, pause).label("productivity"),
+        func.sum(work).over().label("total_work_seconds"),
+        func.sum(pause).over().label("total_pause_seconds"),
+        func.sum(sessions).over().label("total_sessions_count"),
+        func.count().over().label("total_days_count"),
+    ).where(
         WorkSession.user_id == user_id,
-        WorkSession.created_at >= week_ago,
+        WorkSession.created_at >= since,
         WorkSession.end_time.isnot(None)
-    ).all()
+    ).group_by(day).order_by(day.desc())
+
+    rows = (await db.execute(query)).all()
+    return _stats_from_rows(rows, days_per_row=True)
+
+
+async def rebuild_daily_stats(db: AsyncSession, user_id: Optional[int] = None) -> None:
+    """Пересчитать дневные сводки по существующим данным (всех или одного пользователя)"""
+    for stmt in daily_stats_backfill_statements(db.bind.dialect.name, user_id):
+        await db.execute(stmt)
+    await db.flush()
+
 
 def calculate_session_stats(session: WorkSession) -> Dict[str, Any]:
     """Рассчитать статистику для одной сессии"""
@@ -334,56 +863,43 @@ def calculate_session_stats(session: WorkSession) -> Dict[str, Any]:
     }
 
 
-def calculate_daily_stats(sessions: List[WorkSession]) -> Dict[str, Any]:
-    """Рассчитать общую статистику за день"""
-    if not sessions:
-        return {
-            'total_work_seconds': 0,
-            'total_pause_seconds': 0,
-            'sessions_count': 0,
-            'productivity': 0
-        }
-
-    total_work = sum(s.total_work_seconds or 0 for s in sessions)
-    total_pause = sum(s.total_pause_seconds or 0 for s in sessions)
-
-    if total_work + total_pause > 0:
-        productivity = int((total_work / (total_work + total_pause)) * 100)
-    else:
-        productivity = 0
-
-    total_hours = total_work // 3600
-    total_minutes = (total_work % 3600) // 60
-    total_pause_minutes = total_pause // 60
-
-    return {
-        'total_work_seconds': total_work,
-        'total_work_hours': total_hours,
-        'total_work_minutes': total_minutes,
-        'total_pause_seconds': total_pause,
-        'total_pause_minutes': total_pause_minutes,
-        'sessions_count': len(sessions),
-        'productivity': productivity
-    }
-
-
-
 # ==================== ТЕСТОВЫЕ ФУНКЦИИ ====================
-def test_connection():
+async def test_connection():
     """Тест подключения к БД"""
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        print("✅ Подключение к БД успешно!")
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        logger.info("✅ Подключение к БД успешно!")
         return True
     except SQLAlchemyError as e:
-        print(f"❌ Ошибка подключения к БД: {e}")
+        logger.error(f"❌ Ошибка подключения к БД: {e}")
         return False
 
 
+async def _main(rebuild_stats: bool = False):
+    """Инициализация БД при запуске файла напрямую"""
+    logger.info("=== Инициализация базы данных ===")
+    try:
+        await test_connection()
+        await init_db()
+
+        if rebuild_stats:
+            db = get_db()
+            try:
+                await rebuild_daily_stats(db)
+                await db.commit()
+                logger.info("✅ Дневные сводки пересчитаны")
+            finally:
+                await db.close()
+    finally:
+        # Соединения пула держат потоки aiosqlite - без закрытия процесс не завершится
+        await engine.dispose()
+
+    logger.info("=== Готово! ===")
+
+
 if __name__ == "__main__":
     # При запуске файла напрямую инициализируем БД
-    print("=== Инициализация базы данных ===")
-    test_connection()
-    init_db()
-    print("=== Готово! ===")
+    # python database.py --rebuild-daily-stats - дополнительно пересчитать daily_stats
+    setup_logging()
+    asyncio.run(_main(rebuild_stats="--rebuild-daily-stats" in sys.argv))
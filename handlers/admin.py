@@ -0,0 +1,104 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from database import get_user_by_telegram_id
+from services.metrics import metrics
+from services.report_generator import EXPORT_FORMATS, export_timesheet, export_filename
+from utils.logger import get_logger
+
+"""
+Обработчики выгрузки табеля и админских команд
+"""
+
+
+router = Router()
+logger = get_logger(__name__)
+
+DEFAULT_EXPORT_DAYS = 30
+
+
+def _parse_export_args(command: CommandObject):
+    """Аргументы команды: [csv|jsonl] [дней]. Возвращает (формат, дата начала)"""
+    fmt, days = "csv", DEFAULT_EXPORT_DAYS
+    for arg in (command.args or "").split():
+        if arg.lower() in EXPORT_FORMATS:
+            fmt = arg.lower()
+        elif arg.isdigit():
+            days = int(arg)
+    date_from = datetime.utcnow().date() - timedelta(days=days - 1) if days > 0 else None
+    return fmt, date_from
+
+
+async def _send_export(message: types.Message, db: AsyncSession, fmt: str, date_from, user_id=None):
+    """Сформировать файл во временной папке и отправить его документом"""
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = export_filename(fmt, date_from, None)
+        path = os.path.join(tmp, filename)
+
+        sessions_count = await export_timesheet(db, path, fmt=fmt, user_id=user_id, date_from=date_from)
+        if sessions_count == 0:
+            await message.answer("ℹ️ За выбранный период нет рабочих сессий.")
+            return
+
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"📄 Табель: {sessions_count} сессий"
+        )
+
+
+@router.message(Command("export"))
+async def cmd_export(message: types.Message, command: CommandObject, db: AsyncSession):
+    """Выгрузка своего табеля: /export [csv|jsonl] [дней]"""
+
+    try:
+        db_user = await get_user_by_telegram_id(db, message.from_user.id)
+        if not db_user:
+            await message.answer("⚠️ Сначала используйте /start для регистрации.")
+            return
+
+        fmt, date_from = _parse_export_args(command)
+        await _send_export(message, db, fmt, date_from, user_id=db_user.id)
+
+    except Exception:
+        await message.answer("❌ Ошибка при выгрузке табеля.")
+        logger.exception("Ошибка export")
+
+
+@router.message(Command("export_all"))
+async def cmd_export_all(message: types.Message, command: CommandObject, db: AsyncSession):
+    """Выгрузка табеля всех сотрудников (только для админов): /export_all [csv|jsonl] [дней]"""
+
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("⛔ Команда доступна только администраторам.")
+        return
+
+    try:
+        fmt, date_from = _parse_export_args(command)
+        await _send_export(message, db, fmt, date_from)
+
+    except Exception:
+        await message.answer("❌ Ошибка при выгрузке табеля.")
+        logger.exception("Ошибка export_all")
+
+
+@router.message(Command("metrics"))
+async def cmd_metrics(message: types.Message):
+    """Сводка метрик бота (только для админов): обработчики, Bot API, event loop"""
+
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("⛔ Команда доступна только администраторам.")
+        return
+
+    try:
+        await message.answer(metrics.summary())
+
+    except Exception:
+        await message.answer("❌ Ошибка при получении метрик.")
+        logger.exception("Ошибка metrics")
@@ -1,464 +1,430 @@
 from datetime import datetime
 from aiogram import Router, types
 from aiogram.fsm.context import FSMContext
-
-from keyboards.main_menu import get_main_menu, get_stats_menu
-from database import (get_db, get_user_by_telegram_id, get_active_session, WorkSession,
-                      get_session_pauses, get_active_pause, stop_pause, start_pause)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from keyboards.callback_data import (MenuCallback, MenuAction, StatsCallback, StatsPeriod,
+                                     PauseCallback, PauseAction, PAUSE_REASONS, LEGACY_CALLBACKS)
+from handlers.start import HELP_TEXT
+from keyboards.main_menu import MAIN_MENU, STATS_MENU
+from keyboards.pause_reasons import PAUSE_REASONS_KEYBOARD, PAUSE_ACTIONS_KEYBOARD
+from database import get_user_by_telegram_id, get_period_stats
+from services import time_calculator
+from services.time_calculator import (NotRegistered, NoActiveSession, SessionAlreadyStarted,
+                                     NoActivePause, PauseAlreadyStarted)
+from utils.callback_router import CallbackRouter
+from utils.messages import show
+from utils.logger import get_logger
 
 """
 Обработчики callback-запросов от инлайн-кнопок
 """
 
 router = Router()
+logger = get_logger(__name__)
+# Все кнопки разбираются одним обработчиком по таблице (см. utils/callback_router.py)
+callbacks = CallbackRouter(router, aliases=LEGACY_CALLBACKS)
 
 
-@router.callback_query(lambda c: c.data == "main_menu")
+@callbacks.handler(MenuCallback, MenuAction.MAIN)
 async def process_main_menu(callback: types.CallbackQuery):
     """Показать главное меню"""
-    await callback.message.edit_text(
+    await show(
+        callback,
         "🤖 **Главное меню**\n\n"
         "Выберите действие:",
-        reply_markup=get_main_menu()
+        reply_markup=MAIN_MENU
     )
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "start_work")
-async def process_start_work(callback: types.CallbackQuery):
+@callbacks.handler(MenuCallback, MenuAction.START_WORK)
+async def process_start_work(callback: types.CallbackQuery, db: AsyncSession):
     """Обработка кнопки 'Начать день'"""
 
-    # ВАЖНО: берем пользователя из callback, а не из сообщения
-    user = callback.from_user
-    telegram_id = user.id
-
-    db_gen = get_db()
-    db = next(db_gen)
-
     try:
-        # 1. Находим пользователя в БД
-        db_user = get_user_by_telegram_id(db, telegram_id)
-        if not db_user:
-            await callback.message.answer("⚠️ Сначала используйте /start для регистрации.")
-            await callback.answer()
-            return
+        # ВАЖНО: берем пользователя из callback, а не из сообщения
+        new_session = await time_calculator.start_work(db, callback.from_user.id)
 
-        # 2. Проверяем, нет ли активной сессии
-        active_session = get_active_session(db, db_user.id)
-        if active_session:
-            start_time = active_session.start_time.strftime("%H:%M")
-            await callback.message.answer(
-                f"⏰ Рабочий день уже начат в {start_time}!\n"
-                f"Используйте 'Завершить день' чтобы закончить."
-            )
-            await callback.answer()
-            return
-
-        # 3. Создаем новую рабочую сессию
-        new_session = WorkSession(
-            user_id=db_user.id,
-            start_time=datetime.utcnow(),
-            date=datetime.utcnow(),
-            description="Рабочий день начат"
-        )
-
-        db.add(new_session)
-        db.commit()
-        db.refresh(new_session)
-
-        # 4. Отправляем подтверждение
-        start_time_local = new_session.start_time.strftime("%H:%M")
-        await callback.message.answer(
+        await show(
+            callback,
             f"✅ **Рабочий день начат!**\n"
-            f"⏰ Время: {start_time_local}\n"
+            f"⏰ Время: {new_session.start_time.strftime('%H:%M')}\n"
             f"📅 Дата: {new_session.date.strftime('%d.%m.%Y')}\n\n"
             f"💡 Теперь можно:\n"
             f"• Использовать кнопку 'Пауза' для перерыва\n"
-            f"• Использовать кнопку 'Завершить день' для окончания"
+            f"• Использовать кнопку 'Завершить день' для окончания",
+            reply_markup=MAIN_MENU
         )
-
-        # 5. Показываем меню
-        await callback.message.answer(
-            "👇 Используйте меню для дальнейших действий:",
-            reply_markup=get_main_menu()
-        )
-
         await callback.answer("✅ День начат!")
 
-    except Exception as e:
-        await callback.message.answer("❌ Произошла ошибка при начале рабочего дня.")
-        print(f"Ошибка start_work (callback): {e}")
-
-    finally:
-        # Закрываем сессию БД
-        next(db_gen, None)
+    except NotRegistered:
+        await show(callback, "⚠️ Сначала используйте /start для регистрации.", reply_markup=MAIN_MENU)
+        await callback.answer()
+    except SessionAlreadyStarted as e:
+        await show(
+            callback,
+            f"⏰ Рабочий день уже начат в {e.session.start_time.strftime('%H:%M')}!\n"
+            f"Используйте 'Завершить день' чтобы закончить.",
+            reply_markup=MAIN_MENU
+        )
+        await callback.answer()
+    except Exception:
+        await show(callback, "❌ Произошла ошибка при начале рабочего дня.", reply_markup=MAIN_MENU)
+        logger.exception("Ошибка start_work (callback)")
 
 
-@router.callback_query(lambda c: c.data == "stop_work")
-async def process_stop_work(callback: types.CallbackQuery):
+@callbacks.handler(MenuCallback, MenuAction.STOP_WORK)
+async def process_stop_work(callback: types.CallbackQuery, db: AsyncSession):
     """Обработка кнопки 'Завершить день'"""
 
-    # ВАЖНО: берем пользователя из callback
-    user = callback.from_user
-    telegram_id = user.id
-
-    db_gen = get_db()
-    db = next(db_gen)
-
     try:
-        # 1. Находим пользователя
-        db_user = get_user_by_telegram_id(db, telegram_id)
-        if not db_user:
-            await callback.message.answer("⚠️ Сначала используйте /start для регистрации.")
-            await callback.answer()
-            return
+        summary = await time_calculator.stop_work(db, callback.from_user.id)
+        work_duration = time_calculator.format_hours_minutes(summary.work_seconds) or "не удалось рассчитать"
 
-        # 2. Находим активную сессию
-        active_session = get_active_session(db, db_user.id)
-        if not active_session:
-            await callback.message.answer(
-                "⚠️ У вас нет активного рабочего дня.\n"
-                "Используйте 'Начать день' чтобы начать."
-            )
-            await callback.answer()
-            return
-
-        # 3. Завершаем сессию
-        active_session.end_time = datetime.utcnow()
-        db.commit()
-
-        # 4. Рассчитываем время работы
-        if active_session.total_work_seconds:
-            total_seconds = active_session.total_work_seconds
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            work_duration = f"{hours}ч {minutes}мин"
-        else:
-            work_duration = "не удалось рассчитать"
-
-        # 5. Отправляем отчет
-        await callback.message.answer(
+        await show(
+            callback,
             f"✅ **Рабочий день завершен!**\n\n"
             f"📊 **Статистика за день:**\n"
-            f"⏱️ Начало: {active_session.start_time.strftime('%H:%M')}\n"
-            f"⏱️ Конец: {active_session.end_time.strftime('%H:%M')}\n"
+            f"⏱️ Начало: {summary.start_time.strftime('%H:%M')}\n"
+            f"⏱️ Конец: {summary.end_time.strftime('%H:%M')}\n"
             f"⏱️ Общее время: {work_duration}\n"
-            f"⏸️ Перерывы: {active_session.total_pause_seconds // 60} мин\n\n"
-            f"🏁 Отличная работа! Хорошего отдыха!"
+            f"⏸️ Перерывы: {summary.pause_seconds // 60} мин\n\n"
+            f"🏁 Отличная работа! Хорошего отдыха!",
+            reply_markup=MAIN_MENU
         )
-
         await callback.answer("✅ День завершен!")
 
-    except Exception as e:
-        await callback.message.answer("❌ Произошла ошибка при завершении рабочего дня.")
-        print(f"Ошибка stop_work (callback): {e}")
-
-    finally:
-        next(db_gen, None)
-
-
-@router.callback_query(lambda c: c.data == "pause")
-async def process_pause(callback: types.CallbackQuery):
-    """Обработка кнопки 'Пауза' - основная логика"""
+    except NotRegistered:
+        await show(callback, "⚠️ Сначала используйте /start для регистрации.", reply_markup=MAIN_MENU)
+        await callback.answer()
+    except NoActiveSession:
+        await show(
+            callback,
+            "⚠️ У вас нет активного рабочего дня.\n"
+            "Используйте 'Начать день' чтобы начать.",
+            reply_markup=MAIN_MENU
+        )
+        await callback.answer()
+    except Exception:
+        await show(callback, "❌ Произошла ошибка при завершении рабочего дня.", reply_markup=MAIN_MENU)
+        logger.exception("Ошибка stop_work (callback)")
 
-    user = callback.from_user
-    telegram_id = user.id
 
-    db_gen = get_db()
-    db = next(db_gen)
+@callbacks.handler(MenuCallback, MenuAction.PAUSE)
+async def process_pause(callback: types.CallbackQuery, db: AsyncSession):
+    """Обработка кнопки 'Пауза': завершить идущий перерыв или предложить причины нового"""
 
     try:
-        # 1. Находим пользователя
-        db_user = get_user_by_telegram_id(db, telegram_id)
-        if not db_user:
-            await callback.message.answer("⚠️ Сначала используйте /start для регистрации.")
-            await callback.answer()
-            return
-
-        # 2. Проверяем активную сессию
-        active_session = get_active_session(db, db_user.id)
-        if not active_session:
-            await callback.message.answer(
-                "⚠️ У вас нет активного рабочего дня.\n"
-                "Используйте 'Начать день' чтобы начать работу."
-            )
-            await callback.answer()
-            return
-
-        # 3. Проверяем активную паузу
-        active_pause = get_active_pause(db, active_session.id)
-
-        if active_pause:
-            # Есть активная пауза - завершаем ее
-            stopped_pause = stop_pause(db, active_pause.id)
-
-            if stopped_pause and stopped_pause.end_time:
-                # Рассчитываем длительность паузы
-                duration_seconds = stopped_pause.duration_seconds
-                minutes = duration_seconds // 60 if duration_seconds else 0
-                seconds = duration_seconds % 60 if duration_seconds else 0
-
-                # Получаем статистику пауз за сессию
-                all_pauses = get_session_pauses(db, active_session.id)
-                completed_pauses = [p for p in all_pauses if p.end_time]
-
-                await callback.message.answer(
-                    f"✅ **Перерыв завершен!**\n\n"
-                    f"⏱️ Длительность: {minutes} мин {seconds} сек\n"
-                    f"📝 Причина: {stopped_pause.reason or 'не указана'}\n\n"
-                    f"📊 **Статистика по паузам:**\n"
-                    f"• Перерывов в этой сессии: {len(completed_pauses)}\n"
-                    f"• Общее время пауз: {active_session.total_pause_seconds // 60} мин\n\n"
-                    f"💪 Возвращайтесь к работе!"
-                )
-            else:
-                await callback.message.answer("❌ Не удалось завершить перерыв.")
-
-            await callback.answer()
-
-        else:
-            # Нет активной паузы - начинаем новую
-            from keyboards.pause_reasons import get_pause_reasons_keyboard
-
-            await callback.message.answer(
-                "⏸️ **Начинаем перерыв**\n\n"
-                "Выберите причину перерыва:",
-                reply_markup=get_pause_reasons_keyboard()
-            )
-            await callback.answer()
+        summary = await time_calculator.end_pause(db, callback.from_user.id)
+        minutes, seconds = divmod(summary.duration_seconds, 60)
+
+        await show(
+            callback,
+            f"✅ **Перерыв завершен!**\n\n"
+            f"⏱️ Длительность: {minutes} мин {seconds} сек\n"
+            f"📝 Причина: {summary.reason or 'не указана'}\n\n"
+            f"📊 **Статистика по паузам:**\n"
+            f"• Перерывов в этой сессии: {summary.pauses_count}\n"
+            f"• Общее время пауз: {summary.total_pause_seconds // 60} мин\n\n"
+            f"💪 Возвращайтесь к работе!",
+            reply_markup=MAIN_MENU
+        )
+        await callback.answer()
 
-    except Exception as e:
-        await callback.message.answer("❌ Произошла ошибка при работе с перерывом.")
-        print(f"Ошибка pause: {e}")
+    except NoActivePause:
+        await show(
+            callback,
+            "⏸️ **Начинаем перерыв**\n\n"
+            "Выберите причину перерыва:",
+            reply_markup=PAUSE_REASONS_KEYBOARD
+        )
+        await callback.answer()
+    except NotRegistered:
+        await show(callback, "⚠️ Сначала используйте /start для регистрации.", reply_markup=MAIN_MENU)
+        await callback.answer()
+    except NoActiveSession:
+        await show(
+            callback,
+            "⚠️ У вас нет активного рабочего дня.\n"
+            "Используйте 'Начать день' чтобы начать работу.",
+            reply_markup=MAIN_MENU
+        )
+        await callback.answer()
+    except Exception:
+        await show(callback, "❌ Произошла ошибка при работе с перерывом.", reply_markup=MAIN_MENU)
+        logger.exception("Ошибка pause")
 
-    finally:
-        next(db_gen, None)
 
-@router.callback_query(lambda c: c.data.startswith("pause_reason:"))
-async def process_pause_reason(callback:types.CallbackQuery):
+@callbacks.handler(PauseCallback, PauseAction.REASON)
+async def process_pause_reason(callback: types.CallbackQuery, callback_data: PauseCallback, db: AsyncSession):
     """Обработка выбора причины паузы"""
 
-    # Получаем причину паузы
-    reason_code = callback.data.split(":")[1]
-
-    # Список причин
-    reason_map = {
-        "coffee": "☕ Кофе-брейк",
-        "lunch": "🍽️ Обед",
-        "call": "📞 Звонок/встреча",
-        "technical": "💻 Технический перерыв",
-        "smoke": "🚬 Перекур",
-        "away": "🚶 Отлучился",
-        "none": "🎯 Без причины"
-    }
-    reason_text = reason_map.get(reason_code, "Не указана")
-
-    user = callback.from_user
-    telegram_id = user.id
-
-    db_gen = get_db()
-    db = next(db_gen)
+    reason_text = PAUSE_REASONS.get(callback_data.reason, "Не указана")
 
     try:
-        # Находим пользователя
-        db_user = get_user_by_telegram_id(db=db, telegram_id=telegram_id)
-        if not db_user:
-            await callback.message.answer("⚠️ Ошибка: пользователь не найден.")
-            await callback.answer()
-            return
-
-        # Находим активную сессию
-        active_session = get_active_session(db, db_user.id)
-        if not active_session:
-            await callback.message.answer("⚠️ Нет активной рабочей сессии.")
-            await callback.answer()
-            return
+        new_pause = await time_calculator.begin_pause(db, callback.from_user.id, reason_text)
 
-        # Создаем паузу с выбранной причиной
-        new_pause = start_pause(db=db, session_id=active_session.id, reason=reason_text)
-
-        from keyboards.pause_reasons import get_pause_actions_keyboard
-
-        await callback.message.edit_text(
+        await show(
+            callback,
             f"✅ **Перерыв начат!**\n\n"
             f"⏸️ Причина: {reason_text}\n"
             f"⏰ Время начала: {new_pause.start_time.strftime('%H:%M:%S')}\n\n"
             f"💡 Используйте кнопку 'Пауза' чтобы завершить перерыв.",
-            reply_markup=get_pause_actions_keyboard()
+            reply_markup=PAUSE_ACTIONS_KEYBOARD
         )
-
         await callback.answer()
 
-    except Exception as e:
-        await callback.message.answer("❌ Не удалось начать перерыв.")
-        print(f"Ошибка process_pause_reason: {e}")
-
-    finally:
-        next(db_gen, None)
+    except NotRegistered:
+        await show(callback, "⚠️ Ошибка: пользователь не найден.", reply_markup=MAIN_MENU)
+        await callback.answer()
+    except NoActiveSession:
+        await show(callback, "⚠️ Нет активной рабочей сессии.", reply_markup=MAIN_MENU)
+        await callback.answer()
+    except PauseAlreadyStarted:
+        await show(
+            callback,
+            "⏸️ Перерыв уже идет.\n\n💡 Нажмите 'Пауза' чтобы завершить перерыв.",
+            reply_markup=PAUSE_ACTIONS_KEYBOARD
+        )
+        await callback.answer()
+    except Exception:
+        await show(callback, "❌ Не удалось начать перерыв.", reply_markup=MAIN_MENU)
+        logger.exception("Ошибка process_pause_reason")
 
 
-@router.callback_query(lambda c: c.data == "pause_cancel")
+@callbacks.handler(PauseCallback, PauseAction.CANCEL)
 async def process_pause_cancel(callback: types.CallbackQuery):
     """Отмена начала перерыва"""
-    await callback.message.edit_text(
+    await show(
+        callback,
         "❌ **Начало перерыва отменено**\n\n"
         "Вы можете продолжить работу.\n"
-        "Для перерыва нажмите кнопку 'Пауза' еще раз."
+        "Для перерыва нажмите кнопку 'Пауза' еще раз.",
+        reply_markup=MAIN_MENU
     )
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "pause_stop")
-async def process_pause_stop(callback: types.CallbackQuery):
+@callbacks.handler(PauseCallback, PauseAction.STOP)
+async def process_pause_stop(callback: types.CallbackQuery, db: AsyncSession):
     """Завершить перерыв из меню паузы"""
-    await process_pause(callback)
+    await process_pause(callback, db)
 
 
-@router.callback_query(lambda c: c.data == "pause_info")
-async def process_pause_info(callback: types.CallbackQuery):
+@callbacks.handler(PauseCallback, PauseAction.INFO)
+async def process_pause_info(callback: types.CallbackQuery, db: AsyncSession):
     """Информация о текущей паузе"""
 
-    user = callback.from_user
-    telegram_id = user.id
-
-    db_gen = get_db()
-    db = next(db_gen)
-
     try:
-        # 1. Находим пользователя
-        db_user = get_user_by_telegram_id(db, telegram_id)
-        if not db_user:
-            await callback.message.answer("⚠️ Ошибка: пользователь не найден.")
-            await callback.answer()
-            return
-
-        # 2. Находим активную сессию
-        active_session = get_active_session(db, db_user.id)
-        if not active_session:
-            await callback.message.answer("⚠️ Нет активной рабочей сессии.")
-            await callback.answer()
-            return
-
-        # 3. Находим активную паузу
-        active_pause = get_active_pause(db, active_session.id)
+        session = (await time_calculator.get_state(db, callback.from_user.id)).require_session()
 
-        if not active_pause:
-            await callback.message.answer("ℹ️ **Нет активного перерыва**\n\nСейчас вы не на перерыве.")
+        if not session.pause:
+            await show(callback, "ℹ️ **Нет активного перерыва**\n\nСейчас вы не на перерыве.", reply_markup=MAIN_MENU)
             await callback.answer()
             return
 
-        # 4. Рассчитываем длительность текущей паузы
-        now = datetime.utcnow()
-        duration = now - active_pause.start_time
-        minutes = int(duration.total_seconds() // 60)
-        seconds = int(duration.total_seconds() % 60)
+        minutes, seconds = divmod(time_calculator.pause_elapsed_seconds(session.pause), 60)
 
-        # 5. Получаем статистику по всем паузам сессии
-        all_pauses = get_session_pauses(db, active_session.id)
-        completed_pauses = [p for p in all_pauses if p.end_time]
-
-        await callback.message.answer(
+        await show(
+            callback,
             f"ℹ️ **Информация о перерыве**\n\n"
-            f"⏸️ Причина: {active_pause.reason or 'не указана'}\n"
-            f"⏰ Начало: {active_pause.start_time.strftime('%H:%M:%S')}\n"
+            f"⏸️ Причина: {session.pause.reason or 'не указана'}\n"
+            f"⏰ Начало: {session.pause.start_time.strftime('%H:%M:%S')}\n"
             f"⏱️ Прошло: {minutes} мин {seconds} сек\n\n"
             f"📊 **Статистика за сессию:**\n"
-            f"• Всего перерывов: {len(completed_pauses)}\n"
+            f"• Всего перерывов: {session.pauses_count}\n"
             f"• Активный перерыв: 1\n"
-            f"• Общее время пауз: {active_session.total_pause_seconds // 60} мин\n\n"
-            f"💡 Нажмите 'Пауза' чтобы завершить перерыв."
+            f"• Общее время пауз: {session.total_pause_seconds // 60} мин\n\n"
+            f"💡 Нажмите 'Пауза' чтобы завершить перерыв.",
+            reply_markup=PAUSE_ACTIONS_KEYBOARD
         )
-
         await callback.answer()
 
-    except Exception as e:
-        await callback.message.answer("❌ Ошибка при получении информации о паузе.")
-        print(f"Ошибка pause_info: {e}")
-
-    finally:
-        next(db_gen, None)
-
+    except NotRegistered:
+        await show(callback, "⚠️ Ошибка: пользователь не найден.", reply_markup=MAIN_MENU)
+        await callback.answer()
+    except NoActiveSession:
+        await show(callback, "⚠️ Нет активной рабочей сессии.", reply_markup=MAIN_MENU)
+        await callback.answer()
+    except Exception:
+        await show(callback, "❌ Ошибка при получении информации о паузе.", reply_markup=MAIN_MENU)
+        logger.exception("Ошибка pause_info")
 
 
-@router.callback_query(lambda c: c.data == "stats_menu")
+@callbacks.handler(MenuCallback, MenuAction.STATS)
 async def process_stats_menu(callback: types.CallbackQuery):
     """Показать меню статистики"""
-    await callback.message.edit_text(
+    await show(
+        callback,
         "📊 **Меню статистики**\n\n"
         "Выберите период:",
-        reply_markup=get_stats_menu()
+        reply_markup=STATS_MENU
     )
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "stats_today")
+@callbacks.handler(StatsCallback, StatsPeriod.TODAY)
 async def process_stats_today(callback: types.CallbackQuery):
     """Статистика за сегодня"""
-    await callback.message.answer(
+    await show(
+        callback,
         "📊 **Статистика за сегодня**\n\n"
         "Эта функция в разработке.\n"
-        "Используйте команду /today для полной статистики."
+        "Используйте команду /today для полной статистики.",
+        reply_markup=STATS_MENU
     )
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "stats_week")
+@callbacks.handler(StatsCallback, StatsPeriod.WEEK)
 async def process_stats_week(callback: types.CallbackQuery):
     """Статистика за неделю"""
-    await callback.message.answer(
+    await show(
+        callback,
         "📅 **Статистика за неделю**\n\n"
         "Эта функция в разработке.\n"
-        "Используйте команду /week для полной статистики."
+        "Используйте команду /week для полной статистики.",
+        reply_markup=STATS_MENU
     )
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "help")
+@callbacks.handler(MenuCallback, MenuAction.HELP)
 async def process_help(callback: types.CallbackQuery):
     """Показать помощь"""
-    # Импортируем здесь, чтобы избежать циклических импортов
-    from handlers.start import cmd_help
-    await cmd_help(callback.message)
+    await show(callback, HELP_TEXT, reply_markup=MAIN_MENU)
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "settings")
+@callbacks.handler(MenuCallback, MenuAction.SETTINGS)
 async def process_settings(callback: types.CallbackQuery):
     """Настройки (заглушка)"""
-    await callback.message.answer(
+    await show(
+        callback,
         "⚙️ **Настройки**\n\n"
         "Эта функция находится в разработке.\n"
         "Скоро здесь можно будет:\n"
         "• Изменить часовой пояс\n"
         "• Настроить уведомления\n"
-        "• Установить цели на день"
+        "• Установить цели на день",
+        reply_markup=MAIN_MENU
     )
     await callback.answer()
 
 
-@router.callback_query(lambda c: c.data == "stats_month")
-async def process_stats_month(callback: types.CallbackQuery):
-    """Статистика за месяц (заглушка)"""
-    await callback.message.answer(
-        "📈 **Статистика за месяц**\n\n"
-        "Эта функция находится в разработке.\n"
-        "Скоро здесь будет детальная статистика за месяц."
-    )
-    await callback.answer()
+@callbacks.handler(StatsCallback, StatsPeriod.MONTH)
+async def process_stats_month(callback: types.CallbackQuery, db: AsyncSession):
+    """Статистика за текущий месяц (по неделям)"""
 
+    telegram_id = callback.from_user.id
 
-@router.callback_query(lambda c: c.data == "stats_all")
-async def process_stats_all(callback: types.CallbackQuery):
-    """Статистика за все время (заглушка)"""
-    await callback.message.answer(
-        "📊 **Статистика за все время**\n\n"
-        "Эта функция находится в разработке.\n"
-        "Скоро здесь будет полная история вашей работы."
-    )
-    await callback.answer()
+    try:
+        db_user = await get_user_by_telegram_id(db, telegram_id)
+        if not db_user:
+            await show(callback, "⚠️ Сначала используйте /start для регистрации.", reply_markup=MAIN_MENU)
+            await callback.answer()
+            return
+
+        month_start = datetime.utcnow().date().replace(day=1)
+        stats = await get_period_stats(db, db_user.id, bucket="week", date_from=month_start)
+
+        if not stats['buckets']:
+            await show(
+                callback,
+                "📈 **Статистика за месяц**\n\n"
+                "ℹ️ В этом месяце еще не было завершенных рабочих сессий.",
+                reply_markup=STATS_MENU
+            )
+            await callback.answer()
+            return
+
+        response_lines = [
+            f"📈 **СТАТИСТИКА ЗА МЕСЯЦ** ({month_start.strftime('%m.%Y')})",
+            ""
+        ]
+
+        # Статистика по неделям
+        for week in stats['buckets']:
+            week_start = max(datetime.strptime(week['period'], '%Y-%m-%d').date(), month_start)
+            response_lines.append(
+                f"📅 **Неделя с {week_start.strftime('%d.%m')}** "
+                f"({week['days_count']} дн., {week['sessions_count']} сессий):\n"
+                f"   ⏱️ Работа: {time_calculator.format_hours_minutes(week['work_seconds'])}\n"
+                f"   ⏸️ Паузы: {week['pause_seconds'] // 60}мин\n"
+                f"   📊 Продуктивность: {week['productivity']}%"
+            )
+
+        response_lines.extend(_format_totals(stats['totals'], "📈 **ИТОГО ЗА МЕСЯЦ:**"))
+
+        await show(callback, "\n".join(response_lines), reply_markup=STATS_MENU)
+        await callback.answer()
+
+    except Exception:
+        await show(callback, "❌ Ошибка при получении статистики за месяц.", reply_markup=STATS_MENU)
+        logger.exception("Ошибка stats_month")
+
+
+@callbacks.handler(StatsCallback, StatsPeriod.ALL)
+async def process_stats_all(callback: types.CallbackQuery, db: AsyncSession):
+    """Статистика за все время (по месяцам)"""
+
+    telegram_id = callback.from_user.id
+
+    try:
+        db_user = await get_user_by_telegram_id(db, telegram_id)
+        if not db_user:
+            await show(callback, "⚠️ Сначала используйте /start для регистрации.", reply_markup=MAIN_MENU)
+            await callback.answer()
+            return
+
+        stats = await get_period_stats(db, db_user.id, bucket="month")
+
+        if not stats['buckets']:
+            await show(
+                callback,
+                "📊 **Статистика за все время**\n\n"
+                "ℹ️ Завершенных рабочих сессий пока нет.\n"
+                "Используйте /start_work чтобы начать учет времени.",
+                reply_markup=STATS_MENU
+            )
+            await callback.answer()
+            return
+
+        response_lines = ["📊 **СТАТИСТИКА ЗА ВСЕ ВРЕМЯ**", ""]
+
+        # Статистика по месяцам
+        for month in stats['buckets']:
+            month_label = datetime.strptime(month['period'], '%Y-%m').strftime('%m.%Y')
+            response_lines.append(
+                f"📅 **{month_label}** ({month['days_count']} дн., {month['sessions_count']} сессий): "
+                f"{time_calculator.format_hours_minutes(month['work_seconds'])}, {month['productivity']}%"
+            )
+
+        response_lines.extend(_format_totals(stats['totals'], "📈 **ИТОГО:**"))
+
+        await show(callback, "\n".join(response_lines), reply_markup=STATS_MENU)
+        await callback.answer()
+
+    except Exception:
+        await show(callback, "❌ Ошибка при получении статистики за все время.", reply_markup=STATS_MENU)
+        logger.exception("Ошибка stats_all")
+
+
+def _format_totals(totals: dict, title: str) -> list:
+    """Строки итоговой статистики за период"""
+    return [
+        "",
+        title,
+        f"📅 Рабочих дней: {totals['days_count']}",
+        f"📊 Всего сессий: {totals['sessions_count']}",
+        f"⏱️ Общее время работы: {time_calculator.format_hours_minutes(totals['total_work_seconds'])}",
+        f"⏸️ Общее время пауз: {totals['total_pause_seconds'] // 60}мин",
+        f"📊 Средняя продуктивность: {totals['productivity']}%",
+    ]
 
 
-@router.callback_query()
+@callbacks.fallback
 async def process_unknown_callback(callback: types.CallbackQuery):
     """Обработка неизвестных callback-запросов"""
     await callback.answer("⚠️ Неизвестная команда", show_alert=True)
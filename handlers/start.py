@@ -1,8 +1,9 @@
 from aiogram import Router, types
 from aiogram.filters import Command
 
-from database import get_db, add_user
-from keyboards.main_menu import get_main_menu
+from database import add_user, writer
+from keyboards.main_menu import MAIN_MENU
+from utils.logger import get_logger
 
 """
 Обработчик команд /start и /help
@@ -10,6 +11,30 @@ from keyboards.main_menu import get_main_menu
 
 
 router = Router()
+logger = get_logger(__name__)
+
+HELP_TEXT = (
+    "ℹ️ **Помощь по использованию бота:**\n\n"
+    "🎯 **Основные команды:**\n"
+    "• /start_work - начать рабочий день\n"
+    "• /stop_work - закончить рабочий день\n"
+    "• /pause - начать/закончить перерыв\n"
+    "• /today - статистика за сегодня\n"
+    "• /week - статистика за неделю\n\n"
+
+    "📱 **Использование меню:**\n"
+    "Используйте кнопки меню для быстрого доступа к функциям\n\n"
+
+    "⏰ **Рекомендации:**\n"
+    "1. Начинайте день командой /start_work\n"
+    "2. Делайте перерывы каждые 1.5-2 часа\n"
+    "3. Завершайте день командой /stop_work\n"
+    "4. Смотрите статистику для анализа продуктивности\n\n"
+
+    "📞 **Поддержка:**\n"
+    "Если возникли проблемы, напишите разработчику"
+)
+
 
 @router.message(Command("start"))
 async def cmd_start(message: types.Message):
@@ -21,12 +46,9 @@ async def cmd_start(message: types.Message):
     first_name = user.first_name
     last_name = user.last_name
 
-    # Получаем сессию БД
-    db_get = get_db()
-    db = next(db_get)
     try:
-        db_user = add_user(
-            db=db,
+        db_user = await writer.run(
+            add_user,
             telegram_id=telegram_id,
             username=username,
             first_name=first_name,
@@ -46,39 +68,15 @@ async def cmd_start(message: types.Message):
             "/help - помощь\n\n"
             "💡 Начните с команды /start_work"
         )
-        await message.answer(welcome_text, reply_markup=get_main_menu())
-    except Exception as e:
+        await message.answer(welcome_text, reply_markup=MAIN_MENU)
+    except Exception:
         await message.answer("⚠️ Произошла ошибка. Попробуйте еще раз.")
-        print(f"Ошибка при старте {e}")
-    finally:
-        # Закрываем сессию в БД
-        next(db_get, None)
+        logger.exception("Ошибка при старте")
 
 @router.message(Command("help"))
 async def cmd_help(message: types.Message):
     """Обработчик команды help/"""
-    help_text = (
-        "ℹ️ **Помощь по использованию бота:**\n\n"
-        "🎯 **Основные команды:**\n"
-        "• /start_work - начать рабочий день\n"
-        "• /stop_work - закончить рабочий день\n"
-        "• /pause - начать/закончить перерыв\n"
-        "• /today - статистика за сегодня\n"
-        "• /week - статистика за неделю\n\n"
-
-        "📱 **Использование меню:**\n"
-        "Используйте кнопки меню для быстрого доступа к функциям\n\n"
-
-        "⏰ **Рекомендации:**\n"
-        "1. Начинайте день командой /start_work\n"
-        "2. Делайте перерывы каждые 1.5-2 часа\n"
-        "3. Завершайте день командой /stop_work\n"
-        "4. Смотрите статистику для анализа продуктивности\n\n"
-
-        "📞 **Поддержка:**\n"
-        "Если возникли проблемы, напишите разработчику"
-    )
-    await message.answer(help_text)
+    await message.answer(HELP_TEXT, reply_markup=MAIN_MENU)
 
 # Команда для показа меню
 @router.message(Command("menu"))
@@ -87,5 +85,5 @@ async def cmd_menu(message: types.Message):
     await message.answer(
         "🤖 **Главное меню**\n\n"
         "Выберите действие:",
-        reply_markup=get_main_menu()
+        reply_markup=MAIN_MENU
     )
\ No newline at end of file
@@ -1,14 +1,19 @@
 from aiogram import Router, types
 from aiogram.filters import Command
-from keyboards.main_menu import get_main_menu
+from sqlalchemy.ext.asyncio import AsyncSession
+from keyboards.main_menu import MAIN_MENU
 
 from datetime import datetime, timedelta
 from database import (
-    get_db, get_user_by_telegram_id, get_active_session,
-    get_today_sessions, get_week_sessions,
-    calculate_session_stats, calculate_daily_stats
+    get_user_by_telegram_id,
+    get_today_sessions, get_sessions_daily_stats, get_period_stats,
+    calculate_session_stats
 )
+from services.session_state import session_state
+from services.time_calculator import format_hours_minutes
+from utils.logger import get_logger
 router = Router()
+logger = get_logger(__name__)
 
 
 """
@@ -17,29 +22,27 @@ router = Router()
 
 
 @router.message(Command("today"))
-async def cmd_today(message: types.Message):
+async def cmd_today(message: types.Message, db: AsyncSession):
     """Статистика за сегодня"""
 
     # Получаем id пользователя ТГ
     telegram_id = message.from_user.id
 
-    # Получаем сессию БД
-    db_get = get_db()
-    db = next(db_get)
-
     try:
         # Ищем пользователя в БД
-        db_user = get_user_by_telegram_id(db=db, telegram_id=telegram_id)
+        db_user = await get_user_by_telegram_id(db=db, telegram_id=telegram_id)
         if not db_user:
             await message.answer("⚠️ Сначала используйте /start для регистрации.")
             return
-        # Проверяем активную сессию
-        active_session = get_active_session(db=db, user_id=db_user.id)
+        # Проверяем активную сессию (состояние в памяти)
+        active_session = session_state.get(db_user.id)
         # Получаем сессии за сегодня
-        today_sessions = get_today_sessions(db=db, user_id=db_user.id)
+        today_sessions = await get_today_sessions(db=db, user_id=db_user.id)
 
-        # Рассчитываем статистику
-        daily_stats = calculate_daily_stats(sessions=today_sessions)
+        # Итоги дня - из дневной сводки daily_stats (завершенные сессии), как у /week и /month
+        today_stats = await get_period_stats(db, db_user.id, bucket="day", date_from=datetime.utcnow().date())
+        totals = today_stats['totals']
+        total_work_seconds = totals['total_work_seconds']
 
         # Готовим ответ
         response_lines = [
@@ -77,49 +80,41 @@ async def cmd_today(message: types.Message):
         # Общая статистика
         response_lines.extend([
             f"📈 **ОБЩАЯ СТАТИСТИКА:**",
-            f"📅 Сессий сегодня: {daily_stats['sessions_count']}",
-            f"⏱️ Общее время работы: {daily_stats['total_work_hours']}ч {daily_stats['total_work_minutes']}мин",
-            f"⏸️ Общее время пауз: {daily_stats['total_pause_minutes']}мин",
-            f"📊 Продуктивность: {daily_stats['productivity']}%",
+            f"📅 Сессий сегодня: {totals['sessions_count']}",
+            f"⏱️ Общее время работы: {format_hours_minutes(total_work_seconds)}",
+            f"⏸️ Общее время пауз: {totals['total_pause_seconds'] // 60}мин",
+            f"📊 Продуктивность: {totals['productivity']}%",
         ])
 
         if not active_session and not today_sessions:
             response_lines.append("\nℹ️ Сегодня еще не было рабочих сессий.")
 
-        await message.answer("\n".join(response_lines))
-        await message.answer(
-            "🔙 Возврат в главное меню:",
-            reply_markup=get_main_menu()
-        )
+        await message.answer("\n".join(response_lines), reply_markup=MAIN_MENU)
 
-    except Exception as e:
+    except Exception:
         await message.answer("❌ Ошибка при получении статистики.")
-        print(f"Ошибка today: {e}")
+        logger.exception("Ошибка today")
 
-    finally:
-        next(db_get, None)
 
 
 @router.message(Command("week"))
-async def cmd_week(message: types.Message):
+async def cmd_week(message: types.Message, db: AsyncSession):
     """Статистика за неделю"""
 
     telegram_id = message.from_user.id
 
-    db_gen = get_db()
-    db = next(db_gen)
-
     try:
         # 1. Находим пользователя
-        db_user = get_user_by_telegram_id(db, telegram_id)
+        db_user = await get_user_by_telegram_id(db, telegram_id)
         if not db_user:
             await message.answer("⚠️ Сначала используйте /start для регистрации.")
             return
 
-        # 2. Получаем сессии за неделю
-        week_sessions = get_week_sessions(db, db_user.id)
+        # 2. Статистика по дням и итоги за 7 дней - одним запросом
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        week_stats = await get_sessions_daily_stats(db, db_user.id, since=week_ago)
 
-        if not week_sessions:
+        if not week_stats['buckets']:
             await message.answer(
                 "📅 **СТАТИСТИКА ЗА НЕДЕЛЮ**\n\n"
                 "ℹ️ За последние 7 дней не было рабочих сессий.\n"
@@ -127,69 +122,41 @@ async def cmd_week(message: types.Message):
             )
             return
 
-        # 3. Группируем по дням
-        daily_data = {}
-        for session in week_sessions:
-            date_str = session.date.strftime('%d.%m.%Y')
-            if date_str not in daily_data:
-                daily_data[date_str] = []
-            daily_data[date_str].append(session)
-
-        # 4. Рассчитываем статистику
-        total_work_seconds = 0
-        total_pause_seconds = 0
-
         response_lines = [
             "📅 **СТАТИСТИКА ЗА НЕДЕЛЮ**",
             f"📆 Период: последние 7 дней",
             ""
         ]
 
-        # Статистика по дням
-        for date_str, sessions in sorted(daily_data.items(), reverse=True):
-            day_stats = calculate_daily_stats(sessions)
-
-            total_work_seconds += day_stats['total_work_seconds']
-            total_pause_seconds += day_stats['total_pause_seconds']
+        # 3. Статистика по дням (новые первыми)
+        for day_stats in week_stats['buckets']:
+            date_str = datetime.strptime(day_stats['period'], '%Y-%m-%d').strftime('%d.%m.%Y')
 
             response_lines.append(
                 f"📅 **{date_str}** ({day_stats['sessions_count']} сессий):\n"
-                f"   ⏱️ Работа: {day_stats['total_work_hours']}ч {day_stats['total_work_minutes']}мин\n"
-                f"   ⏸️ Паузы: {day_stats['total_pause_minutes']}мин\n"
+                f"   ⏱️ Работа: {format_hours_minutes(day_stats['work_seconds'])}\n"
+                f"   ⏸️ Паузы: {day_stats['pause_seconds'] // 60}мин\n"
                 f"   📊 Продуктивность: {day_stats['productivity']}%"
             )
 
-        # Итоговая статистика
-        total_work_hours = total_work_seconds // 3600
-        total_work_minutes = (total_work_seconds % 3600) // 60
-        total_pause_minutes = total_pause_seconds // 60
-
-        if total_work_seconds + total_pause_seconds > 0:
-            total_productivity = int((total_work_seconds / (total_work_seconds + total_pause_seconds)) * 100)
-        else:
-            total_productivity = 0
+        # 4. Итоговая статистика
+        totals = week_stats['totals']
+        total_work_seconds = totals['total_work_seconds']
 
         response_lines.extend([
             "",
             "📈 **ИТОГО ЗА НЕДЕЛЮ:**",
-            f"📅 Всего дней: {len(daily_data)}",
-            f"📊 Всего сессий: {len(week_sessions)}",
-            f"⏱️ Общее время работы: {total_work_hours}ч {total_work_minutes}мин",
-            f"⏸️ Общее время пауз: {total_pause_minutes}мин",
-            f"📊 Средняя продуктивность: {total_productivity}%",
+            f"📅 Всего дней: {totals['days_count']}",
+            f"📊 Всего сессий: {totals['sessions_count']}",
+            f"⏱️ Общее время работы: {format_hours_minutes(total_work_seconds)}",
+            f"⏸️ Общее время пауз: {totals['total_pause_seconds'] // 60}мин",
+            f"📊 Средняя продуктивность: {totals['productivity']}%",
             "",
             "💡 **Совет:** Старайтесь сохранять продуктивность выше 80%!"
         ])
 
-        await message.answer("\n".join(response_lines))
-        await message.answer(
-            "🔙 Возврат в главное меню:",
-            reply_markup=get_main_menu()
-        )
+        await message.answer("\n".join(response_lines), reply_markup=MAIN_MENU)
 
-    except Exception as e:
+    except Exception:
         await message.answer("❌ Ошибка при получении статистики за неделю.")
-        print(f"Ошибка week: {e}")
-
-    finally:
-        next(db_gen, None)
\ No newline at end of file
+        logger.exception("Ошибка week")
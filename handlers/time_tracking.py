@@ -1,15 +1,15 @@
-from datetime import datetime
 from aiogram import Router, types
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-from keyboards.main_menu import get_main_menu
+from sqlalchemy.ext.asyncio import AsyncSession
+from keyboards.main_menu import MAIN_MENU
 
-from database import (
-    get_db, get_user_by_telegram_id, get_active_session,
-    get_active_pause, start_pause, stop_pause, get_session_pauses, WorkSession
-)
+from services import time_calculator
+from services.time_calculator import (NotRegistered, NoActiveSession, SessionAlreadyStarted,
+                                     NoActivePause, PauseAlreadyStarted)
+from utils.logger import get_logger
 
 """
 Обработчик команд учета времени
@@ -17,6 +17,7 @@ from database import (
 
 
 router = Router()
+logger = get_logger(__name__)
 
 
 # Состояния для FSM (Finite State Machine)
@@ -24,231 +25,120 @@ class PauseStates(StatesGroup):
     waiting_for_reason = State()  # Ожидаем причину паузы
 
 @router.message(Command("start_work"))
-async def cmd_start_work(message: types.Message):
+async def cmd_start_work(message: types.Message, db: AsyncSession):
     """Начать рабочий день"""
 
-    user = message.from_user
-    telegram_id = user.id
-
-    # Получаем сессию БД
-    db_get = get_db()
-    db = next(db_get)
-
     try:
-        # 1. Находим пользователя в БД
-        db_user = get_user_by_telegram_id(db, telegram_id)
-        if not db_user:
-            await message.answer("⚠️ Сначала используйте /start для регистрации.")
-            return
-
-        # 2. Проверяем, нет ли активной сессии
-        active_session = get_active_session(db, db_user.id)
-        if active_session:
-            start_time = active_session.start_time.strftime("%H:%M")
-            await message.answer(
-                f"⏰ Рабочий день уже начат в {start_time}!\n"
-                f"Используйте /stop_work чтобы закончить."
-            )
-            return
-
-        # 3. Создаем новую рабочую сессию
-        new_session = WorkSession(
-            user_id=db_user.id,
-            start_time=datetime.utcnow(),
-            date=datetime.utcnow(),
-            description="Рабочий день начат"
-        )
-
-        db.add(new_session)
-        db.commit()
-        db.refresh(new_session)
+        new_session = await time_calculator.start_work(db, message.from_user.id)
 
-        # 4. Отправляем подтверждение
-        start_time_local = new_session.start_time.strftime("%H:%M")
         await message.answer(
             f"✅ **Рабочий день начат!**\n"
-            f"⏰ Время: {start_time_local}\n"
+            f"⏰ Время: {new_session.start_time.strftime('%H:%M')}\n"
             f"📅 Дата: {new_session.date.strftime('%d.%m.%Y')}\n\n"
             f"💡 Теперь можно:\n"
             f"• /pause - сделать перерыв\n"
-            f"• /stop_work - закончить день"
+            f"• /stop_work - закончить день",
+            reply_markup=MAIN_MENU
         )
+
+    except NotRegistered:
+        await message.answer("⚠️ Сначала используйте /start для регистрации.")
+    except SessionAlreadyStarted as e:
         await message.answer(
-            "🔙 Возврат в главное меню:",
-            reply_markup=get_main_menu()
+            f"⏰ Рабочий день уже начат в {e.session.start_time.strftime('%H:%M')}!\n"
+            f"Используйте /stop_work чтобы закончить."
         )
-
-    except Exception as e:
+    except Exception:
         await message.answer("❌ Произошла ошибка при начале рабочего дня.")
-        print(f"Ошибка start_work: {e}")
+        logger.exception("Ошибка start_work")
 
-    finally:
-        # Закрываем сессию БД
-        next(db_get, None)
 
 @router.message(Command("stop_work"))
-async def cmd_stop_work(message: types.Message):
+async def cmd_stop_work(message: types.Message, db: AsyncSession):
     """Закончить рабочий день"""
 
-    user = message.from_user
-    telegram_id = user.id
-
-    # Получаем сессию БД
-    db_get = get_db()
-    db = next(db_get)
-
     try:
+        summary = await time_calculator.stop_work(db, message.from_user.id)
+        work_duration = time_calculator.format_hours_minutes(summary.work_seconds) or "Не удалось рассчитать время"
 
-        # 1. Находим пользователя в БД.
-        db_user = get_user_by_telegram_id(db=db, telegram_id=telegram_id)
-        if not db_user:
-            await message.answer("⚠️ Сначала используйте /start для регистрации.")
-            return
-
-        # 2. Находим активную сессию
-        active_session = get_active_session(db, user_id=db_user.id)
-        if not active_session:
-            await message.answer("⚠️ У вас нет активного рабочего дня.\nИспользуйте /start_work чтобы начать.")
-            return
-
-        # 3. Завершаем сессию
-        active_session.end_time = datetime.utcnow()
-        db.commit()
-
-        # 4. Рассчитываем время работы сессии
-        if active_session.total_work_seconds:
-            total_seconds = active_session.total_work_seconds
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-
-            work_duration = f"{hours}ч {minutes}мин"
-        else:
-            work_duration = "Не удалось рассчитать время"
-
-        # 5. Отправляем отчет
         await message.answer(
             f"✅ **Рабочий день завершен!**\n\n"
             f"📊 **Статистика за день:**\n"
-            f"⏱️ Начало: {active_session.start_time.strftime('%H:%M')}\n"
-            f"⏱️ Конец: {active_session.end_time.strftime('%H:%M')}\n"
+            f"⏱️ Начало: {summary.start_time.strftime('%H:%M')}\n"
+            f"⏱️ Конец: {summary.end_time.strftime('%H:%M')}\n"
             f"⏱️ Общее время: {work_duration}\n"
-            f"⏸️ Перерывы: {active_session.total_pause_seconds // 60} мин\n\n"
-            f"🏁 Отличная работа! Хорошего отдыха!"
+            f"⏸️ Перерывы: {summary.pause_seconds // 60} мин\n\n"
+            f"🏁 Отличная работа! Хорошего отдыха!",
+            reply_markup=MAIN_MENU
         )
-        await message.answer(
-            "🔙 Возврат в главное меню:",
-            reply_markup=get_main_menu()
-        )
-    except Exception as e:
-        await message.answer("❌ Произошла ошибка при завершении рабочего дня.")
-        print(f"Ошибка stop_work: {e}")
 
-    finally:
-        next(db_get, None)
+    except NotRegistered:
+        await message.answer("⚠️ Сначала используйте /start для регистрации.")
+    except NoActiveSession:
+        await message.answer("⚠️ У вас нет активного рабочего дня.\nИспользуйте /start_work чтобы начать.")
+    except Exception:
+        await message.answer("❌ Произошла ошибка при завершении рабочего дня.")
+        logger.exception("Ошибка stop_work")
 
 
 @router.message(Command("pause"))
-async def cmd_pause(message: types.Message, state: FSMContext):
+async def cmd_pause(message: types.Message, state: FSMContext, db: AsyncSession):
     """Начать/закончить перерыв"""
 
-    telegram_id = message.from_user.id
-
-    db_gen = get_db()
-    db = next(db_gen)
-
     try:
-        # 1. Находим пользователя
-        db_user = get_user_by_telegram_id(db, telegram_id)
-        if not db_user:
-            await message.answer("⚠️ Сначала используйте /start для регистрации.")
-            return
-
-        # 2. Проверяем активную сессию
-        active_session = get_active_session(db, db_user.id)
-        if not active_session:
-            await message.answer(
-                "⚠️ У вас нет активного рабочего дня.\n"
-                "Используйте /start_work чтобы начать работу."
-            )
-            return
-
-        # 3. Проверяем активную паузу
-        active_pause = get_active_pause(db, active_session.id)
-
-        if active_pause:
-            # Есть активная пауза - завершаем ее
-            stopped_pause = stop_pause(db, active_pause.id)
-
-            if stopped_pause and stopped_pause.end_time:
-                # Рассчитываем длительность паузы
-                duration = stopped_pause.duration_seconds
-                minutes = duration // 60 if duration else 0
-
-                # Получаем все паузы сессии для статистики
-                all_pauses = get_session_pauses(db, active_session.id)
-                completed_pauses = [p for p in all_pauses if p.end_time]
-                total_pause_minutes = active_session.total_pause_seconds // 60
-
-                await message.answer(
-                    f"✅ **Перерыв завершен!**\n\n"
-                    f"⏸️ Длительность: {minutes} мин\n"
-                    f"📝 Причина: {stopped_pause.reason or 'не указана'}\n\n"
-                    f"📊 **Статистика по паузам:**\n"
-                    f"• Всего перерывов: {len(completed_pauses)}\n"
-                    f"• Общее время пауз: {total_pause_minutes} мин\n\n"
-                    f"💪 Возвращайтесь к работе!"
-                )
-            else:
-                await message.answer("❌ Не удалось завершить перерыв.")
-
-        else:
-            # Нет активной паузы - начинаем новую
-
-            # Создаем клавиатуру с частыми причинами
-            keyboard = ReplyKeyboardMarkup(
-                keyboard=[
-                    [KeyboardButton(text="☕ Кофе-брейк")],
-                    [KeyboardButton(text="🍽️ Обед")],
-                    [KeyboardButton(text="📞 Звонок")],
-                    [KeyboardButton(text="🚬 Перекур")],
-                    [KeyboardButton(text="🚫 Без причины")]
-                ],
-                resize_keyboard=True,
-                one_time_keyboard=True
-            )
-
-            # Устанавливаем состояние ожидания причины
-            await state.set_state(PauseStates.waiting_for_reason)
-            await state.update_data(session_id=active_session.id)
+        # Идет перерыв - завершаем его
+        summary = await time_calculator.end_pause(db, message.from_user.id)
 
-            await message.answer(
-                "⏸️ **Начинаем перерыв**\n\n"
-                "Выберите причину или напишите свою:",
-                reply_markup=keyboard
-            )
+        await message.answer(
+            f"✅ **Перерыв завершен!**\n\n"
+            f"⏸️ Длительность: {summary.duration_seconds // 60} мин\n"
+            f"📝 Причина: {summary.reason or 'не указана'}\n\n"
+            f"📊 **Статистика по паузам:**\n"
+            f"• Всего перерывов: {summary.pauses_count}\n"
+            f"• Общее время пауз: {summary.total_pause_seconds // 60} мин\n\n"
+            f"💪 Возвращайтесь к работе!",
+            reply_markup=MAIN_MENU
+        )
 
-    except Exception as e:
+    except NoActivePause:
+        # Перерыва нет - начинаем новый: спрашиваем причину
+        keyboard = ReplyKeyboardMarkup(
+            keyboard=[
+                [KeyboardButton(text="☕ Кофе-брейк")],
+                [KeyboardButton(text="🍽️ Обед")],
+                [KeyboardButton(text="📞 Звонок")],
+                [KeyboardButton(text="🚬 Перекур")],
+                [KeyboardButton(text="🚫 Без причины")]
+            ],
+            resize_keyboard=True,
+            one_time_keyboard=True
+        )
+        await state.set_state(PauseStates.waiting_for_reason)
+        await message.answer(
+            "⏸️ **Начинаем перерыв**\n\n"
+            "Выберите причину или напишите свою:",
+            reply_markup=keyboard
+        )
+    except NotRegistered:
+        await message.answer("⚠️ Сначала используйте /start для регистрации.")
+    except NoActiveSession:
+        await message.answer(
+            "⚠️ У вас нет активного рабочего дня.\n"
+            "Используйте /start_work чтобы начать работу."
+        )
+    except Exception:
         await message.answer("❌ Произошла ошибка при работе с перерывом.")
-        print(f"Ошибка pause: {e}")
-
-    finally:
-        next(db_gen, None)
+        logger.exception("Ошибка pause")
 
 
 @router.message(PauseStates.waiting_for_reason)
-async def process_pause_reason(message: types.Message, state: FSMContext):
+async def process_pause_reason(message: types.Message, state: FSMContext, db: AsyncSession):
     """Обработка причины паузы"""
 
     reason = message.text
-    user_data = await state.get_data()
-    session_id = user_data.get("session_id")
-
-    db_gen = get_db()
-    db = next(db_gen)
 
     try:
-        # Создаем паузу с указанной причиной
-        new_pause = start_pause(db, session_id, reason)
+        new_pause = await time_calculator.begin_pause(db, message.from_user.id, reason)
 
         await message.answer(
             f"✅ **Перерыв начат!**\n\n"
@@ -259,13 +149,17 @@ async def process_pause_reason(message: types.Message, state: FSMContext):
             reply_markup=types.ReplyKeyboardRemove()  # Убираем клавиатуру
         )
 
-    except Exception as e:
+    except (NotRegistered, NoActiveSession):
+        await message.answer("⚠️ Нет активной рабочей сессии.", reply_markup=types.ReplyKeyboardRemove())
+    except PauseAlreadyStarted:
+        await message.answer("⏸️ Перерыв уже идет. Используйте /pause чтобы закончить.",
+                             reply_markup=types.ReplyKeyboardRemove())
+    except Exception:
         await message.answer("❌ Не удалось начать перерыв.")
-        print(f"Ошибка process_pause_reason: {e}")
+        logger.exception("Ошибка process_pause_reason")
 
     finally:
         await state.clear()
-        next(db_gen, None)
 
 
 # Добавим команду для отмены
@@ -0,0 +1,85 @@
+from enum import Enum
+from typing import Dict, Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+"""
+Типизированные callback_data инлайн-кнопок.
+
+Первое поле каждой фабрики - ключ, по которому CallbackRouter выбирает обработчик:
+"menu:start_work" -> (menu, start_work), "pause:reason:lunch" -> (pause, reason).
+"""
+
+
+class MenuAction(str, Enum):
+    MAIN = "main"
+    START_WORK = "start_work"
+    STOP_WORK = "stop_work"
+    PAUSE = "pause"
+    STATS = "stats"
+    HELP = "help"
+    SETTINGS = "settings"
+
+
+class StatsPeriod(str, Enum):
+    TODAY = "today"
+    WEEK = "week"
+    MONTH = "month"
+    ALL = "all"
+
+
+class PauseAction(str, Enum):
+    REASON = "reason"
+    CANCEL = "cancel"
+    STOP = "stop"
+    INFO = "info"
+
+
+class MenuCallback(CallbackData, prefix="menu"):
+    """Кнопки главного меню"""
+    action: MenuAction
+
+
+class StatsCallback(CallbackData, prefix="stats"):
+    """Кнопки меню статистики"""
+    period: StatsPeriod
+
+
+class PauseCallback(CallbackData, prefix="pause"):
+    """Выбор причины и действия с паузой"""
+    action: PauseAction
+    reason: Optional[str] = None
+
+
+PAUSE_REASONS = {
+    "coffee": "☕ Кофе-брейк",
+    "lunch": "🍽️ Обед",
+    "call": "📞 Звонок/встреча",
+    "technical": "💻 Технический перерыв",
+    "smoke": "🚬 Перекур",
+    "away": "🚶 Отлучился",
+    "none": "🎯 Без причины"
+}
+
+# callback_data кнопок, отправленных до перехода на фабрики (остаются в старых сообщениях)
+LEGACY_CALLBACKS: Dict[str, str] = {
+    "main_menu": MenuCallback(action=MenuAction.MAIN).pack(),
+    "main_manu": MenuCallback(action=MenuAction.MAIN).pack(),
+    "start_work": MenuCallback(action=MenuAction.START_WORK).pack(),
+    "stop_work": MenuCallback(action=MenuAction.STOP_WORK).pack(),
+    "pause": MenuCallback(action=MenuAction.PAUSE).pack(),
+    "stats_menu": MenuCallback(action=MenuAction.STATS).pack(),
+    "help": MenuCallback(action=MenuAction.HELP).pack(),
+    "settings": MenuCallback(action=MenuAction.SETTINGS).pack(),
+    "stats_today": StatsCallback(period=StatsPeriod.TODAY).pack(),
+    "stats_week": StatsCallback(period=StatsPeriod.WEEK).pack(),
+    "stats_month": StatsCallback(period=StatsPeriod.MONTH).pack(),
+    "stats_all": StatsCallback(period=StatsPeriod.ALL).pack(),
+    "pause_cancel": PauseCallback(action=PauseAction.CANCEL).pack(),
+    "pause_stop": PauseCallback(action=PauseAction.STOP).pack(),
+    "pause_info": PauseCallback(action=PauseAction.INFO).pack(),
+    **{
+        f"pause_reason:{code}": PauseCallback(action=PauseAction.REASON, reason=code).pack()
+        for code in PAUSE_REASONS
+    }
+}
@@ -1,37 +1,47 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from keyboards.callback_data import MenuCallback, MenuAction, StatsCallback, StatsPeriod
+
+"""
+Клавиатуры меню собираются один раз при импорте и переиспользуются во всех ответах
+(объекты aiogram неизменяемые, поэтому их безопасно отдавать всем обработчикам).
+"""
+
+MAIN_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="▶️ Начать день", callback_data=MenuCallback(action=MenuAction.START_WORK).pack()),
+        InlineKeyboardButton(text="⏸️ Пауза", callback_data=MenuCallback(action=MenuAction.PAUSE).pack())
+    ],
+    [
+        InlineKeyboardButton(text="📊 Статистика", callback_data=MenuCallback(action=MenuAction.STATS).pack()),
+        InlineKeyboardButton(text="⏹️ Завершить день", callback_data=MenuCallback(action=MenuAction.STOP_WORK).pack())
+    ],
+    [
+        InlineKeyboardButton(text="ℹ️ Помощь", callback_data=MenuCallback(action=MenuAction.HELP).pack()),
+        InlineKeyboardButton(text="⚙️ Настройки", callback_data=MenuCallback(action=MenuAction.SETTINGS).pack())
+    ]
+])
+
+STATS_MENU = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="📅 Сегодня", callback_data=StatsCallback(period=StatsPeriod.TODAY).pack()),
+        InlineKeyboardButton(text="📅 Неделя", callback_data=StatsCallback(period=StatsPeriod.WEEK).pack())
+    ],
+    [
+        InlineKeyboardButton(text="📈 Месяц", callback_data=StatsCallback(period=StatsPeriod.MONTH).pack()),
+        InlineKeyboardButton(text="📊 Все время", callback_data=StatsCallback(period=StatsPeriod.ALL).pack())
+    ],
+    [
+        InlineKeyboardButton(text="🔙 Назад", callback_data=MenuCallback(action=MenuAction.MAIN).pack())
+    ]
+])
+
 
 def get_main_menu():
     """Основное меню бота"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="▶️ Начать день", callback_data="start_work"),
-            InlineKeyboardButton(text="⏸️ Пауза", callback_data="pause")
-        ],
-        [
-            InlineKeyboardButton(text="📊 Статистика", callback_data="stats_menu"),
-            InlineKeyboardButton(text="⏹️ Завершить день", callback_data="stop_work")
-        ],
-        [
-            InlineKeyboardButton(text="ℹ️ Помощь", callback_data="help"),
-            InlineKeyboardButton(text="⚙️ Настройки", callback_data="settings")
-        ]
-    ])
-    return keyboard
+    return MAIN_MENU
+
 
 def get_stats_menu():
     """Меню статистики"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="📅 Сегодня", callback_data="stats_today"),
-            InlineKeyboardButton(text="📅 Неделя", callback_data="stats_week")
-        ],
-        [
-            InlineKeyboardButton(text="📈 Месяц", callback_data="stats_month"),
-            InlineKeyboardButton(text="📊 Все время", callback_data="stats_all")
-        ],
-        [
-            InlineKeyboardButton(text="🔙 Назад", callback_data="main_manu")
-        ]
-    ])
-    return keyboard
\ No newline at end of file
+    return STATS_MENU
@@ -1,37 +1,44 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
-"""Клавиатура выбора паузы"""
+from keyboards.callback_data import MenuCallback, MenuAction, PauseCallback, PauseAction
+
+"""Клавиатуры выбора и действий с паузой (собираются один раз при импорте)"""
+
+PAUSE_REASONS_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="☕ Кофе-брейк", callback_data=PauseCallback(action=PauseAction.REASON, reason="coffee").pack()),
+        InlineKeyboardButton(text="🍽️ Обед", callback_data=PauseCallback(action=PauseAction.REASON, reason="lunch").pack())
+    ],
+    [
+        InlineKeyboardButton(text="📞 Звонок/встреча", callback_data=PauseCallback(action=PauseAction.REASON, reason="call").pack()),
+        InlineKeyboardButton(text="💻 Технический перерыв", callback_data=PauseCallback(action=PauseAction.REASON, reason="technical").pack())
+    ],
+    [
+        InlineKeyboardButton(text="🚬 Перекур", callback_data=PauseCallback(action=PauseAction.REASON, reason="smoke").pack()),
+        InlineKeyboardButton(text="🚶 Отлучился", callback_data=PauseCallback(action=PauseAction.REASON, reason="away").pack())
+    ],
+    [
+        InlineKeyboardButton(text="🎯 Без причины", callback_data=PauseCallback(action=PauseAction.REASON, reason="none").pack()),
+        InlineKeyboardButton(text="❌ Отмена", callback_data=PauseCallback(action=PauseAction.CANCEL).pack())
+    ]
+])
+
+PAUSE_ACTIONS_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="⏸️ Завершить перерыв", callback_data=PauseCallback(action=PauseAction.STOP).pack()),
+        InlineKeyboardButton(text="ℹ️ Инфо о паузе", callback_data=PauseCallback(action=PauseAction.INFO).pack())
+    ],
+    [
+        InlineKeyboardButton(text="🔙 В меню", callback_data=MenuCallback(action=MenuAction.MAIN).pack())
+    ]
+])
+
 
 def get_pause_reasons_keyboard():
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="☕ Кофе-брейк", callback_data="pause_reason:coffee"),
-            InlineKeyboardButton(text="🍽️ Обед", callback_data="pause_reason:lunch")
-        ],
-        [
-            InlineKeyboardButton(text="📞 Звонок/встреча", callback_data="pause_reason:call"),
-            InlineKeyboardButton(text="💻 Технический перерыв", callback_data="pause_reason:technical")
-        ],
-        [
-            InlineKeyboardButton(text="🚬 Перекур", callback_data="pause_reason:smoke"),
-            InlineKeyboardButton(text="🚶 Отлучился", callback_data="pause_reason:away")
-        ],
-        [
-            InlineKeyboardButton(text="🎯 Без причины", callback_data="pause_reason:none"),
-            InlineKeyboardButton(text="❌ Отмена", callback_data="pause_cancel")
-        ]
-    ])
-    return keyboard
+    """Клавиатура выбора причины паузы"""
+    return PAUSE_REASONS_KEYBOARD
+
 
 def get_pause_actions_keyboard():
     """Клавиатура действий с паузой"""
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="⏸️ Завершить перерыв", callback_data="pause_stop"),
-            InlineKeyboardButton(text="ℹ️ Инфо о паузе", callback_data="pause_info")
-        ],
-        [
-            InlineKeyboardButton(text="🔙 В меню", callback_data="main_menu")
-        ]
-    ])
-    return keyboard
\ No newline at end of file
+    return PAUSE_ACTIONS_KEYBOARD
@@ -0,0 +1,39 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+"""
+Middleware сессии БД: одна AsyncSession на апдейт
+"""
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает отдельную сессию БД для каждого апдейта и передает ее
+    в хендлер аргументом `db`. В конце обработки транзакция фиксируется
+    одним commit(), при исключении - откатывается.
+
+    Сессия живет в рамках задачи обработки апдейта, поэтому параллельно
+    обрабатываемые апдейты никогда не делят одну сессию.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker[AsyncSession]):
+        self.session_pool = session_pool
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        async with self.session_pool() as session:
+            data["db"] = session
+            try:
+                result = await handler(event, data)
+            except Exception:
+                await session.rollback()
+                raise
+            await session.commit()
+            return result
@@ -0,0 +1,122 @@
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.types import TelegramObject, Update
+
+from services.metrics import Metrics
+from utils.logger import get_logger
+
+"""
+Middleware идемпотентности: повторно доставленные апдейты и двойные нажатия
+"""
+
+logger = get_logger(__name__)
+
+ActionKey = Tuple[int, str, str]  # (telegram id, тип апдейта, текст команды или данные кнопки)
+
+
+class IdempotencyMiddleware(BaseMiddleware):
+    """
+    Outer-middleware dp.update (после LogContextMiddleware).
+
+    - Повторная доставка: последние ring_size update_id хранятся в кольцевом буфере,
+      апдейт с уже виденным update_id не обрабатывается (Telegram повторяет апдейты
+      после таймаута вебхука или переподключения поллинга).
+    - Двойное нажатие: в течение window секунд после завершения действия пользователя
+      (та же кнопка или тот же текст сообщения) такое же действие не запускает
+      обработчик и не трогает БД, а получает результат первого; у кнопки гасится
+      "часики" (answerCallbackQuery), ответ пользователь уже получил от первого.
+
+    Outer-middleware dp.update выполняется внутри блокировки UserOrderIsolation:
+    апдейты одного пользователя приходят сюда строго по одному, поэтому второе
+    нажатие всегда видит уже завершенное первое. Помнится только последнее действие
+    пользователя: Пауза -> Отмена -> Пауза выполняет вторую Паузу заново. Упавшее
+    действие не запоминается - повтор выполнит его заново.
+    """
+
+    def __init__(self, ring_size: int = 1024, window: float = 1.0, registry: Optional[Metrics] = None):
+        self.window = window
+        self.registry = registry
+        self._seen: Set[int] = set()
+        self._ring: Deque[int] = deque()
+        self._ring_size = ring_size
+        # telegram id -> (ключ последнего действия, время завершения, результат)
+        self._finished: Dict[int, Tuple[ActionKey, float, Any]] = {}
+
+    # ==================== ПОВТОРНАЯ ДОСТАВКА ====================
+
+    def seen(self, update_id: int) -> bool:
+        """Запомнить update_id; True, если он уже был среди последних ring_size"""
+        if update_id in self._seen:
+            return True
+        self._seen.add(update_id)
+        self._ring.append(update_id)
+        if len(self._ring) > self._ring_size:
+            self._seen.discard(self._ring.popleft())
+        return False
+
+    # ==================== ДВОЙНЫЕ НАЖАТИЯ ====================
+
+    @staticmethod
+    def action_key(update: Update) -> Optional[ActionKey]:
+        """Ключ действия: кнопка или текстовое сообщение пользователя; None - не склеивать"""
+        if update.callback_query and update.callback_query.data:
+            return update.callback_query.from_user.id, "callback_query", update.callback_query.data
+        if update.message and update.message.text and update.message.from_user:
+            return update.message.from_user.id, "message", update.message.text
+        return None
+
+    def _prune(self, now: float) -> None:
+        expired = [user_id for user_id, (_, finished_at, _) in self._finished.items()
+                   if now - finished_at > self.window]
+        for user_id in expired:
+            del self._finished[user_id]
+
+    def _suppressed(self, reason: str) -> None:
+        if self.registry:
+            self.registry.observe_suppressed(reason)
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        if self.seen(event.update_id):
+            logger.info(f"Повторная доставка апдейта {event.update_id} пропущена")
+            self._suppressed("redelivered")
+            return None
+
+        key = self.action_key(event)
+        if key is None:
+            return await handler(event, data)
+
+        user_id = key[0]
+        self._prune(time.monotonic())
+        last = self._finished.get(user_id)
+        if last is not None and last[0] == key:
+            logger.info(f"Повторное действие {key[1]} {key[2]!r} пользователя {user_id} склеено с первым")
+            return await self._repeat(last[2], event, data)
+
+        # Новое действие вытесняет предыдущее действие пользователя (и при ошибке тоже)
+        self._finished.pop(user_id, None)
+        result = await handler(event, data)
+        self._finished[user_id] = (key, time.monotonic(), result)
+        return result
+
+    async def _repeat(self, result: Any, event: Update, data: Dict[str, Any]) -> Any:
+        """Ответить повтору результатом первого действия"""
+        self._suppressed("coalesced")
+        if event.callback_query:
+            bot: Optional[Bot] = data.get("bot")
+            if bot is not None:
+                try:
+                    await bot.answer_callback_query(event.callback_query.id)
+                except Exception as e:
+                    logger.warning(f"Не удалось ответить на повторное нажатие: {e}")
+        return result
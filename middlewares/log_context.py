@@ -0,0 +1,33 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from utils.logger import update_id_var, user_id_var
+
+"""
+Middleware контекста логов: update_id и user_id текущего апдейта
+"""
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """
+    Выставляет update_id и telegram id пользователя в contextvars на время
+    обработки апдейта - их добавляет к каждой записи лога utils.logger.
+    Регистрируется как outer-middleware dp.update (после UserContextMiddleware aiogram).
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        update_token = update_id_var.set(event.update_id if isinstance(event, Update) else None)
+        user_token = user_id_var.set(user.id if user else None)
+        try:
+            return await handler(event, data)
+        finally:
+            update_id_var.reset(update_token)
+            user_id_var.reset(user_token)
@@ -0,0 +1,96 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.dispatcher.event.handler import CallableObject, HandlerObject
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject, Update
+
+from services.metrics import HandlerRun, Metrics, current_run
+from utils.callback_router import current_route
+
+"""
+Middleware метрик: апдейты, время и ошибки обработчиков, запросы к Bot API
+"""
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware dp.update: считает апдейты по типам"""
+
+    def __init__(self, registry: Metrics):
+        self.registry = registry
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Update):
+            self.registry.observe_update(event.event_type)
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner-middleware (dp.message, dp.callback_query): время выполнения и ошибки
+    каждого обработчика. Ошибкой считается исключение или запись уровня ERROR
+    в лог во время обработки (обработчики сами ловят свои исключения).
+    """
+
+    def __init__(self, registry: Metrics):
+        self.registry = registry
+
+    @staticmethod
+    def handler_name(handler: HandlerObject, route: Optional[CallableObject] = None) -> str:
+        # Кнопки разбирает одна функция CallbackRouter - берем обработчик, который она выбрала
+        callback = route.callback if route else handler.callback
+        module = callback.__module__.rsplit(".", 1)[-1]
+        return f"{module}.{callback.__name__}"
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        run = HandlerRun()
+        token = current_run.set(run)
+        route_token = current_route.set(None)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            run.failed = True
+            raise
+        finally:
+            name = self.handler_name(data["handler"], current_route.get())
+            current_route.reset(route_token)
+            current_run.reset(token)
+            self.registry.observe_handler(name, time.perf_counter() - started, run.failed)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Request-middleware бота: время каждого запроса к Bot API.
+    Регистрируется после OutboundQueueMiddleware, чтобы не учитывать ожидание в очереди.
+    """
+
+    def __init__(self, registry: Metrics):
+        self.registry = registry
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType,
+            bot: Bot,
+            method: TelegramMethod
+    ):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await make_request(bot, method)
+            failed = False
+            return result
+        finally:
+            self.registry.observe_api(method.__api_method__, time.perf_counter() - started, failed)
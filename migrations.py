@@ -0,0 +1,106 @@
+"""
+Версионные миграции схемы БД.
+
+Base.metadata.create_all создает только отсутствующие таблицы и не трогает
+уже существующие файлы worktime.db. Все изменения схемы после первой версии
+оформляются здесь как пронумерованные шаги; номера примененных шагов
+хранятся в таблице schema_migrations. Шаги должны быть идемпотентными:
+на новой БД create_all уже создал все объекты, и миграция их только отмечает.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List
+
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+@dataclass
+class Migration:
+    """Один шаг миграции"""
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]  # Выполняется синхронно внутри транзакции
+
+
+# Служебная таблица с примененными версиями
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=True),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+# ==================== ШАГИ МИГРАЦИЙ ====================
+
+def _v1_hot_query_indexes(conn: Connection) -> None:
+    """Составные и частичные индексы для get_active_session / get_active_pause / статистики"""
+    from database import WorkSession, Pause
+
+    # Перед уникальным индексом закрываем "забытые" дубли открытых сессий:
+    # более старая открытая сессия завершается временем начала следующей
+    conn.execute(text("""
+        UPDATE work_sessions
+        SET end_time = (
+            SELECT MIN(newer.start_time) FROM work_sessions AS newer
+            WHERE newer.user_id = work_sessions.user_id
+              AND newer.end_time IS NULL
+              AND newer.id > work_sessions.id
+        )
+        WHERE end_time IS NULL
+          AND EXISTS (
+            SELECT 1 FROM work_sessions AS newer
+            WHERE newer.user_id = work_sessions.user_id
+              AND newer.end_time IS NULL
+              AND newer.id > work_sessions.id
+          )
+    """))
+
+    for index in (*WorkSession.__table__.indexes, *Pause.__table__.indexes):
+        index.create(conn, checkfirst=True)
+
+
+def _v2_daily_stats_backfill(conn: Connection) -> None:
+    """
+    Заполнить таблицу daily_stats (создана create_all) по уже накопленным сессиям:
+    работа, паузы и число сессий - только по завершенным сессиям
+    """
+    from database import daily_stats_backfill_statements
+
+    for stmt in daily_stats_backfill_statements(conn.dialect.name):
+        conn.execute(stmt)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Индексы для горячих запросов (активная сессия/пауза, статистика)", _v1_hot_query_indexes),
+    Migration(2, "Дневные сводки daily_stats по существующим данным", _v2_daily_stats_backfill),
+]
+
+
+# ==================== ПРИМЕНЕНИЕ ====================
+
+def _upgrade(conn: Connection) -> List[int]:
+    _metadata.create_all(conn)
+    done = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        migration.upgrade(conn)
+        conn.execute(schema_migrations.insert().values(
+            version=migration.version,
+            description=migration.description
+        ))
+        applied.append(migration.version)
+    return applied
+
+
+async def migrate(engine: AsyncEngine) -> List[int]:
+    """Применить все еще не примененные миграции. Возвращает их номера"""
+    async with engine.begin() as conn:
+        return await conn.run_sync(_upgrade)
@@ -0,0 +1,185 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import config
+from database import FsmState, dialect_insert
+from services.write_batcher import GroupCommitWriter
+from utils.cache import TTLCache
+from utils.logger import get_logger
+
+"""
+Хранилище состояний FSM в БД вместо MemoryStorage.
+
+- Состояния переживают перезапуск (таблица fsm_states в той же БД).
+- Горячий путь идет через память: прочитанные и записанные состояния лежат
+  в ограниченном LRU-кэше, запись сначала попадает в буфер "грязных" ключей.
+- Буфер сбрасывается в БД одной транзакцией раз в fsm_flush_interval секунд
+  (и при остановке диспетчера): upsert непустых состояний, delete очищенных.
+  Если передан writer, сброс идет через общую пишущую задачу вместе с остальными записями.
+- Состояния, не менявшиеся дольше fsm_state_ttl, считаются брошенными:
+  при чтении они пустые, а при сбросе периодически удаляются из таблицы.
+"""
+
+logger = get_logger(__name__)
+
+PURGE_INTERVAL = 600  # Как часто удалять устаревшие состояния из БД, сек
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: datetime = field(default_factory=datetime.utcnow)
+
+    @property
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class DatabaseStorage(BaseStorage):
+    """FSM-хранилище aiogram поверх таблицы fsm_states с кэшем и отложенной записью"""
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker,
+            writer: Optional[GroupCommitWriter] = None,
+            ttl: int = config.db.fsm_state_ttl,
+            flush_interval: float = config.db.fsm_flush_interval,
+            cache_size: int = config.db.fsm_cache_size
+    ):
+        self.session_pool = session_pool
+        # Без запущенного writer запись идет сразу отдельной транзакцией
+        self.writer = writer or GroupCommitWriter(session_pool)
+        self.ttl = timedelta(seconds=ttl)
+        self.flush_interval = flush_interval
+        self.key_builder = DefaultKeyBuilder(
+            prefix="fsm", with_bot_id=True, with_business_connection_id=True, with_destiny=True
+        )
+
+        self._cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self._dirty: Dict[str, _Record] = {}  # Изменено, еще не сброшено в БД
+        self._flushing: Dict[str, _Record] = {}  # Сбрасывается в БД прямо сейчас
+        self._last_purge: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ==================== ЧТЕНИЕ / ЗАПИСЬ ====================
+
+    async def _get(self, key: StorageKey) -> _Record:
+        storage_key = self.key_builder.build(key)
+
+        record = self._dirty.get(storage_key) or self._flushing.get(storage_key) or self._cache.get(storage_key)
+        if record is None:
+            async with self.session_pool() as db:
+                row = await db.get(FsmState, storage_key)
+            loaded = _Record(row.state, json.loads(row.data), row.updated_at) if row else _Record()
+
+            # Пока читали БД, ключ мог быть записан (и даже уйти в сброс, вытесненный
+            # из кэша) - запись из памяти новее
+            record = self._dirty.get(storage_key) or self._flushing.get(storage_key) or self._cache.get(storage_key)
+            if record is None:
+                record = loaded
+                self._cache.set(storage_key, record)
+
+        if record.updated_at < datetime.utcnow() - self.ttl:
+            return _Record()
+        return record
+
+    async def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        record = _Record(state, data)
+        self._cache.set(storage_key, record)
+        self._dirty[storage_key] = record
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        await self._put(key, state.state if isinstance(state, State) else state, record.data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(key)).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        record = await self._get(key)
+        await self._put(key, record.state, dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(key)).data.copy()
+
+    # ==================== СБРОС В БД ====================
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Записать все накопленные изменения одной транзакцией"""
+        if not self._dirty:
+            return
+
+        self._flushing, self._dirty = self._dirty, {}
+        now = datetime.utcnow()
+        upserts = [
+            {"key": key, "state": record.state, "data": json.dumps(record.data, ensure_ascii=False),
+             "updated_at": record.updated_at}
+            for key, record in self._flushing.items() if not record.is_empty
+        ]
+        deletes = [key for key, record in self._flushing.items() if record.is_empty]
+
+        # Брошенные диалоги удаляем заодно, не чаще раза в PURGE_INTERVAL
+        purge = self._last_purge is None or now - self._last_purge > timedelta(seconds=PURGE_INTERVAL)
+
+        committed = False
+        try:
+            await self.writer.run(self._write, upserts, deletes, now - self.ttl if purge else None)
+            committed = True
+            if purge:
+                self._last_purge = now
+        except Exception:
+            logger.exception("Ошибка сохранения состояний FSM")
+        finally:
+            if not committed:
+                # Не сохраненное (ошибка или остановка) вернем в буфер,
+                # если ключ за это время не перезаписан
+                for key, record in self._flushing.items():
+                    self._dirty.setdefault(key, record)
+            self._flushing = {}
+
+    @staticmethod
+    async def _write(db: AsyncSession, upserts: list, deletes: list, expired_before: Optional[datetime]) -> None:
+        if upserts:
+            stmt = dialect_insert(db.bind.dialect.name)(FsmState)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[FsmState.key],
+                set_={
+                    "state": stmt.excluded.state,
+                    "data": stmt.excluded.data,
+                    "updated_at": stmt.excluded.updated_at
+                }
+            )
+            await db.execute(stmt, upserts)
+        if deletes:
+            await db.execute(delete(FsmState).where(FsmState.key.in_(deletes)))
+        if expired_before is not None:
+            await db.execute(delete(FsmState).where(FsmState.updated_at < expired_before))
+
+    async def close(self) -> None:
+        """Остановить фоновый сброс и записать остаток (вызывается диспетчером при остановке)"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+"""
+Метрики бота в памяти процесса и их отдача в формате Prometheus.
+
+- bot_handler_duration_seconds{handler}  - время обработчиков (гистограмма)
+- bot_handler_errors_total{handler}      - ошибки обработчиков: исключение или
+                                           запись уровня ERROR во время обработки
+- bot_updates_total{type}                - полученные апдейты (updates/sec = rate())
+- bot_updates_suppressed_total{reason}   - повторные доставки и склеенные двойные нажатия
+- bot_update_wait_seconds                - ожидание апдейта в очереди пользователя и общем пуле
+- bot_api_request_duration_seconds{method} - время запросов к Bot API
+- bot_api_errors_total{method}           - неудачные запросы к Bot API
+- bot_event_loop_lag_seconds             - задержка event loop (гистограмма)
+
+Все обновления - из одного event loop, без блокировок.
+"""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Обработчик текущего апдейта (для учета ошибок, записанных в лог)
+current_run: ContextVar[Optional["HandlerRun"]] = ContextVar("current_run", default=None)
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (как в Prometheus)"""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по корзинам (линейная интерполяция внутри корзины)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if count and seen + count >= rank:
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        sep = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}" if labels else f"{name}_sum {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}" if labels else f"{name}_count {self.count}")
+        return lines
+
+
+class HandlerRun:
+    """Отметка "во время обработки была ошибка" для текущего обработчика"""
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+
+class RateCounter:
+    """Количество событий за последние window секунд (кольцо посекундных счетчиков)"""
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self._counts = [0] * window
+        self._seconds = [0] * window
+
+    def add(self, now: Optional[float] = None) -> None:
+        second = int(now if now is not None else time.monotonic())
+        slot = second % self.window
+        if self._seconds[slot] != second:
+            self._seconds[slot] = second
+            self._counts[slot] = 0
+        self._counts[slot] += 1
+
+    def per_second(self, now: Optional[float] = None) -> float:
+        second = int(now if now is not None else time.monotonic())
+        total = sum(
+            count for count, at in zip(self._counts, self._seconds)
+            if second - self.window < at <= second
+        )
+        return total / self.window
+
+
+class Metrics:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.handler_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.handler_errors: Dict[str, int] = defaultdict(int)
+        self.updates: Dict[str, int] = defaultdict(int)
+        self.updates_rate = RateCounter()
+        self.updates_suppressed: Dict[str, int] = defaultdict(int)
+        self.update_wait = Histogram()
+        self.api_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.api_errors: Dict[str, int] = defaultdict(int)
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self._lag_task: Optional[asyncio.Task] = None
+
+    # ==================== СБОР ====================
+
+    def observe_update(self, update_type: str) -> None:
+        self.updates[update_type] += 1
+        self.updates_rate.add()
+
+    def observe_suppressed(self, reason: str) -> None:
+        """Апдейт не обработан: повторная доставка или склеенное двойное нажатие"""
+        self.updates_suppressed[reason] += 1
+
+    def observe_update_wait(self, seconds: float) -> None:
+        self.update_wait.observe(seconds)
+
+    def observe_handler(self, handler: str, seconds: float, failed: bool) -> None:
+        self.handler_latency[handler].observe(seconds)
+        if failed:
+            self.handler_errors[handler] += 1
+
+    def observe_api(self, method: str, seconds: float, failed: bool) -> None:
+        self.api_latency[method].observe(seconds)
+        if failed:
+            self.api_errors[method] += 1
+
+    def start_loop_monitor(self, interval: float = 0.5) -> None:
+        """Фоновая задача: насколько позже запланированного просыпается sleep()"""
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._monitor_loop(interval))
+
+    async def stop_loop_monitor(self) -> None:
+        if self._lag_task:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    async def _monitor_loop(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(0.0, loop.time() - started - interval))
+
+    # ==================== ОТДАЧА ====================
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        lines = [
+            "# HELP bot_handler_duration_seconds Время выполнения обработчика",
+            "# TYPE bot_handler_duration_seconds histogram",
+        ]
+        for handler, histogram in sorted(self.handler_latency.items()):
+            lines += histogram.render("bot_handler_duration_seconds", f'handler="{handler}"')
+
+        lines += ["# HELP bot_handler_errors_total Ошибки обработчика", "# TYPE bot_handler_errors_total counter"]
+        lines += [f'bot_handler_errors_total{{handler="{h}"}} {n}' for h, n in sorted(self.handler_errors.items())]
+
+        lines += ["# HELP bot_updates_total Полученные апдейты", "# TYPE bot_updates_total counter"]
+        lines += [f'bot_updates_total{{type="{t}"}} {n}' for t, n in sorted(self.updates.items())]
+
+        lines += [
+            "# HELP bot_updates_suppressed_total Апдейты без обработки (повторы)",
+            "# TYPE bot_updates_suppressed_total counter",
+        ]
+        lines += [f'bot_updates_suppressed_total{{reason="{r}"}} {n}' for r, n in sorted(self.updates_suppressed.items())]
+
+        lines += [
+            "# HELP bot_update_wait_seconds Ожидание апдейта в очереди пользователя и пуле обработки",
+            "# TYPE bot_update_wait_seconds histogram",
+        ]
+        lines += self.update_wait.render("bot_update_wait_seconds")
+
+        lines += [
+            "# HELP bot_api_request_duration_seconds Время запроса к Bot API",
+            "# TYPE bot_api_request_duration_seconds histogram",
+        ]
+        for method, histogram in sorted(self.api_latency.items()):
+            lines += histogram.render("bot_api_request_duration_seconds", f'method="{method}"')
+
+        lines += ["# HELP bot_api_errors_total Неудачные запросы к Bot API", "# TYPE bot_api_errors_total counter"]
+        lines += [f'bot_api_errors_total{{method="{m}"}} {n}' for m, n in sorted(self.api_errors.items())]
+
+        lines += ["# HELP bot_event_loop_lag_seconds Задержка event loop", "# TYPE bot_event_loop_lag_seconds histogram"]
+        lines += self.loop_lag.render("bot_event_loop_lag_seconds")
+
+        lines += [
+            "# HELP bot_uptime_seconds Время работы процесса",
+            "# TYPE bot_uptime_seconds gauge",
+            f"bot_uptime_seconds {time.monotonic() - self.started_at:.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def summary(self, top: int = 10) -> str:
+        """Краткая сводка для админской команды /metrics"""
+        uptime = int(time.monotonic() - self.started_at)
+        lines = [
+            "📈 **Метрики бота**",
+            f"⏱️ Аптайм: {uptime // 3600}ч {(uptime % 3600) // 60}мин",
+            f"📨 Апдейтов: {sum(self.updates.values())}, "
+            f"за последнюю минуту: {self.updates_rate.per_second():.2f}/с",
+            f"🔁 Повторов пропущено: доставок {self.updates_suppressed.get('redelivered', 0)}, "
+            f"нажатий {self.updates_suppressed.get('coalesced', 0)}",
+            f"⏳ Ожидание в очереди: p95 {self.update_wait.quantile(0.95) * 1000:.1f} мс",
+            f"🔄 Задержка event loop: p99 {self.loop_lag.quantile(0.99) * 1000:.1f} мс, "
+            f"макс {self.loop_lag.max * 1000:.1f} мс",
+            "",
+            "🧩 **Обработчики** (вызовов, p50/p95 мс, ошибок):",
+        ]
+        lines += self._top_lines(self.handler_latency, self.handler_errors, top)
+        lines += ["", "🌐 **Bot API** (запросов, p50/p95 мс, ошибок):"]
+        lines += self._top_lines(self.api_latency, self.api_errors, top)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _top_lines(latency: Dict[str, Histogram], errors: Dict[str, int], top: int) -> List[str]:
+        if not latency:
+            return ["• нет данных"]
+        ranked: List[Tuple[str, Histogram]] = sorted(
+            latency.items(), key=lambda item: item[1].quantile(0.95), reverse=True
+        )[:top]
+        return [
+            f"• {name}: {h.count}, {h.quantile(0.5) * 1000:.0f}/{h.quantile(0.95) * 1000:.0f}, {errors.get(name, 0)}"
+            for name, h in ranked
+        ]
+
+
+class ErrorCountHandler(logging.Handler):
+    """Помечает текущий обработчик как упавший, если он записал в лог ошибку"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        run = current_run.get()
+        if run is not None:
+            run.failed = True
+
+
+async def start_metrics_server(registry: "Metrics", host: str, port: int) -> web.AppRunner:
+    """HTTP-сервер с GET /metrics для Prometheus"""
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
+
+
+# Глобальный реестр метрик процесса
+metrics = Metrics()
@@ -0,0 +1,290 @@
+import asyncio
+import heapq
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import pytz
+from aiogram import Bot
+from sqlalchemy import select, exists, and_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import config, TimeConfig
+from database import User, WorkSession, Pause, Reminder, dialect_insert
+from services.outbound_queue import bulk_sends
+from services.write_batcher import GroupCommitWriter
+from utils.logger import get_logger
+
+"""
+Планировщик напоминаний:
+- "начните рабочий день" - в начале рабочего дня (пн-пт), если день не начат;
+- "вы на паузе уже N минут" - каждые notification_interval минут активной паузы;
+- "вы забыли завершить день" - после конца рабочего дня, пока сессия открыта.
+
+Один фоновый таск и куча (heap) задач по времени запуска - без таска на пользователя.
+Каждый запуск задачи - один запрос к БД по индексам, который сразу возвращает
+всех пользователей, кому пора напомнить. Факт отправки сохраняется в таблице
+reminders, поэтому после перезапуска напоминания не дублируются.
+
+Рассылка идет отдельной задачей, частями по chunk_size получателей: отметки
+части пишутся через общую пишущую задачу (GroupCommitWriter) до отправки,
+поэтому падение посреди рассылки не приводит к повторным сообщениям, а цикл
+планировщика не ждет запросов к Bot API.
+"""
+
+logger = get_logger(__name__)
+
+START_DAY = "start_day"
+LONG_PAUSE = "long_pause"
+FORGOT_STOP = "forgot_stop"
+
+
+@dataclass(order=True)
+class _Job:
+    """Задача планировщика: run_at - время запуска (UTC)"""
+    run_at: datetime
+    seq: int
+    name: str = field(compare=False)
+    action: Callable[[datetime], Awaitable[Optional[datetime]]] = field(compare=False)
+
+
+class ReminderScheduler:
+    """Планировщик напоминаний на asyncio + heapq"""
+
+    def __init__(
+            self,
+            bot: Bot,
+            session_pool: async_sessionmaker[AsyncSession],
+            time_config: TimeConfig = config.time,
+            tick_seconds: int = 60,
+            writer: Optional[GroupCommitWriter] = None,
+            chunk_size: int = 100
+    ):
+        self.bot = bot
+        self.session_pool = session_pool
+        # Без запущенного writer запись идет сразу отдельной транзакцией
+        self.writer = writer or GroupCommitWriter(session_pool)
+        self.chunk_size = chunk_size
+        self.time_config = time_config
+        self.tz = pytz.timezone(time_config.timezone)
+        self.interval = timedelta(minutes=time_config.notification_interval)
+        self.tick = timedelta(seconds=tick_seconds)
+
+        self._heap: List[_Job] = []
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._deliveries: Dict[str, asyncio.Task] = {}  # Идущая рассылка по виду напоминания
+
+    # ==================== УПРАВЛЕНИЕ ====================
+
+    def start(self) -> None:
+        """Запустить планировщик (задачи стартуют сразу - догоняем пропущенное за время простоя)"""
+        now = datetime.utcnow()
+        self.schedule(now, START_DAY, self._run_start_day)
+        self.schedule(now, LONG_PAUSE, self._run_long_pause)
+        self.schedule(now, FORGOT_STOP, self._run_forgot_stop)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Остановить планировщик и идущие рассылки"""
+        tasks = [task for task in (self._task, *self._deliveries.values()) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._deliveries.clear()
+
+    def schedule(self, run_at: datetime, name: str,
+                 action: Callable[[datetime], Awaitable[Optional[datetime]]]) -> None:
+        """Поставить задачу в очередь на время run_at (UTC)"""
+        heapq.heappush(self._heap, _Job(run_at, next(self._seq), name, action))
+        self._wakeup.set()
+
+    async def _loop(self) -> None:
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = (self._heap[0].run_at - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                # Спим до ближайшей задачи, но просыпаемся, если добавили более раннюю
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job = heapq.heappop(self._heap)
+            now = datetime.utcnow()
+            try:
+                next_run = await job.action(now)
+            except Exception:
+                logger.exception(f"Ошибка напоминаний {job.name}")
+                next_run = now + self.tick
+            if next_run is not None:
+                self.schedule(next_run, job.name, job.action)
+
+    # ==================== ВРЕМЯ ====================
+
+    def _local_to_utc(self, day, hour: int) -> datetime:
+        """Локальные дата+час рабочего часового пояса -> наивное UTC-время (как в БД)"""
+        local = self.tz.localize(datetime.combine(day, time(hour)))
+        return local.astimezone(pytz.utc).replace(tzinfo=None)
+
+    def _workday_bounds(self, now: datetime) -> Tuple[datetime, datetime, datetime]:
+        """(начало суток, начало рабочего дня, конец рабочего дня) сегодня в UTC"""
+        today = pytz.utc.localize(now).astimezone(self.tz).date()
+        return (
+            self._local_to_utc(today, 0),
+            self._local_to_utc(today, self.time_config.workday_start_hour),
+            self._local_to_utc(today, self.time_config.workday_end_hour),
+        )
+
+    def _next_workday_start(self, now: datetime) -> datetime:
+        """Начало ближайшего будущего рабочего дня (пн-пт) в UTC"""
+        day = pytz.utc.localize(now).astimezone(self.tz).date()
+        while True:
+            start = self._local_to_utc(day, self.time_config.workday_start_hour)
+            if start > now and day.weekday() < 5:
+                return start
+            day += timedelta(days=1)
+
+    # ==================== ЗАДАЧИ ====================
+
+    async def _run_start_day(self, now: datetime) -> Optional[datetime]:
+        """Напомнить начать день тем, кто сегодня еще не начинал"""
+        day_start, work_start, work_end = self._workday_bounds(now)
+        is_workday = pytz.utc.localize(now).astimezone(self.tz).weekday() < 5
+
+        if is_workday and work_start <= now < work_end:
+            started_today = exists().where(
+                WorkSession.user_id == User.id,
+                WorkSession.date >= day_start
+            )
+            working = exists().where(WorkSession.user_id == User.id, WorkSession.end_time.is_(None))
+            reminded = exists().where(
+                Reminder.user_id == User.id,
+                Reminder.kind == START_DAY,
+                Reminder.sent_at >= day_start
+            )
+            query = select(User.id, User.telegram_id).where(~started_today, ~working, ~reminded)
+            await self._notify(
+                query, START_DAY, now,
+                lambda row: "☀️ Доброе утро! Рабочий день начался.\n"
+                            "Не забудьте отметить начало: /start_work"
+            )
+            # Новые пользователи в течение дня тоже получат напоминание
+            return now + self.interval
+
+        return self._next_workday_start(now)
+
+    async def _run_long_pause(self, now: datetime) -> Optional[datetime]:
+        """Напомнить о паузах длиннее notification_interval (и повторять с тем же интервалом)"""
+        reminded = exists().where(
+            Reminder.user_id == WorkSession.user_id,
+            Reminder.kind == LONG_PAUSE,
+            Reminder.sent_at >= Pause.start_time,
+            Reminder.sent_at > now - self.interval
+        )
+        query = (
+            select(WorkSession.user_id.label("id"), User.telegram_id, Pause.start_time)
+            .select_from(Pause)
+            .join(WorkSession, WorkSession.id == Pause.session_id)
+            .join(User, User.id == WorkSession.user_id)
+            .where(
+                WorkSession.end_time.is_(None),  # Пауза завершенного дня - не "на паузе"
+                Pause.end_time.is_(None),
+                Pause.start_time <= now - self.interval,
+                ~reminded
+            )
+        )
+        await self._notify(
+            query, LONG_PAUSE, now,
+            lambda row: f"⏸️ Вы на паузе уже {int((now - row.start_time).total_seconds() // 60)} мин.\n"
+                        "Чтобы вернуться к работе, нажмите 'Пауза' или /pause"
+        )
+        return now + self.tick
+
+    async def _run_forgot_stop(self, now: datetime) -> Optional[datetime]:
+        """Напомнить завершить день тем, у кого сессия открыта после конца рабочего дня"""
+        day_start, work_start, work_end = self._workday_bounds(now)
+        # До конца рабочего дня "забытыми" считаются только сессии прошлых дней
+        cutoff = work_end if now >= work_end else day_start
+
+        reminded = and_(
+            Reminder.user_id == WorkSession.user_id,
+            Reminder.kind == FORGOT_STOP,
+            Reminder.sent_at >= WorkSession.start_time,
+            Reminder.sent_at > now - self.interval
+        )
+        query = (
+            select(WorkSession.user_id.label("id"), User.telegram_id, WorkSession.start_time)
+            .join(User, User.id == WorkSession.user_id)
+            .where(WorkSession.end_time.is_(None), WorkSession.start_time < cutoff, ~exists().where(reminded))
+        )
+        await self._notify(
+            query, FORGOT_STOP, now,
+            lambda row: f"⏹️ Рабочий день, начатый в {row.start_time.strftime('%H:%M')}, все еще не завершен.\n"
+                        "Не забудьте завершить его: /stop_work"
+        )
+        return now + self.tick
+
+    # ==================== ОТПРАВКА ====================
+
+    async def _notify(self, query, kind: str, now: datetime, render: Callable) -> int:
+        """
+        Выполнить запрос "кому пора" и запустить рассылку отдельной задачей.
+        Пока идет прошлая рассылка этого вида, новый запрос не выполняется: ее получатели
+        еще не все отмечены и попали бы в выборку повторно. Возвращает число получателей.
+        """
+        delivery = self._deliveries.get(kind)
+        if delivery is not None and not delivery.done():
+            return 0
+
+        # Сессия нужна только для запроса и закрывается до отправки
+        async with self.session_pool() as db:
+            rows = (await db.execute(query)).all()
+        if not rows:
+            return 0
+
+        messages = [(row.id, row.telegram_id, render(row)) for row in rows]
+        self._deliveries[kind] = asyncio.create_task(self._deliver(kind, now, messages))
+        return len(messages)
+
+    async def _deliver(self, kind: str, now: datetime, messages: List[Tuple[int, int, str]]) -> int:
+        """Разослать частями: сначала отметить часть в reminders, затем отправить ее"""
+        sent = 0
+        for start in range(0, len(messages), self.chunk_size):
+            chunk = messages[start:start + self.chunk_size]
+            await self.writer.run(
+                self._mark_sent, [{"user_id": user_id, "kind": kind, "sent_at": now} for user_id, _, _ in chunk]
+            )
+
+            # Рассылка с низким приоритетом: очередь отправки сама соблюдает лимиты
+            # Telegram и пропускает вперед ответы пользователям
+            with bulk_sends():
+                results = await asyncio.gather(
+                    *(self.bot.send_message(telegram_id, text) for _, telegram_id, text in chunk),
+                    return_exceptions=True
+                )
+            for (_, telegram_id, _), result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Не удалось отправить напоминание {kind} пользователю {telegram_id}: {result}")
+                else:
+                    sent += 1
+        return sent
+
+    @staticmethod
+    async def _mark_sent(db: AsyncSession, marks: List[dict]) -> None:
+        """Отметить отправку (одна строка на пользователя и вид напоминания)"""
+        stmt = dialect_insert(db.bind.dialect.name)(Reminder)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Reminder.user_id, Reminder.kind],
+            set_={"sent_at": stmt.excluded.sent_at}
+        )
+        await db.execute(stmt, marks)
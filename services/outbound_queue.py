@@ -0,0 +1,293 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+
+from utils.cache import TTLCache
+
+"""
+Центральная очередь исходящих сообщений Bot API.
+
+Все запросы с chat_id (sendMessage, editMessageText, sendDocument, ...) проходят
+через OutboundQueue, подключенную к bot.session как request-middleware:
+- общий token bucket на весь бот (по умолчанию 30 сообщений/с);
+- token bucket на каждый чат (1 сообщение/с с небольшим запасом на всплеск),
+  порядок сообщений внутри одного чата сохраняется;
+- приоритеты: ответы пользователям (INTERACTIVE) уходят раньше рассылок (BULK);
+- при 429 запрос повторяется после retry_after, чат и вся отправка бота
+  на это время приостанавливаются (флуд-лимит Telegram общий для бота);
+- разные чаты отправляются параллельно.
+"""
+
+INTERACTIVE = 0
+BULK = 10
+
+# Приоритет запросов текущего контекста (рассылки оборачиваются в bulk_sends())
+outbound_priority: ContextVar[int] = ContextVar("outbound_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def bulk_sends():
+    """Все отправки внутри блока получают низкий приоритет (фоновые рассылки)"""
+    token = outbound_priority.set(BULK)
+    try:
+        yield
+    finally:
+        outbound_priority.reset(token)
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0  # Пауза по retry_after
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до следующего токена (0 - можно отправлять)"""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, now: float, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+@dataclass
+class _Request:
+    call: Callable[[], Awaitable[Any]]
+    priority: int
+    future: asyncio.Future
+    attempts: int = 0
+
+
+@dataclass
+class _ChatQueue:
+    requests: Deque[_Request] = field(default_factory=deque)
+    in_flight: bool = False
+
+
+class OutboundQueue:
+    """Очередь исходящих запросов с ограничением скорости"""
+
+    def __init__(
+            self,
+            global_rate: float = 30,
+            chat_rate: float = 1,
+            chat_burst: int = 3,
+            max_retries: int = 3,
+            max_concurrency: int = 30
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._global: Optional[TokenBucket] = None
+        # Бакеты чатов: через минуту простоя бакет все равно полон - можно забыть.
+        # Бакет на паузе по 429 хранится до конца паузы плюс ttl (см. _execute)
+        self._buckets = TTLCache(maxsize=100000, ttl=60)
+        self._chats: Dict[int, _ChatQueue] = {}
+        self._ready: List[Tuple[int, int, int]] = []  # (приоритет, порядковый номер, chat_id)
+        self._queued: Set[int] = set()
+        self._delayed: List[Tuple[float, int]] = []  # (время готовности, chat_id)
+        self._seq = itertools.count()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._executing: Set[asyncio.Task] = set()
+
+    # ==================== УПРАВЛЕНИЕ ====================
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._global = TokenBucket(self.global_rate, self.global_rate, self._loop.time())
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Остановить очередь: выполняющиеся запросы дожидаются ответа,
+        ожидающие в очереди получают исключение (вызывающие не зависают)
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        await asyncio.gather(*self._executing, return_exceptions=True)
+        for chat in self._chats.values():
+            for request in chat.requests:
+                if not request.future.done():
+                    request.future.set_exception(RuntimeError("Очередь отправки остановлена"))
+        self._chats.clear()
+        self._ready.clear()
+        self._queued.clear()
+        self._delayed.clear()
+
+    @property
+    def pending(self) -> int:
+        """Количество запросов в очереди (включая выполняющиеся)"""
+        return sum(len(chat.requests) for chat in self._chats.values())
+
+    async def submit(self, chat_id: int, call: Callable[[], Awaitable[Any]], priority: Optional[int] = None) -> Any:
+        """Поставить запрос в очередь чата и дождаться его результата"""
+        if self._task is None:
+            # Очередь не запущена (скрипты, тесты) - отправляем напрямую
+            return await call()
+
+        request = _Request(
+            call=call,
+            priority=outbound_priority.get() if priority is None else priority,
+            future=self._loop.create_future()
+        )
+        chat = self._chats.setdefault(chat_id, _ChatQueue())
+        chat.requests.append(request)
+        if len(chat.requests) == 1 and not chat.in_flight:
+            self._push_ready(chat_id)
+        return await request.future
+
+    # ==================== ПЛАНИРОВАНИЕ ====================
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst, self._loop.time())
+            self._buckets.set(chat_id, bucket)
+        return bucket
+
+    def _push_ready(self, chat_id: int) -> None:
+        if chat_id in self._queued:
+            return
+        chat = self._chats[chat_id]
+        heapq.heappush(self._ready, (chat.requests[0].priority, next(self._seq), chat_id))
+        self._queued.add(chat_id)
+        self._wakeup.set()
+
+    async def _wait(self, timeout: Optional[float]) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            now = self._loop.time()
+
+            # Чаты, у которых закончилась пауза, возвращаем в очередь готовых
+            while self._delayed and self._delayed[0][0] <= now:
+                _, chat_id = heapq.heappop(self._delayed)
+                self._queued.discard(chat_id)
+                self._push_ready(chat_id)
+
+            if not self._ready:
+                await self._wait(self._delayed[0][0] - now if self._delayed else None)
+                continue
+
+            global_delay = self._global.delay(now)
+            if global_delay > 0:
+                await self._wait(global_delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            bucket = self._bucket(chat_id)
+            chat_delay = bucket.delay(now)
+            if chat_delay > 0:
+                heapq.heappush(self._delayed, (now + chat_delay, chat_id))
+                continue
+
+            self._queued.discard(chat_id)
+            bucket.take(now)
+            self._global.take(now)
+
+            await self._slots.acquire()
+            self._chats[chat_id].in_flight = True
+            task = asyncio.create_task(self._execute(chat_id))
+            self._executing.add(task)
+            task.add_done_callback(self._executing.discard)
+
+    async def _execute(self, chat_id: int) -> None:
+        chat = self._chats[chat_id]
+        request = chat.requests[0]
+        done = True
+        try:
+            # Вызывающий мог уже отменить ожидание - тогда запрос не отправляем
+            if not request.future.done():
+                result = await request.call()
+                if not request.future.done():
+                    request.future.set_result(result)
+        except TelegramRetryAfter as e:
+            request.attempts += 1
+            if request.attempts > self.max_retries:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            else:
+                # Повторим тот же запрос первым, когда Telegram разрешит. Флуд-лимит
+                # касается всего бота, поэтому паузу берет и общий бакет
+                now = self._loop.time()
+                bucket = self._bucket(chat_id)
+                bucket.block(now, e.retry_after)
+                # Бакет на паузе не должен вытесняться из кэша раньше ее конца
+                self._buckets.set(chat_id, bucket, ttl=self._buckets.ttl + e.retry_after)
+                self._global.block(now, e.retry_after)
+                done = False
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+        finally:
+            if done:
+                chat.requests.popleft()
+            chat.in_flight = False
+            self._slots.release()
+
+            if chat.requests:
+                self._push_ready(chat_id)
+            else:
+                del self._chats[chat_id]
+
+
+class OutboundQueueMiddleware(BaseRequestMiddleware):
+    """Request-middleware бота: запросы к чатам идут через OutboundQueue"""
+
+    def __init__(self, queue: OutboundQueue):
+        self.queue = queue
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType,
+            bot: Bot,
+            method: TelegramMethod
+    ):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # answerCallbackQuery, getUpdates и т.п. - без ограничений
+            return await make_request(bot, method)
+        return await self.queue.submit(chat_id, lambda: make_request(bot, method))
@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiofiles
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import User, WorkSession, Pause
+
+"""
+Выгрузка табеля (рабочие сессии вместе с паузами) в CSV или JSONL.
+
+Данные читаются потоково (yield_per + server-side курсор) и пишутся в файл
+блоками по CHUNK_ROWS строк, поэтому даже выгрузка за год по тысячам
+сотрудников не держит все объекты в памяти.
+"""
+
+EXPORT_FORMATS = ("csv", "jsonl")
+CHUNK_ROWS = 1000  # Строк из БД за одну выборку и сессий в одном блоке записи
+
+CSV_COLUMNS = [
+    "telegram_id", "username", "session_id", "date", "start_time", "end_time",
+    "work_seconds", "pause_seconds", "pauses_count", "pauses", "description",
+]
+
+
+def _timesheet_query(user_id: Optional[int], date_from: Optional[date], date_to: Optional[date]):
+    """Сессии с паузами (по строке на паузу), упорядоченные по сессиям"""
+    query = (
+        select(
+            User.telegram_id,
+            User.username,
+            WorkSession.id.label("session_id"),
+            WorkSession.date,
+            WorkSession.start_time,
+            WorkSession.end_time,
+            WorkSession.total_pause_seconds,
+            WorkSession.description,
+            Pause.id.label("pause_id"),
+            Pause.start_time.label("pause_start"),
+            Pause.end_time.label("pause_end"),
+            Pause.reason.label("pause_reason"),
+        )
+        .join(User, User.id == WorkSession.user_id)
+        .outerjoin(Pause, Pause.session_id == WorkSession.id)
+    )
+    if user_id is not None:
+        query = query.where(WorkSession.user_id == user_id)
+    if date_from is not None:
+        query = query.where(WorkSession.date >= date_from)
+    if date_to is not None:
+        query = query.where(WorkSession.date < date_to + timedelta(days=1))
+    return query.order_by(WorkSession.date, WorkSession.id, Pause.id)
+
+
+async def iter_timesheet(
+        db: AsyncSession,
+        user_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Потоково отдает сессии (dict) со списком пауз"""
+    query = _timesheet_query(user_id, date_from, date_to).execution_options(yield_per=CHUNK_ROWS)
+    result = await db.stream(query)
+
+    current = None
+    async for row in result:
+        if current is None or current["session_id"] != row.session_id:
+            if current is not None:
+                yield current
+            work_seconds = None
+            if row.end_time:
+                work_seconds = int((row.end_time - row.start_time).total_seconds() - (row.total_pause_seconds or 0))
+            current = {
+                "telegram_id": row.telegram_id,
+                "username": row.username,
+                "session_id": row.session_id,
+                "date": row.date.date().isoformat() if row.date else None,
+                "start_time": row.start_time.isoformat(),
+                "end_time": row.end_time.isoformat() if row.end_time else None,
+                "work_seconds": work_seconds,
+                "pause_seconds": row.total_pause_seconds or 0,
+                "description": row.description,
+                "pauses": [],
+            }
+        if row.pause_id is not None:
+            current["pauses"].append({
+                "start_time": row.pause_start.isoformat(),
+                "end_time": row.pause_end.isoformat() if row.pause_end else None,
+                "reason": row.pause_reason,
+            })
+
+    if current is not None:
+        yield current
+
+
+def _csv_chunk(sessions: List[Dict[str, Any]], header: bool) -> str:
+    """Блок CSV-строк (пауза сворачивается в 'HH:MM:SS-HH:MM:SS причина')"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(CSV_COLUMNS)
+    for session in sessions:
+        pauses = "; ".join(
+            f"{p['start_time'][11:19]}-{(p['end_time'] or '')[11:19]} {p['reason'] or ''}".strip()
+            for p in session["pauses"]
+        )
+        writer.writerow([
+            session["telegram_id"], session["username"], session["session_id"], session["date"],
+            session["start_time"], session["end_time"], session["work_seconds"],
+            session["pause_seconds"], len(session["pauses"]), pauses, session["description"],
+        ])
+    return buffer.getvalue()
+
+
+def _jsonl_chunk(sessions: List[Dict[str, Any]], header: bool) -> str:
+    """Блок JSONL-строк (по объекту на сессию, паузы вложены)"""
+    return "".join(json.dumps(session, ensure_ascii=False) + "\n" for session in sessions)
+
+
+async def export_timesheet(
+        db: AsyncSession,
+        path: str,
+        fmt: str = "csv",
+        user_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None
+) -> int:
+    """
+    Записать табель в файл path в формате fmt ("csv" или "jsonl").
+    user_id=None - по всем пользователям. Возвращает количество сессий.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    render = _csv_chunk if fmt == "csv" else _jsonl_chunk
+
+    total = 0
+    chunk: List[Dict[str, Any]] = []
+    async with aiofiles.open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            await f.write(render([], header=True))
+
+        async for session in iter_timesheet(db, user_id, date_from, date_to):
+            chunk.append(session)
+            if len(chunk) >= CHUNK_ROWS:
+                await f.write(render(chunk, header=False))
+                total += len(chunk)
+                chunk = []
+
+        if chunk:
+            await f.write(render(chunk, header=False))
+            total += len(chunk)
+
+    return total
+
+
+def export_filename(fmt: str, date_from: Optional[date], date_to: Optional[date]) -> str:
+    """Имя файла выгрузки для отправки в Telegram"""
+    start = date_from.strftime("%Y%m%d") if date_from else "all"
+    end = (date_to or datetime.utcnow().date()).strftime("%Y%m%d")
+    return f"timesheet_{start}_{end}.{fmt}"
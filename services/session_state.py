@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+"""
+Горячее состояние в памяти: активные рабочие сессии и паузы пользователей.
+
+Хранилище заполняется из БД при старте бота (load), дальше обновляется
+по принципу write-through: функции database.py меняют БД и после успешного
+commit() применяют то же изменение здесь. Проверки "идет ли работа / есть ли
+пауза" отвечаются из памяти, в БД уходит только само изменение состояния.
+"""
+
+
+@dataclass
+class ActivePause:
+    """Незавершенная пауза"""
+    id: int
+    start_time: datetime
+    reason: Optional[str] = None
+
+
+@dataclass
+class SessionState:
+    """Незавершенная рабочая сессия пользователя"""
+    session_id: int
+    user_id: int
+    start_time: datetime
+    date: datetime
+    total_pause_seconds: int = 0
+    pauses_count: int = 0  # Количество завершенных пауз
+    pause: Optional[ActivePause] = None
+
+
+class SessionStateStore:
+    """Хранилище активных сессий: user_id -> SessionState"""
+
+    def __init__(self):
+        self._by_user: Dict[int, SessionState] = {}
+        self._by_session: Dict[int, int] = {}  # session_id -> user_id
+        self.loaded = False
+
+    def get(self, user_id: int) -> Optional[SessionState]:
+        """Активная сессия пользователя или None, если рабочий день не начат"""
+        return self._by_user.get(user_id)
+
+    def get_by_session(self, session_id: int) -> Optional[SessionState]:
+        """Состояние по id рабочей сессии"""
+        user_id = self._by_session.get(session_id)
+        return self._by_user.get(user_id) if user_id is not None else None
+
+    def __len__(self) -> int:
+        return len(self._by_user)
+
+    # ==================== ЗАГРУЗКА ====================
+
+    async def load(self, db) -> None:
+        """Перестроить состояние из БД (вызывается при старте бота)"""
+        # Импортируем здесь, чтобы избежать циклических импортов
+        from sqlalchemy import select, func
+        from database import WorkSession, Pause
+
+        completed_pauses = (
+            select(func.count(Pause.id))
+            .where(Pause.session_id == WorkSession.id, Pause.end_time.isnot(None))
+            .scalar_subquery()
+        )
+        sessions = await db.execute(
+            select(WorkSession, completed_pauses).where(WorkSession.end_time.is_(None))
+        )
+
+        self._by_user.clear()
+        self._by_session.clear()
+        for session, pauses_count in sessions:
+            self.session_started(session)
+            self._by_user[session.user_id].total_pause_seconds = session.total_pause_seconds or 0
+            self._by_user[session.user_id].pauses_count = pauses_count
+
+        pauses = await db.execute(
+            select(Pause)
+            .join(WorkSession, Pause.session_id == WorkSession.id)
+            .where(WorkSession.end_time.is_(None), Pause.end_time.is_(None))
+        )
+        for pause in pauses.scalars():
+            self.pause_started(pause)
+
+        self.loaded = True
+
+    # ==================== ИЗМЕНЕНИЯ (после commit) ====================
+
+    def session_started(self, session) -> None:
+        """Началась рабочая сессия"""
+        self._by_user[session.user_id] = SessionState(
+            session_id=session.id,
+            user_id=session.user_id,
+            start_time=session.start_time,
+            date=session.date,
+        )
+        self._by_session[session.id] = session.user_id
+
+    def session_stopped(self, session_id: int) -> None:
+        """Рабочая сессия завершена"""
+        user_id = self._by_session.pop(session_id, None)
+        if user_id is not None:
+            self._by_user.pop(user_id, None)
+
+    def pause_started(self, pause) -> None:
+        """Началась пауза"""
+        state = self.get_by_session(pause.session_id)
+        if state:
+            state.pause = ActivePause(id=pause.id, start_time=pause.start_time, reason=pause.reason)
+
+    def pause_stopped(self, session_id: int, pause_seconds: int) -> None:
+        """Пауза завершена: переносим ее длительность в итоги сессии"""
+        state = self.get_by_session(session_id)
+        if state:
+            state.pause = None
+            state.total_pause_seconds += pause_seconds
+            state.pauses_count += 1
+
+
+# Глобальное хранилище состояния
+session_state = SessionStateStore()
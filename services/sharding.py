@@ -0,0 +1,261 @@
+import asyncio
+import multiprocessing
+import secrets
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+from utils.logger import get_logger
+
+"""
+Несколько процессов-воркеров с разделением пользователей (шардированием).
+
+Один процесс Python занимает одно ядро. В режиме BOT_WORKERS=N основной процесс
+(фронт) только получает апдейты (getUpdates или вебхук) и раздает их воркерам,
+а обрабатывают их N процессов с полным диспетчером:
+
+    Telegram -> фронт -> ShardRouter -> POST 127.0.0.1:SHARD_BASE_PORT+i -> воркер i
+
+- Воркер выбирается по from_user.id апдейта (shard_for_update), поэтому все апдейты
+  пользователя попадают в один процесс: его состояние FSM, открытая сессия
+  и кэш пользователя живут в памяти одного воркера.
+- Апдейты одному воркеру отправляются строго по одному, в порядке получения;
+  воркер сразу отвечает 200 и обрабатывает апдейт в фоне (порядок по пользователю
+  держит UserOrderIsolation воркера).
+- ShardSupervisor запускает воркеры (multiprocessing, spawn), ждет их готовности
+  и перезапускает упавшие с экспоненциальной задержкой. Воркер, упавший
+  max_restarts раз подряд, останавливает супервизор (и фронт, см. join()).
+
+Воркер принимает апдейты только с внутренним секретом (X-Telegram-Bot-Api-Secret-Token),
+который супервизор генерирует при запуске.
+"""
+
+logger = get_logger(__name__)
+
+# Поля апдейта, в которых лежит автор события (message.from, poll_answer.user, ...)
+_AUTHOR_FIELDS = ("from", "user")
+
+
+def shard_for_update(update: Dict[str, Any], shards: int) -> int:
+    """Номер воркера для апдейта в формате Bot API: по id автора, иначе по чату, иначе 0"""
+    if shards <= 1:
+        return 0
+    for name, event in update.items():
+        if name == "update_id" or not isinstance(event, dict):
+            continue
+        for field in _AUTHOR_FIELDS:
+            author = event.get(field)
+            if isinstance(author, dict) and "id" in author:
+                return author["id"] % shards
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"] % shards
+    return 0
+
+
+class ShardSupervisor:
+    """Запуск, ожидание готовности, перезапуск и остановка процессов-воркеров"""
+
+    def __init__(
+            self,
+            workers: int,
+            target: Callable[..., None],
+            base_port: int,
+            host: str = "127.0.0.1",
+            args: tuple = (),
+            max_restarts: int = 5,
+            restart_backoff: float = 1.0,
+            max_backoff: float = 60.0,
+            stable_after: float = 60.0
+    ):
+        self.workers = workers
+        self.target = target  # target(index, workers, port, secret, *args) - функция уровня модуля
+        self.base_port = base_port
+        self.host = host
+        self.args = args
+        self.max_restarts = max_restarts  # Перезапусков воркера подряд, после которых супервизор сдается
+        self.restart_backoff = restart_backoff  # Задержка первого перезапуска, дальше удваивается
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after  # Проработавший столько секунд воркер снова считается здоровым
+        self.secret = secrets.token_urlsafe(24)
+        self.restarts = 0
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._started_at = [0.0] * workers
+        self._crashes = [0] * workers  # Перезапусков подряд по воркерам
+        self._restart_at: List[Optional[float]] = [None] * workers  # Когда перезапустить упавший воркер
+        self._monitor_task: Optional[asyncio.Task] = None
+
+    def port(self, index: int) -> int:
+        return self.base_port + index
+
+    @property
+    def urls(self) -> List[str]:
+        return [f"http://{self.host}:{self.port(index)}" for index in range(self.workers)]
+
+    def _spawn(self, index: int) -> None:
+        process = self._context.Process(
+            target=self.target,
+            args=(index, self.workers, self.port(index), self.secret, *self.args),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        logger.info(f"Воркер {index} запущен (pid {process.pid}, порт {self.port(index)})")
+
+    async def start(self, ready_timeout: float = 60.0) -> None:
+        """Запустить воркеры и дождаться, пока все начнут принимать соединения"""
+        for index in range(self.workers):
+            self._spawn(index)
+        await asyncio.gather(*(self._wait_ready(index, ready_timeout) for index in range(self.workers)))
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def _wait_ready(self, index: int, timeout: float) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                _, writer = await asyncio.open_connection(self.host, self.port(index))
+                writer.close()
+                await writer.wait_closed()
+                return
+            except OSError:
+                process = self._processes[index]
+                if process is not None and not process.is_alive():
+                    raise RuntimeError(f"Воркер {index} завершился при запуске (код {process.exitcode})")
+                if loop.time() > deadline:
+                    raise TimeoutError(f"Воркер {index} не начал принимать апдейты за {timeout:.0f} с")
+                await asyncio.sleep(0.1)
+
+    async def join(self) -> None:
+        """
+        Ждать, пока работает мониторинг. RuntimeError - воркер исчерпал max_restarts
+        (фронт должен остановиться, а не копить апдейты для мертвого воркера)
+        """
+        await asyncio.shield(self._monitor_task)
+
+    async def _monitor(self, interval: float = 1.0) -> None:
+        """Перезапуск упавших воркеров; апдейты для них ждут в очереди ShardRouter"""
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for index, process in enumerate(self._processes):
+                if process is None or process.is_alive():
+                    continue
+
+                if self._restart_at[index] is None:
+                    # Падение замечено впервые: после долгой работы счет начинается заново
+                    if now - self._started_at[index] >= self.stable_after:
+                        self._crashes[index] = 0
+                    if self._crashes[index] >= self.max_restarts:
+                        logger.error(f"Воркер {index} завершился (код {process.exitcode}) "
+                                     f"{self._crashes[index] + 1} раз подряд, перезапуски прекращены")
+                        raise RuntimeError(f"Воркер {index} не удается перезапустить")
+                    delay = min(self.max_backoff, self.restart_backoff * 2 ** self._crashes[index])
+                    self._restart_at[index] = now + delay
+                    logger.error(f"Воркер {index} завершился (код {process.exitcode}), "
+                                 f"перезапуск через {delay:.1f} с")
+
+                if now >= self._restart_at[index]:
+                    self._restart_at[index] = None
+                    self._crashes[index] += 1
+                    self.restarts += 1
+                    self._spawn(index)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Остановить мониторинг и воркеры (SIGTERM, после timeout - SIGKILL)"""
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            # Мониторинг мог уже завершиться с RuntimeError (см. join)
+            await asyncio.gather(self._monitor_task, return_exceptions=True)
+            self._monitor_task = None
+
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Воркер {index} не остановился за {timeout:.0f} с, kill")
+                process.kill()
+                await asyncio.to_thread(process.join)
+        self._processes = [None] * self.workers
+
+
+class ShardRouter:
+    """Раздача апдейтов воркерам: по очереди на воркер, отправка по одному в порядке получения"""
+
+    def __init__(
+            self,
+            urls: List[str],
+            path: str,
+            secret: str,
+            max_pending: int = 1000,
+            retry_delay: float = 0.5
+    ):
+        self.urls = [url + path for url in urls]
+        self.secret = secret
+        self.max_pending = max_pending  # На воркер; при переполнении route() ждет (обратное давление)
+        self.retry_delay = retry_delay
+        self.forwarded = [0] * len(urls)
+        self.dropped = 0
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._http: Optional[ClientSession] = None
+
+    def start(self) -> None:
+        self._http = ClientSession(timeout=ClientTimeout(total=30))
+        self._queues = [asyncio.Queue(self.max_pending) for _ in self.urls]
+        self._tasks = [asyncio.create_task(self._forward(index)) for index in range(len(self.urls))]
+
+    async def route(self, update: Dict[str, Any]) -> None:
+        """Поставить апдейт в очередь его воркера"""
+        await self._queues[shard_for_update(update, len(self.urls))].put(update)
+
+    async def join(self) -> None:
+        """Дождаться отправки всех принятых апдейтов"""
+        await asyncio.gather(*(queue.join() for queue in self._queues))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http:
+            await self._http.close()
+            self._http = None
+
+    async def _forward(self, index: int) -> None:
+        queue, url = self._queues[index], self.urls[index]
+        headers = {"X-Telegram-Bot-Api-Secret-Token": self.secret}
+        while True:
+            update = await queue.get()
+            try:
+                await self._post(index, url, update, headers)
+            finally:
+                queue.task_done()
+
+    async def _post(self, index: int, url: str, update: Dict[str, Any], headers: Dict[str, str]) -> None:
+        attempt = 0
+        while True:
+            try:
+                async with self._http.post(url, json=update, headers=headers) as response:
+                    if response.status == 200:
+                        self.forwarded[index] += 1
+                    else:
+                        self.dropped += 1
+                        logger.error(f"Воркер {index} отклонил апдейт {update.get('update_id')}: "
+                                     f"HTTP {response.status}")
+                    return
+            except (ClientError, asyncio.TimeoutError) as e:
+                # Воркер перезапускается - ждем его, порядок апдейтов пользователя сохраняется
+                attempt += 1
+                if attempt == 1 or attempt % 20 == 0:
+                    logger.warning(f"Воркер {index} недоступен ({e}), апдейт {update.get('update_id')} "
+                                   f"ждет, попытка {attempt}")
+                await asyncio.sleep(self.retry_delay)
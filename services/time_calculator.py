@@ -0,0 +1,202 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import (User, Pause, WorkSession, get_user_state, user_cache, writer,
+                      create_work_session, stop_work_session, start_pause, stop_pause)
+from services.session_state import ActivePause, SessionState, session_state
+
+"""
+Сервис учета времени: начало/конец рабочего дня и паузы.
+
+Единая логика для команд (handlers/time_tracking.py) и кнопок (handlers/callbacks.py):
+обработчики только показывают результат или текст ошибки.
+
+Состояние пользователя (сам пользователь, открытая сессия, открытая пауза,
+число пауз) берется из памяти (кэш пользователей + session_state), а если
+его там нет - одним запросом get_user_state. Изменения пишутся через общую
+пишущую задачу (database.writer) условными запросами: проверка состояния
+в памяти - только для текста ответа, а от гонок (двойное нажатие, два процесса)
+защищает само условие в SQL (end_time IS NULL).
+"""
+
+
+# ==================== ОШИБКИ ====================
+
+class TimeTrackingError(Exception):
+    """Действие невозможно в текущем состоянии пользователя"""
+
+
+class NotRegistered(TimeTrackingError):
+    """Пользователь не прошел /start"""
+
+
+class NoActiveSession(TimeTrackingError):
+    """Рабочий день не начат"""
+
+
+class SessionAlreadyStarted(TimeTrackingError):
+    """Рабочий день уже идет"""
+
+    def __init__(self, session: SessionState):
+        super().__init__(session.session_id)
+        self.session = session
+
+
+class NoActivePause(TimeTrackingError):
+    """Сейчас нет перерыва"""
+
+
+class PauseAlreadyStarted(TimeTrackingError):
+    """Перерыв уже идет"""
+
+
+# ==================== СОСТОЯНИЕ ====================
+
+@dataclass
+class UserState:
+    """Пользователь и его открытая сессия (с паузой и итогами пауз)"""
+    user: User
+    session: Optional[SessionState] = None
+
+    def require_session(self) -> SessionState:
+        if self.session is None:
+            raise NoActiveSession()
+        return self.session
+
+
+@dataclass
+class WorkSummary:
+    """Итог завершенного рабочего дня"""
+    start_time: datetime
+    end_time: datetime
+    work_seconds: Optional[int]
+    pause_seconds: int
+
+
+@dataclass
+class PauseSummary:
+    """Итог завершенной паузы и пауз сессии с ее учетом"""
+    reason: Optional[str]
+    duration_seconds: int
+    pauses_count: int
+    total_pause_seconds: int
+
+
+async def get_state(db: AsyncSession, telegram_id: int) -> UserState:
+    """
+    Состояние пользователя. Из памяти, если пользователь в кэше и активные сессии
+    загружены при старте; иначе - одним запросом к БД. NotRegistered, если нет пользователя.
+    """
+    user = user_cache.get(telegram_id)
+    if user is not None and session_state.loaded:
+        return UserState(user, session_state.get(user.id))
+
+    row = await get_user_state(db, telegram_id)
+    if row is None:
+        raise NotRegistered()
+
+    user, session, pause, pauses_count = row
+    user_cache.set(telegram_id, user)
+    if session_state.loaded:
+        # Память - источник правды об открытых сессиях, из запроса нужен только пользователь
+        return UserState(user, session_state.get(user.id))
+    return UserState(user, _session_from_row(session, pause, pauses_count))
+
+
+def _session_from_row(session: Optional[WorkSession], pause: Optional[Pause],
+                      pauses_count: int) -> Optional[SessionState]:
+    if session is None:
+        return None
+    return SessionState(
+        session_id=session.id,
+        user_id=session.user_id,
+        start_time=session.start_time,
+        date=session.date,
+        total_pause_seconds=session.total_pause_seconds or 0,
+        pauses_count=pauses_count or 0,
+        pause=ActivePause(id=pause.id, start_time=pause.start_time, reason=pause.reason) if pause else None,
+    )
+
+
+# ==================== ДЕЙСТВИЯ ====================
+
+async def start_work(db: AsyncSession, telegram_id: int, description: str = "Рабочий день начат") -> WorkSession:
+    """Начать рабочий день"""
+    state = await get_state(db, telegram_id)
+    if state.session is not None:
+        raise SessionAlreadyStarted(state.session)
+
+    session = await writer.run(create_work_session, state.user.id, description)
+    if session is None:
+        # Параллельное нажатие успело раньше
+        state = await get_state(db, telegram_id)
+        if state.session is None:
+            raise TimeTrackingError("Не удалось начать рабочий день")
+        raise SessionAlreadyStarted(state.session)
+    return session
+
+
+async def stop_work(db: AsyncSession, telegram_id: int) -> WorkSummary:
+    """Завершить рабочий день"""
+    session = (await get_state(db, telegram_id)).require_session()
+    stopped = await writer.run(stop_work_session, session.session_id)
+    if stopped is None:
+        raise NoActiveSession()
+    return WorkSummary(
+        start_time=stopped.start_time,
+        end_time=stopped.end_time,
+        work_seconds=stopped.total_work_seconds,
+        pause_seconds=stopped.total_pause_seconds or 0,
+    )
+
+
+async def begin_pause(db: AsyncSession, telegram_id: int, reason: Optional[str]) -> Pause:
+    """Начать паузу в текущем рабочем дне"""
+    session = (await get_state(db, telegram_id)).require_session()
+    if session.pause is not None:
+        raise PauseAlreadyStarted()
+
+    pause = await writer.run(start_pause, session.session_id, reason)
+    if pause is None:
+        # Параллельно успели завершить сессию или начать паузу
+        if (await get_state(db, telegram_id)).session is None:
+            raise NoActiveSession()
+        raise PauseAlreadyStarted()
+    return pause
+
+
+async def end_pause(db: AsyncSession, telegram_id: int) -> PauseSummary:
+    """Завершить текущую паузу. NoActivePause, если перерыва нет"""
+    session = (await get_state(db, telegram_id)).require_session()
+    if session.pause is None:
+        raise NoActivePause()
+
+    # Итоги до завершения: session_state обновится после commit
+    pauses_count, total_pause_seconds = session.pauses_count, session.total_pause_seconds
+    stopped = await writer.run(stop_pause, session.pause.id)
+    if stopped is None:
+        raise NoActivePause()
+    duration = stopped.duration_seconds or 0
+    return PauseSummary(
+        reason=stopped.reason,
+        duration_seconds=duration,
+        pauses_count=pauses_count + 1,
+        total_pause_seconds=total_pause_seconds + duration,
+    )
+
+
+# ==================== РАСЧЕТЫ ====================
+
+def pause_elapsed_seconds(pause: ActivePause, now: Optional[datetime] = None) -> int:
+    """Сколько длится текущая пауза"""
+    return int(((now or datetime.utcnow()) - pause.start_time).total_seconds())
+
+
+def format_hours_minutes(seconds: Optional[int]) -> Optional[str]:
+    """'Xч Yмин' или None, если время неизвестно. Единый формат длительностей для всех ответов"""
+    if seconds is None:
+        return None
+    return f"{seconds // 3600}ч {(seconds % 3600) // 60}мин"
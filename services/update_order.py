@@ -0,0 +1,71 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict, Optional
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+from services.metrics import Metrics
+
+"""
+Порядок обработки апдейтов: по очереди для одного пользователя, параллельно для разных.
+
+UserOrderIsolation - events_isolation диспетчера aiogram. FSMContextMiddleware
+берет ее замок по ключу пользователя в чате до чтения состояния FSM и держит
+до конца обработки апдейта, поэтому:
+
+- апдейты одного пользователя выполняются строго в порядке прихода, и каждый
+  видит состояние, оставленное предыдущим: /pause и следующее сразу за ним
+  сообщение с причиной паузы (PauseStates.waiting_for_reason) не переставятся;
+- апдейты разных пользователей выполняются параллельно, но не больше
+  max_concurrent одновременно (общий пул).
+
+Место в пуле занимается только после очереди пользователя: десять нажатий
+одного пользователя ждут друг друга, а не держат слоты, нужные остальным.
+Очередь пользователя удаляется, когда в ней не остается апдейтов.
+"""
+
+
+class _UserQueue:
+    """Очередь апдейтов одного пользователя: замок и число ожидающих"""
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # Будит ожидающих в порядке прихода (FIFO)
+        self.pending = 0
+
+
+class UserOrderIsolation(BaseEventIsolation):
+    """Очередь на каждого пользователя + общий пул из max_concurrent обработок"""
+
+    def __init__(self, max_concurrent: int = 64, registry: Optional[Metrics] = None):
+        self.max_concurrent = max_concurrent
+        self.registry = registry
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._queues: Dict[StorageKey, _UserQueue] = {}
+
+    @property
+    def active_users(self) -> int:
+        """Пользователей, у которых есть выполняющиеся или ожидающие апдейты"""
+        return len(self._queues)
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _UserQueue()
+        queue.pending += 1
+        arrived = time.perf_counter()
+        try:
+            async with queue.lock:
+                async with self._slots:
+                    if self.registry:
+                        self.registry.observe_update_wait(time.perf_counter() - arrived)
+                    yield
+        finally:
+            queue.pending -= 1
+            if not queue.pending:
+                del self._queues[key]
+
+    async def close(self) -> None:
+        self._queues.clear()
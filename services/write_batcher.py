@@ -0,0 +1,198 @@
+import asyncio
+import random
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from utils.logger import get_logger
+
+"""
+Групповая фиксация записей (group commit).
+
+SQLite допускает одну пишущую транзакцию за раз и делает fsync на каждый commit.
+Когда каждое нажатие кнопки пишет в своей транзакции, параллельные апдейты
+ждут друг друга и получают "database is locked".
+
+GroupCommitWriter - единственная пишущая задача процесса. Вызывающий код
+отдает ей функцию записи (намерение) и ждет результата:
+
+    session = await writer.run(create_work_session, user_id, "Рабочий день начат")
+
+Намерения, пришедшие за delay секунд от постановки первого из них
+(не больше max_batch), выполняются по очереди в одной транзакции
+и фиксируются одним commit(). Одиночное намерение (в очереди больше
+никого нет) выполняется сразу, без ожидания. Каждый вызывающий
+получает результат своей функции после commit() своего пакета.
+
+- Ошибка одного намерения откатывает пакет; пакет повторяется без него,
+  а исключение получает только его автор.
+- "database is locked" / "busy" - пакет откатывается и повторяется
+  с экспоненциальной задержкой (до max_retries раз).
+
+Функции записи получают сессию первым аргументом (как функции database.py)
+и могут выполниться повторно, поэтому все их побочные эффекты должны
+идти через after_commit().
+"""
+
+logger = get_logger(__name__)
+
+WriteFunc = Callable[..., Awaitable[Any]]
+
+
+def is_lock_error(error: BaseException) -> bool:
+    """Конфликт блокировок SQLite: повтор транзакции имеет смысл"""
+    message = str(error).lower()
+    return isinstance(error, OperationalError) and ("locked" in message or "busy" in message)
+
+
+class _Intent:
+    """Функция записи с аргументами и future для ответа вызывающему"""
+    __slots__ = ("func", "args", "kwargs", "future", "queued_at")
+
+    def __init__(self, func: WriteFunc, args: tuple, kwargs: dict, future: asyncio.Future, queued_at: float):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.queued_at = queued_at  # loop.time() постановки в очередь
+
+
+class GroupCommitWriter:
+    """Единственная пишущая задача: пакетирует записи в одну транзакцию на несколько мс"""
+
+    def __init__(
+            self,
+            session_pool: async_sessionmaker[AsyncSession],
+            delay: float = 0.005,
+            max_batch: int = 100,
+            max_retries: int = 5,
+            retry_backoff: float = 0.01
+    ):
+        self.session_pool = session_pool
+        self.delay = delay  # Окно сбора попутчиков от постановки первого намерения, сек
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff  # Первая задержка повтора, дальше удваивается
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Статистика для бенчмарков и метрик
+        self.batches = 0
+        self.writes = 0
+        self.retries = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Запустить пишущую задачу (в работающем event loop)"""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Дописать все принятые намерения и остановить задачу"""
+        task, self._task = self._task, None  # Новые вызовы уже идут напрямую
+        if task is None:
+            return
+        await self._queue.put(None)  # Маркер остановки - после всех принятых намерений
+        await task
+        self._queue = None
+
+    async def run(self, func: WriteFunc, *args, **kwargs) -> Any:
+        """
+        Выполнить func(db, *args, **kwargs) в ближайшем пакете и дождаться его commit().
+        Если задача не запущена (скрипты, тесты) - выполняется сразу в отдельной транзакции.
+        """
+        if self._task is None:
+            async with self.session_pool() as db:
+                result = await func(db, *args, **kwargs)
+                await db.commit()
+                return result
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put(_Intent(func, args, kwargs, future, loop.time()))
+        return await future
+
+    # ==================== ПИШУЩАЯ ЗАДАЧА ====================
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+
+            # Собираем попутчиков: ждем остаток окна delay от постановки первого,
+            # только если в очереди уже кто-то есть; одиночное намерение не ждет
+            if self.delay and not self._queue.empty():
+                wait = first.queued_at + self.delay - asyncio.get_running_loop().time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                intent = self._queue.get_nowait()
+                if intent is None:
+                    stopping = True
+                    break
+                batch.append(intent)
+
+            try:
+                await self._run_batch(batch)
+            except Exception:
+                logger.exception("Ошибка пакетной записи")
+
+    async def _run_batch(self, batch: List[_Intent]) -> None:
+        """Выполнить намерения одной транзакцией, повторяя при блокировках"""
+        pending = [intent for intent in batch if not intent.future.done()]  # Отмененные вызывающими пропускаем
+        attempt = 0
+
+        while pending:
+            results: List[Tuple[_Intent, Any]] = []
+            failed: Optional[Tuple[_Intent, BaseException]] = None
+            try:
+                async with self.session_pool() as db:
+                    for intent in pending:
+                        try:
+                            results.append((intent, await intent.func(db, *intent.args, **intent.kwargs)))
+                        except Exception as e:
+                            if is_lock_error(e):
+                                raise
+                            failed = (intent, e)
+                            break
+
+                    if failed:
+                        await db.rollback()
+                    else:
+                        await db.commit()
+            except Exception as e:
+                if not is_lock_error(e) or attempt >= self.max_retries:
+                    for intent in pending:
+                        if not intent.future.done():
+                            intent.future.set_exception(e)
+                    return
+
+                attempt += 1
+                self.retries += 1
+                backoff = self.retry_backoff * 2 ** (attempt - 1)
+                logger.warning(f"БД заблокирована, повтор пакета из {len(pending)} записей через {backoff * 1000:.0f} мс")
+                await asyncio.sleep(backoff * random.uniform(0.5, 1.5))
+                continue
+
+            if failed:
+                # Автор ошибки получает исключение, остальные - повтор без него
+                intent, error = failed
+                pending.remove(intent)
+                if not intent.future.done():
+                    intent.future.set_exception(error)
+                continue
+
+            self.batches += 1
+            self.writes += len(results)
+            for intent, result in results:
+                if not intent.future.done():
+                    intent.future.set_result(result)
+            return
@@ -0,0 +1,291 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123456:test-token")
+
+from aiogram import Router  # noqa: E402
+from aiogram.dispatcher.event.handler import HandlerObject  # noqa: E402
+from aiogram.filters.callback_data import CallbackData  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.types import CallbackQuery, Chat, Message, Update, User  # noqa: E402
+
+from handlers import callbacks as callback_handlers  # noqa: E402
+from keyboards.callback_data import LEGACY_CALLBACKS, MenuAction, MenuCallback, PauseAction, PauseCallback  # noqa: E402
+from middlewares.idempotency import IdempotencyMiddleware  # noqa: E402
+from middlewares.metrics import HandlerMetricsMiddleware  # noqa: E402
+from services.metrics import Metrics  # noqa: E402
+from services.update_order import UserOrderIsolation  # noqa: E402
+from utils.callback_router import CallbackRouter  # noqa: E402
+
+"""
+Обработка апдейтов: повторная доставка, двойные нажатия, порядок по пользователям,
+маршрутизация кнопок и метрики обработчиков.
+
+Запуск: python -m unittest tests.test_handlers
+"""
+
+
+class FakeBot:
+    """Запоминает ответы на нажатия вместо запросов к Bot API"""
+
+    def __init__(self):
+        self.answered = []
+
+    async def answer_callback_query(self, callback_query_id: str, **kwargs):
+        self.answered.append(callback_query_id)
+        return True
+
+
+def callback_update(update_id: int, data: str, user_id: int = 1) -> Update:
+    user = User(id=user_id, is_bot=False, first_name="Test")
+    message = Message(message_id=1, date=datetime.now(), chat=Chat(id=user_id, type="private"), text="menu")
+    return Update(
+        update_id=update_id,
+        callback_query=CallbackQuery(id=str(update_id), from_user=user, chat_instance="test", data=data,
+                                     message=message)
+    )
+
+
+def message_update(update_id: int, text: str, user_id: int = 1) -> Update:
+    return Update(
+        update_id=update_id,
+        message=Message(message_id=update_id, date=datetime.now(), chat=Chat(id=user_id, type="private"),
+                        from_user=User(id=user_id, is_bot=False, first_name="Test"), text=text)
+    )
+
+
+class IdempotencyMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.registry = Metrics()
+        self.middleware = IdempotencyMiddleware(ring_size=4, window=0.2, registry=self.registry)
+        self.bot = FakeBot()
+        self.calls = []
+
+    async def handler(self, event: Update, data: dict):
+        self.calls.append(event.update_id)
+        await asyncio.sleep(0.02)
+        return f"result {event.update_id}"
+
+    async def feed(self, update: Update):
+        return await self.middleware(self.handler, update, {"bot": self.bot})
+
+    async def feed_in_order(self, isolation: UserOrderIsolation, update: Update):
+        """Как в диспетчере: outer-middleware выполняется под блокировкой пользователя"""
+        user_id = update.callback_query.from_user.id
+        async with isolation.lock(storage_key(user_id)):
+            return await self.feed(update)
+
+    async def test_redelivered_update_is_dropped(self):
+        await self.feed(message_update(1, "/today"))
+        await asyncio.sleep(0.3)  # Окно склейки прошло - отбрасывает именно update_id
+
+        self.assertIsNone(await self.feed(message_update(1, "/today")))
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(self.registry.updates_suppressed["redelivered"], 1)
+
+    async def test_ring_forgets_old_updates(self):
+        for update_id in range(1, 6):
+            await self.feed(message_update(update_id, f"text {update_id}"))
+
+        await self.feed(message_update(1, "text 1 again"))
+
+        self.assertEqual(self.calls, [1, 2, 3, 4, 5, 1])
+
+    async def test_double_tap_runs_handler_once(self):
+        first = await self.feed(callback_update(1, "menu:start_work"))
+        second = await self.feed(callback_update(2, "menu:start_work"))
+
+        self.assertEqual(self.calls, [1])
+        self.assertEqual([first, second], ["result 1", "result 1"])
+        self.assertEqual(self.bot.answered, ["2"])  # "Часики" второго нажатия погашены
+        self.assertEqual(self.registry.updates_suppressed["coalesced"], 1)
+
+    async def test_repeated_action_after_other_action_runs_again(self):
+        # Пауза -> Отмена -> Пауза внутри окна: вторая Пауза - новое действие, а не двойное нажатие
+        await self.feed(callback_update(1, "menu:pause"))
+        await self.feed(callback_update(2, "pause:cancel"))
+        result = await self.feed(callback_update(3, "menu:pause"))
+
+        self.assertEqual(self.calls, [1, 2, 3])
+        self.assertEqual(result, "result 3")
+        self.assertEqual(self.registry.updates_suppressed["coalesced"], 0)
+
+    async def test_concurrent_taps_are_coalesced_under_user_lock(self):
+        # Второе нажатие приходит, пока первое выполняется: блокировка пользователя
+        # пропускает его после первого, и оно попадает в окно склейки
+        isolation = UserOrderIsolation(max_concurrent=10)
+        results = await asyncio.gather(
+            self.feed_in_order(isolation, callback_update(1, "menu:start_work")),
+            self.feed_in_order(isolation, callback_update(2, "menu:start_work")),
+        )
+
+        self.assertEqual(self.calls, [1])
+        self.assertEqual(results, ["result 1", "result 1"])
+
+    async def test_tap_after_window_runs_again(self):
+        await self.feed(callback_update(1, "menu:start_work"))
+        await asyncio.sleep(0.3)
+
+        await self.feed(callback_update(2, "menu:start_work"))
+
+        self.assertEqual(self.calls, [1, 2])
+
+    async def test_different_actions_and_users_are_not_coalesced(self):
+        await asyncio.gather(
+            self.feed(callback_update(1, "menu:start_work")),
+            self.feed(callback_update(2, "menu:pause")),
+            self.feed(callback_update(3, "menu:start_work", user_id=2)),
+            self.feed(message_update(4, "menu:start_work")),
+        )
+
+        self.assertEqual(sorted(self.calls), [1, 2, 3, 4])
+
+    async def test_failed_action_is_repeated(self):
+        async def failing_once(event: Update, data: dict):
+            self.calls.append(event.update_id)
+            if len(self.calls) == 1:
+                raise RuntimeError("boom")
+            return "ok"
+
+        with self.assertRaises(RuntimeError):
+            await self.middleware(failing_once, callback_update(1, "pause:stop"), {"bot": self.bot})
+        second = await self.middleware(failing_once, callback_update(2, "pause:stop"), {"bot": self.bot})
+
+        self.assertEqual(second, "ok")
+        self.assertEqual(self.calls, [1, 2])
+
+
+def storage_key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+
+
+class UserOrderIsolationTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.isolation = UserOrderIsolation(max_concurrent=3, registry=Metrics())
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+
+    async def process(self, user_id: int, step: int, duration: float):
+        async with self.isolation.lock(storage_key(user_id)):
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+            self.events.append((user_id, step, "start"))
+            await asyncio.sleep(duration)
+            self.events.append((user_id, step, "end"))
+            self.running -= 1
+
+    async def test_user_updates_run_in_arrival_order(self):
+        # Первый шаг самый медленный: без очереди второй и третий закончились бы раньше
+        await asyncio.gather(*(self.process(1, step, duration) for step, duration in enumerate([0.05, 0.01, 0])))
+
+        self.assertEqual(self.events, [
+            (1, 0, "start"), (1, 0, "end"),
+            (1, 1, "start"), (1, 1, "end"),
+            (1, 2, "start"), (1, 2, "end"),
+        ])
+
+    async def test_different_users_run_concurrently_within_pool(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self.process(user_id, 0, 0.05) for user_id in range(6)))
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(self.max_running, 3)
+        self.assertLess(elapsed, 0.25)  # Два "захода" по 3 пользователя, а не 6 по очереди
+
+    async def test_waiting_user_does_not_hold_pool_slots(self):
+        # 5 апдейтов одного пользователя в очереди не мешают двум другим пользователям
+        busy = [self.process(1, step, 0.05) for step in range(5)]
+        others = [self.process(user_id, 0, 0) for user_id in (2, 3)]
+        await asyncio.gather(*busy, *others)
+
+        first_end_of_user1 = self.events.index((1, 0, "end"))
+        self.assertLess(self.events.index((2, 0, "end")), first_end_of_user1)
+        self.assertLess(self.events.index((3, 0, "end")), first_end_of_user1)
+
+    async def test_queues_are_removed_when_empty(self):
+        await asyncio.gather(*(self.process(user_id, 0, 0) for user_id in range(10)))
+
+        self.assertEqual(self.isolation.active_users, 0)
+        self.assertEqual(self.isolation.registry.update_wait.count, 10)
+
+
+class DemoCallback(CallbackData, prefix="demo"):
+    action: str
+
+
+class CallbackRouterTest(unittest.TestCase):
+    """Таблица кнопок бота: старые строки callback_data ведут туда же, что и новые"""
+
+    def setUp(self):
+        self.router = callback_handlers.callbacks
+
+    def test_legacy_callbacks_resolve_like_factories(self):
+        fallback, _ = self.router.resolve("unknown:data")
+        for old, new in LEGACY_CALLBACKS.items():
+            with self.subTest(old=old):
+                old_handler, old_data = self.router.resolve(old)
+                new_handler, new_data = self.router.resolve(new)
+
+                self.assertIsNot(old_handler, fallback)
+                self.assertIs(old_handler, new_handler)
+                self.assertEqual(old_data, new_data)
+
+    def test_legacy_callbacks_reach_expected_handlers(self):
+        cases = {
+            "main_manu": (callback_handlers.process_main_menu, MenuCallback(action=MenuAction.MAIN)),
+            "pause_stop": (callback_handlers.process_pause_stop, PauseCallback(action=PauseAction.STOP)),
+            "pause_reason:lunch": (callback_handlers.process_pause_reason,
+                                   PauseCallback(action=PauseAction.REASON, reason="lunch")),
+        }
+        for old, (callback, callback_data) in cases.items():
+            with self.subTest(old=old):
+                handler, data = self.router.resolve(old)
+                self.assertIs(handler.callback, callback)
+                self.assertEqual(data, callback_data)
+
+    def test_unknown_callback_goes_to_fallback(self):
+        handler, data = self.router.resolve("stats_year")
+
+        self.assertIs(handler.callback, callback_handlers.process_unknown_callback)
+        self.assertIsNone(data)
+
+
+class HandlerMetricsMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.registry = Metrics()
+        self.middleware = HandlerMetricsMiddleware(self.registry)
+        self.callbacks = CallbackRouter(Router())
+
+        @self.callbacks.handler(DemoCallback, "open")
+        async def open_menu(callback: CallbackQuery, callback_data: DemoCallback):
+            return "opened"
+
+    async def feed(self, data: str):
+        handler = HandlerObject(callback=self.callbacks._dispatch)
+        update = callback_update(1, data)
+        return await self.middleware(
+            lambda event, kwargs: handler.call(event, **kwargs), update.callback_query, {"handler": handler}
+        )
+
+    async def test_button_is_timed_under_routed_handler(self):
+        self.assertEqual(await self.feed(DemoCallback(action="open").pack()), "opened")
+
+        self.assertEqual(list(self.registry.handler_latency), ["test_handlers.open_menu"])
+
+    async def test_unrouted_button_is_timed_under_dispatch(self):
+        self.assertIsNone(await self.feed("unknown:data"))
+
+        self.assertEqual(list(self.registry.handler_latency), ["callback_router._dispatch"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,825 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("BOT_TOKEN", "123456:test-token")
+
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.methods import SendMessage  # noqa: E402
+from aiohttp import web  # noqa: E402
+from sqlalchemy import Date, func, insert, literal, select, update  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+
+import database  # noqa: E402
+from config import DatabaseConfig  # noqa: E402
+from database import DailyStats, FsmState, Pause, Reminder, User, WorkSession  # noqa: E402
+from services import report_generator  # noqa: E402
+from services.fsm_storage import DatabaseStorage  # noqa: E402
+from services.notification import LONG_PAUSE, START_DAY, ReminderScheduler  # noqa: E402
+from services.outbound_queue import OutboundQueue  # noqa: E402
+from services.session_state import SessionStateStore  # noqa: E402
+from services.sharding import ShardRouter, ShardSupervisor, shard_for_update  # noqa: E402
+from services.write_batcher import GroupCommitWriter  # noqa: E402
+
+"""
+Сервисы: переходы состояний учета времени под параллельными нажатиями,
+состояние сессий в памяти после commit и отката, групповая фиксация записей,
+хранилище состояний FSM, статистика по периодам и выгрузка табеля,
+рассылка напоминаний, очередь отправки и раздача апдейтов процессам-воркерам.
+
+Каждое "нажатие" - отдельная транзакция (как у двух апдейтов или двух процессов)
+или отдельное намерение в одном пакете GroupCommitWriter. Изменение должно
+примениться ровно один раз: повторы получают None и ничего не меняют.
+
+Запуск: python -m unittest tests.test_services
+"""
+
+TAPS = 5  # Сколько одинаковых нажатий приходит одновременно
+
+
+class DatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """Временная SQLite-БД со схемой и одним пользователем на каждый тест"""
+
+    async def asyncSetUp(self):
+        database.user_cache.clear()  # Кэш пользователей общий для процесса, а БД у каждого теста своя
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = database.make_engine(
+            DatabaseConfig(url=f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}", sqlite_profile="production")
+        )
+        async with self.engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.create_all)
+        self.session_pool = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+
+        async with self.session_pool() as db:
+            self.user = await database.add_user(db, telegram_id=id(self), username="tester")
+            await db.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.tmp.cleanup()
+
+    async def scalar(self, query):
+        async with self.session_pool() as db:
+            return (await db.execute(query)).scalar()
+
+
+class TimeTrackingConcurrencyTest(DatabaseTestCase):
+
+    async def tap(self, func, *args):
+        """Одно нажатие: отдельная сессия и транзакция"""
+        async with self.session_pool() as db:
+            result = await func(db, *args)
+            await db.commit()
+            return result
+
+    async def taps(self, func, *args):
+        """TAPS одинаковых нажатий одновременно; возвращает успешные результаты"""
+        results = await asyncio.gather(*(self.tap(func, *args) for _ in range(TAPS)))
+        return [result for result in results if result is not None]
+
+    async def start_session(self) -> WorkSession:
+        return await self.tap(database.create_work_session, self.user.id, "test")
+
+    async def backdate_pause(self, pause_id: int, seconds: int) -> None:
+        """Сдвинуть начало паузы в прошлое, чтобы длительность была ненулевой"""
+        async with self.session_pool() as db:
+            await db.execute(
+                update(Pause).where(Pause.id == pause_id)
+                .values(start_time=datetime.utcnow() - timedelta(seconds=seconds))
+            )
+            await db.commit()
+
+    # ==================== РАБОЧИЙ ДЕНЬ ====================
+
+    async def test_start_work_twice_creates_one_session(self):
+        created = await self.taps(database.create_work_session, self.user.id, "test")
+
+        self.assertEqual(len(created), 1)
+        open_sessions = await self.scalar(
+            select(func.count()).select_from(WorkSession)
+            .where(WorkSession.user_id == self.user.id, WorkSession.end_time.is_(None))
+        )
+        self.assertEqual(open_sessions, 1)
+
+    async def test_stop_work_twice_counts_session_once(self):
+        session = await self.start_session()
+
+        stopped = await self.taps(database.stop_work_session, session.id)
+
+        self.assertEqual(len(stopped), 1)
+        self.assertIsNotNone(stopped[0].end_time)
+        sessions_count = await self.scalar(
+            select(DailyStats.sessions_count).where(DailyStats.user_id == self.user.id)
+        )
+        self.assertEqual(sessions_count, 1)
+
+    async def test_start_work_after_stop(self):
+        session = await self.start_session()
+        await self.tap(database.stop_work_session, session.id)
+
+        self.assertIsNotNone(await self.start_session())
+
+    # ==================== ПАУЗЫ ====================
+
+    async def test_start_pause_twice_creates_one_pause(self):
+        session = await self.start_session()
+
+        started = await self.taps(database.start_pause, session.id, "Обед")
+
+        self.assertEqual(len(started), 1)
+        pauses = await self.scalar(select(func.count()).select_from(Pause).where(Pause.session_id == session.id))
+        self.assertEqual(pauses, 1)
+
+    async def test_start_pause_in_finished_session(self):
+        session = await self.start_session()
+        await self.tap(database.stop_work_session, session.id)
+
+        self.assertIsNone(await self.tap(database.start_pause, session.id, "Обед"))
+
+    async def test_stop_pause_twice_adds_duration_once(self):
+        session = await self.start_session()
+        pause = await self.tap(database.start_pause, session.id, "Обед")
+        await self.backdate_pause(pause.id, 120)
+
+        stopped = await self.taps(database.stop_pause, pause.id)
+
+        self.assertEqual(len(stopped), 1)
+        duration = stopped[0].duration_seconds
+        self.assertGreaterEqual(duration, 120)
+        total_pause = await self.scalar(
+            select(WorkSession.total_pause_seconds).where(WorkSession.id == session.id)
+        )
+        self.assertEqual(total_pause, duration)
+
+    async def test_daily_stats_count_pauses_with_finished_session(self):
+        session = await self.start_session()
+        pause = await self.tap(database.start_pause, session.id, "Обед")
+        await self.backdate_pause(pause.id, 120)
+        duration = (await self.tap(database.stop_pause, pause.id)).duration_seconds
+
+        # Пока сессия открыта, ни работа, ни ее паузы в сводку не попадают
+        self.assertIsNone(await self.scalar(select(DailyStats.day).where(DailyStats.user_id == self.user.id)))
+
+        stopped = await self.tap(database.stop_work_session, session.id)
+
+        async with self.session_pool() as db:
+            daily = (await db.execute(select(DailyStats).where(DailyStats.user_id == self.user.id))).scalar_one()
+        self.assertEqual(daily.work_seconds, stopped.total_work_seconds)
+        self.assertEqual(daily.pause_seconds, duration)
+
+    async def test_stop_work_includes_finished_pauses(self):
+        session = await self.start_session()
+        for _ in range(2):
+            pause = await self.tap(database.start_pause, session.id, None)
+            await self.backdate_pause(pause.id, 60)
+            await self.tap(database.stop_pause, pause.id)
+
+        stopped = await self.tap(database.stop_work_session, session.id)
+
+        self.assertGreaterEqual(stopped.total_pause_seconds, 120)
+
+    async def test_stop_work_during_pause_closes_it(self):
+        session = await self.start_session()
+        async with self.session_pool() as db:
+            await db.execute(
+                update(WorkSession).where(WorkSession.id == session.id)
+                .values(start_time=datetime.utcnow() - timedelta(seconds=600))
+            )
+            await db.commit()
+        pause = await self.tap(database.start_pause, session.id, "Обед")
+        await self.backdate_pause(pause.id, 120)
+
+        stopped = await self.tap(database.stop_work_session, session.id)
+
+        async with self.session_pool() as db:
+            closed = await db.get(Pause, pause.id)
+            daily = (await db.execute(select(DailyStats).where(DailyStats.user_id == self.user.id))).scalar_one()
+        self.assertEqual(closed.end_time, stopped.end_time)
+        self.assertEqual(stopped.total_pause_seconds, closed.duration_seconds)
+        self.assertGreaterEqual(stopped.total_pause_seconds, 120)
+        self.assertEqual(daily.pause_seconds, stopped.total_pause_seconds)
+        self.assertEqual(daily.work_seconds, stopped.total_work_seconds)
+        self.assertEqual(
+            stopped.total_work_seconds,
+            int((stopped.end_time - stopped.start_time).total_seconds()) - stopped.total_pause_seconds
+        )
+
+    # ==================== ОДИН ПАКЕТ GROUP COMMIT ====================
+
+    async def test_double_taps_in_one_batch(self):
+        writer = GroupCommitWriter(self.session_pool, delay=0.01)
+        writer.start()
+        try:
+            sessions = await asyncio.gather(
+                *(writer.run(database.create_work_session, self.user.id, "test") for _ in range(TAPS))
+            )
+            session = next(s for s in sessions if s is not None)
+            pauses = await asyncio.gather(
+                *(writer.run(database.start_pause, session.id, "Обед") for _ in range(TAPS))
+            )
+            pause = next(p for p in pauses if p is not None)
+            await self.backdate_pause(pause.id, 30)
+            stopped = await asyncio.gather(*(writer.run(database.stop_pause, pause.id) for _ in range(TAPS)))
+        finally:
+            await writer.stop()
+
+        self.assertEqual(sum(s is not None for s in sessions), 1)
+        self.assertEqual(sum(p is not None for p in pauses), 1)
+        self.assertEqual(sum(p is not None for p in stopped), 1)
+        total_pause = await self.scalar(
+            select(WorkSession.total_pause_seconds).where(WorkSession.id == session.id)
+        )
+        self.assertEqual(total_pause, next(p for p in stopped if p is not None).duration_seconds)
+
+
+class SessionStateWriteThroughTest(DatabaseTestCase):
+    """Состояние в памяти меняется только после commit(); откат его не трогает"""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.state = SessionStateStore()
+        patcher = mock.patch.object(database, "session_state", self.state)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_rolled_back_start_leaves_state_empty(self):
+        async with self.session_pool() as db:
+            self.assertIsNotNone(await database.create_work_session(db, self.user.id, "test"))
+            await db.rollback()
+
+        self.assertIsNone(self.state.get(self.user.id))
+
+    async def test_rolled_back_changes_keep_committed_state(self):
+        async with self.session_pool() as db:
+            session = await database.create_work_session(db, self.user.id, "test")
+            await db.commit()
+        self.assertEqual(self.state.get(self.user.id).session_id, session.id)
+
+        async with self.session_pool() as db:
+            pause = await database.start_pause(db, session.id, "Обед")
+            await database.stop_pause(db, pause.id)
+            await database.stop_work_session(db, session.id)
+            await db.rollback()
+
+        state = self.state.get(self.user.id)
+        self.assertEqual(state.session_id, session.id)
+        self.assertIsNone(state.pause)
+        self.assertEqual((state.pauses_count, state.total_pause_seconds), (0, 0))
+
+    async def test_replayed_batch_applies_state_once(self):
+        async def broken(db):
+            raise ValueError("broken")
+
+        writer = GroupCommitWriter(self.session_pool, delay=0.01)
+        writer.start()
+        try:
+            session, failed = await asyncio.gather(
+                writer.run(database.create_work_session, self.user.id, "test"),
+                writer.run(broken),
+                return_exceptions=True
+            )
+        finally:
+            await writer.stop()
+
+        # Первая попытка пакета откатилась вместе с ошибкой, состояние - от повтора
+        self.assertIsInstance(failed, ValueError)
+        self.assertEqual(self.state.get(self.user.id).session_id, session.id)
+        self.assertEqual(len(self.state), 1)
+
+
+class GroupCommitWriterTest(DatabaseTestCase):
+
+    async def add_reminder(self, db, kind: str, fail: bool = False) -> str:
+        await db.execute(insert(Reminder).values(user_id=self.user.id, kind=kind, sent_at=datetime.utcnow()))
+        if fail:
+            raise ValueError(kind)
+        return kind
+
+    async def reminder_kinds(self):
+        async with self.session_pool() as db:
+            return set((await db.execute(select(Reminder.kind))).scalars())
+
+    async def test_single_intent_is_not_delayed(self):
+        writer = GroupCommitWriter(self.session_pool, delay=1)
+        writer.start()
+        try:
+            started = asyncio.get_running_loop().time()
+            await writer.run(self.add_reminder, "alone")
+            elapsed = asyncio.get_running_loop().time() - started
+        finally:
+            await writer.stop()
+
+        self.assertLess(elapsed, 0.5)
+
+    async def test_failed_intent_is_dropped_and_batch_replayed(self):
+        writer = GroupCommitWriter(self.session_pool, delay=0.01)
+        writer.start()
+        try:
+            results = await asyncio.gather(
+                writer.run(self.add_reminder, "first"),
+                writer.run(self.add_reminder, "broken", fail=True),
+                writer.run(self.add_reminder, "last"),
+                return_exceptions=True
+            )
+        finally:
+            await writer.stop()
+
+        self.assertEqual(results[0], "first")
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], "last")
+        # Запись упавшего намерения откачена вместе с пакетом, остальные зафиксированы одним commit
+        self.assertEqual(await self.reminder_kinds(), {"first", "last"})
+        self.assertEqual((writer.batches, writer.writes), (1, 2))
+
+    async def test_lock_error_retries_with_backoff(self):
+        attempts = []
+
+        async def locked_twice(db):
+            attempts.append(asyncio.get_running_loop().time())
+            if len(attempts) <= 2:
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            return await self.add_reminder(db, "retried")
+
+        writer = GroupCommitWriter(self.session_pool, retry_backoff=0.05)
+        writer.start()
+        try:
+            result = await writer.run(locked_twice)
+        finally:
+            await writer.stop()
+
+        self.assertEqual(result, "retried")
+        self.assertEqual(writer.retries, 2)
+        # Задержки 0.05 и 0.1 с (со случайным множителем 0.5-1.5)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.025)
+        self.assertGreaterEqual(attempts[2] - attempts[1], 0.05)
+        self.assertEqual(await self.reminder_kinds(), {"retried"})
+
+    async def test_lock_error_gives_up_after_max_retries(self):
+        async def always_locked(db):
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+        writer = GroupCommitWriter(self.session_pool, max_retries=2, retry_backoff=0.001)
+        writer.start()
+        try:
+            with self.assertRaises(OperationalError):
+                await writer.run(always_locked)
+        finally:
+            await writer.stop()
+
+        self.assertEqual(writer.retries, 2)
+
+
+class DatabaseStorageTest(DatabaseTestCase):
+
+    def key(self, user_id: int = 1) -> StorageKey:
+        return StorageKey(bot_id=42, chat_id=user_id, user_id=user_id)
+
+    def storage(self, **kwargs) -> DatabaseStorage:
+        kwargs.setdefault("ttl", 3600)
+        return DatabaseStorage(self.session_pool, flush_interval=3600, cache_size=100, **kwargs)
+
+    async def test_state_and_data_survive_restart(self):
+        storage = self.storage()
+        await storage.set_state(self.key(), "PauseStates:reason")
+        await storage.set_data(self.key(), {"reason": "Обед"})
+        await storage.close()
+
+        restarted = self.storage()  # Пустой кэш - читает из БД
+        self.assertEqual(await restarted.get_state(self.key()), "PauseStates:reason")
+        self.assertEqual(await restarted.get_data(self.key()), {"reason": "Обед"})
+
+    async def test_cleared_state_is_deleted(self):
+        storage = self.storage()
+        await storage.set_state(self.key(), "PauseStates:reason")
+        await storage.flush()
+        await storage.set_state(self.key(), None)
+        await storage.close()
+
+        self.assertEqual(await self.scalar(select(func.count()).select_from(FsmState)), 0)
+
+    async def test_abandoned_state_expires(self):
+        async with self.session_pool() as db:
+            db.add(FsmState(key=self.storage().key_builder.build(self.key()), state="PauseStates:reason",
+                            data='{"reason": "Обед"}', updated_at=datetime.utcnow() - timedelta(hours=2)))
+            await db.commit()
+
+        storage = self.storage()
+        self.assertIsNone(await storage.get_state(self.key()))
+        self.assertEqual(await storage.get_data(self.key()), {})
+
+        # Первый сброс заодно удаляет брошенные состояния из таблицы
+        await storage.set_state(self.key(2), "PauseStates:reason")
+        await storage.close()
+        self.assertEqual(await self.scalar(select(func.count()).select_from(FsmState)), 1)
+
+    async def test_updates_during_flush_are_not_lost(self):
+        writer = GroupCommitWriter(self.session_pool, delay=0.05)
+        writer.start()
+        storage = self.storage(writer=writer)
+        try:
+            await storage.set_data(self.key(1), {"step": 1})
+            await storage.set_data(self.key(2), {"step": 1})
+
+            # Сброс ждет в пакете writer, а тем временем ключи меняются снова
+            flushing = asyncio.create_task(storage.flush())
+            await asyncio.sleep(0)
+            await asyncio.gather(*(storage.set_data(self.key(user_id), {"step": 2}) for user_id in (1, 3)))
+            self.assertEqual(await storage.get_data(self.key(1)), {"step": 2})
+            await flushing
+            await storage.close()
+        finally:
+            await writer.stop()
+
+        restarted = self.storage()
+        for user_id, step in ((1, 2), (2, 1), (3, 2)):
+            self.assertEqual(await restarted.get_data(self.key(user_id)), {"step": step})
+
+
+class StatsAggregationTest(DatabaseTestCase):
+    """
+    Статистика по периодам и выгрузка табеля на известном наборе сессий:
+    вс 29.03.2026 - A, пн 30.03 - B и C, ср 01.04 - D и незавершенная E.
+    """
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        # Вставляем не по порядку дат, чтобы порядок выгрузки не совпадал с порядком id
+        self.d = await self.add_session(datetime(2026, 4, 1, 9), datetime(2026, 4, 1, 10))
+        self.e = await self.add_session(datetime(2026, 4, 1, 11), None)
+        self.a = await self.add_session(
+            datetime(2026, 3, 29, 9, 0, 0, 250000), datetime(2026, 3, 29, 17, 0, 0, 100000),
+            pauses=[(datetime(2026, 3, 29, 12), datetime(2026, 3, 29, 12, 30), "Обед"),
+                    (datetime(2026, 3, 29, 15), datetime(2026, 3, 29, 15, 30), None)]
+        )
+        self.b = await self.add_session(datetime(2026, 3, 30, 10), datetime(2026, 3, 30, 12))
+        self.c = await self.add_session(
+            datetime(2026, 3, 30, 13), datetime(2026, 3, 30, 14, 30),
+            pauses=[(datetime(2026, 3, 30, 13, 40), datetime(2026, 3, 30, 13, 50), "Звонок")]
+        )
+        async with self.session_pool() as db:
+            await database.rebuild_daily_stats(db, self.user.id)
+            await db.commit()
+
+    async def add_session(self, start: datetime, end, pauses=(), user_id: int = None) -> WorkSession:
+        async with self.session_pool() as db:
+            session = WorkSession(
+                user_id=user_id or self.user.id, date=start, start_time=start, end_time=end, created_at=start,
+                total_pause_seconds=sum(int((p_end - p_start).total_seconds()) for p_start, p_end, _ in pauses)
+            )
+            db.add(session)
+            await db.flush()
+            for p_start, p_end, reason in pauses:
+                db.add(Pause(session_id=session.id, start_time=p_start, end_time=p_end, reason=reason))
+            await db.commit()
+            return session
+
+    def periods(self, stats):
+        return [
+            (b['period'], b['work_seconds'], b['pause_seconds'], b['sessions_count'], b['days_count'])
+            for b in stats['buckets']
+        ]
+
+    # ==================== SQL-ВЫРАЖЕНИЯ ====================
+
+    async def test_week_starts_on_monday(self):
+        cases = {
+            date(2026, 3, 29): "2026-03-23",  # Воскресенье - последний день предыдущей недели
+            date(2026, 3, 30): "2026-03-30",  # Понедельник - сам себе начало недели
+            date(2026, 4, 1): "2026-03-30",
+            date(2026, 4, 5): "2026-03-30",
+        }
+        for day, monday in cases.items():
+            with self.subTest(day=day):
+                self.assertEqual(await self.scalar(select(database.bucket_of(literal(day, Date), "week", "sqlite"))),
+                                 monday)
+
+    async def test_seconds_between_matches_python(self):
+        for session in (self.a, self.b, self.c, self.d):
+            with self.subTest(session=session.id):
+                seconds = await self.scalar(
+                    select(database.seconds_between(WorkSession.start_time, WorkSession.end_time, "sqlite"))
+                    .where(WorkSession.id == session.id)
+                )
+                self.assertEqual(seconds, int((session.end_time - session.start_time).total_seconds()))
+        self.assertEqual(self.a.total_work_seconds, 25199)  # 7:59:59.85 минус час пауз
+
+    # ==================== ПЕРИОДЫ ====================
+
+    async def test_period_stats_by_week_and_month(self):
+        async with self.session_pool() as db:
+            weeks = await database.get_period_stats(db, self.user.id, "week")
+            months = await database.get_period_stats(db, self.user.id, "month")
+            days = await database.get_period_stats(db, self.user.id, "day", date_from=date(2026, 3, 30))
+
+        self.assertEqual(self.periods(weeks), [
+            ("2026-03-30", 7200 + 4800 + 3600, 600, 3, 2),
+            ("2026-03-23", 25199, 3600, 1, 1),
+        ])
+        self.assertEqual(self.periods(months), [
+            ("2026-04", 3600, 0, 1, 1),
+            ("2026-03", 25199 + 7200 + 4800, 3600 + 600, 3, 2),
+        ])
+        self.assertEqual(self.periods(days), [
+            ("2026-04-01", 3600, 0, 1, 1),
+            ("2026-03-30", 7200 + 4800, 600, 2, 1),
+        ])
+        for stats in (weeks, months):
+            self.assertEqual(stats['totals'], {
+                'total_work_seconds': 40799, 'total_pause_seconds': 4200,
+                'sessions_count': 4, 'days_count': 3, 'productivity': 90,
+            })
+
+    async def test_sessions_daily_stats_totals(self):
+        async with self.session_pool() as db:
+            stats = await database.get_sessions_daily_stats(db, self.user.id, since=datetime(2026, 3, 1))
+            recent = await database.get_sessions_daily_stats(db, self.user.id, since=datetime(2026, 3, 30))
+
+        # Незавершенная E не учитывается, время работы совпадает с WorkSession.total_work_seconds
+        self.assertEqual(self.periods(stats), [
+            ("2026-04-01", self.d.total_work_seconds, 0, 1, 1),
+            ("2026-03-30", self.b.total_work_seconds + self.c.total_work_seconds, 600, 2, 1),
+            ("2026-03-29", self.a.total_work_seconds, 3600, 1, 1),
+        ])
+        self.assertEqual(stats['totals'], {
+            'total_work_seconds': 40799, 'total_pause_seconds': 4200,
+            'sessions_count': 4, 'days_count': 3, 'productivity': 90,
+        })
+        self.assertEqual(recent['totals']['total_work_seconds'], 15600)
+        self.assertEqual(recent['totals']['days_count'], 2)
+
+    # ==================== ВЫГРУЗКА ====================
+
+    async def export(self, fmt: str, **kwargs) -> str:
+        path = os.path.join(self.tmp.name, f"timesheet.{fmt}")
+        async with self.session_pool() as db:
+            await report_generator.export_timesheet(db, path, fmt, **kwargs)
+        with open(path, encoding="utf-8", newline="") as f:
+            return f.read()
+
+    async def test_export_rows_in_date_order(self):
+        async with self.session_pool() as db:
+            other = await database.add_user(db, telegram_id=id(self) + 1, username="other")
+            await db.commit()
+        await self.add_session(datetime(2026, 3, 30, 9), datetime(2026, 3, 30, 10), user_id=other.id)
+
+        # Блоки по 2 сессии: порядок и группировка пауз не должны зависеть от границ блоков
+        with mock.patch.object(report_generator, "CHUNK_ROWS", 2):
+            rows = list(csv.DictReader(io.StringIO(await self.export("csv", user_id=self.user.id))))
+            lines = (await self.export("jsonl", user_id=self.user.id)).splitlines()
+
+        expected_ids = [self.a.id, self.b.id, self.c.id, self.d.id, self.e.id]
+        self.assertEqual([int(row["session_id"]) for row in rows], expected_ids)
+        self.assertEqual([json.loads(line)["session_id"] for line in lines], expected_ids)
+
+        first = rows[0]
+        self.assertEqual(first["date"], "2026-03-29")
+        self.assertEqual(first["work_seconds"], "25199")
+        self.assertEqual(first["pause_seconds"], "3600")
+        self.assertEqual(first["pauses_count"], "2")
+        self.assertEqual(first["pauses"], "12:00:00-12:30:00 Обед; 15:00:00-15:30:00")
+        self.assertEqual(rows[-1]["end_time"], "")
+        self.assertEqual(rows[-1]["work_seconds"], "")
+
+        session_c = json.loads(lines[2])
+        self.assertEqual(session_c["work_seconds"], 4800)
+        self.assertEqual(session_c["pauses"], [
+            {"start_time": "2026-03-30T13:40:00", "end_time": "2026-03-30T13:50:00", "reason": "Звонок"},
+        ])
+
+    async def test_export_filters(self):
+        async with self.session_pool() as db:
+            other = await database.add_user(db, telegram_id=id(self) + 1, username="other")
+            await db.commit()
+        await self.add_session(datetime(2026, 3, 30, 9), datetime(2026, 3, 30, 10), user_id=other.id)
+
+        lines = (await self.export("jsonl", date_from=date(2026, 3, 30), date_to=date(2026, 3, 30))).splitlines()
+
+        self.assertEqual(
+            [(json.loads(line)["username"], json.loads(line)["start_time"][11:16]) for line in lines],
+            [("other", "09:00"), ("tester", "10:00"), ("tester", "13:00")]
+        )
+
+
+class RecordingBot:
+    """Бот, который запоминает отправленные сообщения и сколько отметок было в БД в момент отправки"""
+
+    def __init__(self, test: DatabaseTestCase):
+        self.test = test
+        self.sent = []
+
+    async def send_message(self, chat_id: int, text: str):
+        marked = await self.test.scalar(select(func.count()).select_from(Reminder))
+        self.sent.append((chat_id, marked))
+        await asyncio.sleep(0.01)
+
+
+class ReminderDeliveryTest(DatabaseTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        async with self.session_pool() as db:
+            for telegram_id in range(1, 5):
+                await database.add_user(db, telegram_id=telegram_id, username=f"user{telegram_id}")
+            await db.commit()
+        self.bot = RecordingBot(self)
+        self.scheduler = ReminderScheduler(self.bot, self.session_pool, chunk_size=2)
+
+    async def notify(self) -> int:
+        return await self.scheduler._notify(
+            select(User.id, User.telegram_id), START_DAY, datetime.utcnow(), lambda row: "Доброе утро"
+        )
+
+    async def test_chunks_are_marked_before_sending(self):
+        self.assertEqual(await self.notify(), 5)
+        self.assertEqual(self.bot.sent, [])  # Цикл планировщика не ждет отправки
+
+        self.assertEqual(await self.scheduler._deliveries[START_DAY], 5)
+
+        # Части по 2 получателя: каждая отмечена в reminders до отправки своих сообщений
+        self.assertEqual([marked for _, marked in self.bot.sent], [2, 2, 4, 4, 5])
+        self.assertEqual(await self.scalar(select(func.count()).select_from(Reminder)), 5)
+
+    async def test_no_new_query_while_delivering(self):
+        await self.notify()
+
+        self.assertEqual(await self.notify(), 0)
+        await self.scheduler.stop()
+
+    async def test_long_pause_only_in_open_sessions(self):
+        now = datetime.utcnow()
+        long_ago = now - timedelta(hours=2)
+        async with self.session_pool() as db:
+            working = (await db.execute(select(User).where(User.telegram_id == 1))).scalar_one()
+            # Старая сессия, завершенная до исправления stop_work_session: пауза осталась открытой
+            closed = WorkSession(user_id=self.user.id, date=long_ago, start_time=long_ago, end_time=now)
+            open_session = WorkSession(user_id=working.id, date=long_ago, start_time=long_ago)
+            db.add_all([closed, open_session])
+            await db.flush()
+            db.add_all([Pause(session_id=closed.id, start_time=long_ago),
+                        Pause(session_id=open_session.id, start_time=long_ago)])
+            await db.commit()
+
+        await self.scheduler._run_long_pause(now)
+        await self.scheduler._deliveries[LONG_PAUSE]
+
+        self.assertEqual([chat_id for chat_id, _ in self.bot.sent], [1])
+
+
+class OutboundQueueTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.queue = OutboundQueue(global_rate=1000, chat_rate=1000, chat_burst=1000)
+        self.queue.start()
+
+    async def asyncTearDown(self):
+        await self.queue.stop()
+
+    async def test_stop_fails_pending_requests(self):
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "sent"
+
+        first = asyncio.create_task(self.queue.submit(1, slow))
+        second = asyncio.create_task(self.queue.submit(1, slow))
+        await asyncio.sleep(0.01)  # Первый запрос выполняется, второй ждет в очереди чата
+
+        stopping = asyncio.create_task(self.queue.stop())
+        await asyncio.sleep(0.01)
+        release.set()
+        await stopping
+
+        self.assertEqual(await first, "sent")
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(second, 1)
+        self.assertEqual(self.queue.pending, 0)
+
+    async def test_retry_after_pauses_whole_bot(self):
+        sent = []
+
+        async def limited():
+            if not sent:
+                sent.append("429")
+                raise TelegramRetryAfter(method=SendMessage(chat_id=1, text="x"), message="Flood", retry_after=1)
+            sent.append("ok")
+            return "ok"
+
+        async def other_chat():
+            sent.append("other")
+            return "ok"
+
+        first = asyncio.create_task(self.queue.submit(1, limited))
+        await asyncio.sleep(0.05)
+        await self.queue.submit(2, other_chat)  # Ждет конца паузы, хотя чат другой
+
+        self.assertEqual(sent, ["429", "ok", "other"])
+        self.assertEqual(await first, "ok")
+
+    async def test_cancelled_caller_is_not_sent(self):
+        calls = []
+
+        async def call():
+            calls.append(1)
+
+        waiting = asyncio.create_task(self.queue.submit(1, call))
+        waiting.cancel()
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(calls, [])
+        self.assertEqual(self.queue.pending, 0)
+
+
+class ShardingTest(unittest.IsolatedAsyncioTestCase):
+
+    def test_shard_by_author(self):
+        message = {"update_id": 1, "message": {"from": {"id": 7}, "chat": {"id": -100}}}
+        callback = {"update_id": 2, "callback_query": {"from": {"id": 7}, "message": {"chat": {"id": 7}}}}
+        poll_answer = {"update_id": 3, "poll_answer": {"user": {"id": 7}}}
+
+        for raw_update in (message, callback, poll_answer):
+            self.assertEqual(shard_for_update(raw_update, 4), 3)
+
+    def test_shard_without_author(self):
+        channel_post = {"update_id": 1, "channel_post": {"chat": {"id": 10}}}
+
+        self.assertEqual(shard_for_update(channel_post, 4), 2)
+        self.assertEqual(shard_for_update({"update_id": 2}, 4), 0)
+        self.assertEqual(shard_for_update(channel_post, 1), 0)
+
+    async def test_router_keeps_order_per_worker(self):
+        received = {0: [], 1: []}
+        runners = []
+
+        for index in received:
+            async def handle(request: web.Request, index=index) -> web.Response:
+                self.assertEqual(request.headers["X-Telegram-Bot-Api-Secret-Token"], "secret")
+                await asyncio.sleep(0.001 * (index + 1))
+                received[index].append((await request.json())["update_id"])
+                return web.Response()
+
+            app = web.Application()
+            app.router.add_post("/webhook", handle)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", 0).start()
+            runners.append(runner)
+
+        urls = [f"http://127.0.0.1:{runner.addresses[0][1]}" for runner in runners]
+        router = ShardRouter(urls, "/webhook", "secret")
+        router.start()
+        try:
+            for update_id in range(20):
+                await router.route({"update_id": update_id, "message": {"from": {"id": update_id % 4}}})
+            await router.join()
+        finally:
+            await router.stop()
+            for runner in runners:
+                await runner.cleanup()
+
+        self.assertEqual(received[0], [i for i in range(20) if i % 4 in (0, 2)])
+        self.assertEqual(received[1], [i for i in range(20) if i % 4 in (1, 3)])
+        self.assertEqual(router.forwarded, [10, 10])
+
+    async def test_supervisor_backs_off_and_gives_up(self):
+        spawned = []
+
+        class CrashingProcess:
+            """Воркер, который падает сразу после запуска"""
+            pid = None
+            exitcode = 1
+
+            def __init__(self, **kwargs):
+                spawned.append(asyncio.get_running_loop().time())
+
+            def start(self):
+                pass
+
+            def is_alive(self):
+                return False
+
+        supervisor = ShardSupervisor(1, target=print, base_port=0, max_restarts=3, restart_backoff=0.02)
+        supervisor._context = type("Context", (), {"Process": CrashingProcess})
+        supervisor._spawn(0)
+
+        with self.assertRaises(RuntimeError):
+            await asyncio.wait_for(supervisor._monitor(interval=0.001), 5)
+
+        self.assertEqual(supervisor.restarts, 3)
+        gaps = [later - earlier for earlier, later in zip(spawned, spawned[1:])]
+        for attempt, gap in enumerate(gaps):
+            self.assertGreaterEqual(gap, 0.02 * 2 ** attempt)
+
+
+if __name__ == "__main__":
+    unittest.main()
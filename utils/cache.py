@@ -0,0 +1,53 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+"""
+Простой ограниченный LRU-кэш с временем жизни записей (TTL)
+"""
+
+
+class TTLCache:
+    """
+    LRU-кэш на OrderedDict: не больше maxsize записей,
+    каждая запись живет не дольше ttl секунд.
+    Рассчитан на использование из одного event loop (без блокировок).
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Получить значение или None, если записи нет или она устарела"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        # Помечаем запись как недавно использованную
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Положить значение в кэш (на ttl секунд, по умолчанию self.ttl), вытесняя самую старую запись"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Удалить запись (инвалидация)"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очистить кэш"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,85 @@
+from contextvars import ContextVar
+from enum import Enum
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple, Type
+
+from aiogram import Router, types
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters.callback_data import CallbackData
+
+"""
+Маршрутизация callback-кнопок по таблице вместо цепочки фильтров.
+
+Вместо проверки callback.data каждым фильтром по очереди роутер регистрирует
+в aiogram один обработчик, который:
+1. берет префикс до первого разделителя и по словарю находит фабрику CallbackData;
+2. распаковывает данные и по значению первого поля находит обработчик в словаре.
+Стоимость маршрутизации не зависит от количества кнопок.
+
+Найденный обработчик записывается в current_route (для метрик и логов:
+в aiogram зарегистрирован только общий _dispatch).
+"""
+
+Handler = Callable[..., Any]
+
+# Обработчик, выбранный CallbackRouter для текущего апдейта (None - таблица не использовалась)
+current_route: ContextVar[Optional[CallableObject]] = ContextVar("current_route", default=None)
+
+
+class CallbackRouter:
+    """Таблица обработчиков: (префикс фабрики, значение первого поля) -> обработчик"""
+
+    def __init__(self, router: Router, aliases: Optional[Mapping[str, str]] = None):
+        self._factories: Dict[str, Tuple[Type[CallbackData], str]] = {}
+        self._handlers: Dict[Tuple[str, str], CallableObject] = {}
+        self._aliases = dict(aliases or {})  # Старые строки callback_data -> новые
+        self._fallback: Optional[CallableObject] = None
+        router.callback_query.register(self._dispatch)
+
+    @staticmethod
+    def _key_value(value: Any) -> str:
+        return value.value if isinstance(value, Enum) else str(value)
+
+    def handler(self, factory: Type[CallbackData], key: Any) -> Callable[[Handler], Handler]:
+        """Декоратор: обработчик для кнопок factory, у которых первое поле равно key"""
+        prefix = factory.__prefix__
+        key_field = next(iter(factory.model_fields))
+        registered = self._factories.setdefault(prefix, (factory, key_field))
+        if registered[0] is not factory:
+            raise ValueError(f"Префикс '{prefix}' уже занят фабрикой {registered[0].__name__}")
+
+        def decorator(callback: Handler) -> Handler:
+            self._handlers[(prefix, self._key_value(key))] = CallableObject(callback)
+            return callback
+
+        return decorator
+
+    def fallback(self, callback: Handler) -> Handler:
+        """Декоратор: обработчик кнопок, для которых в таблице ничего не нашлось"""
+        self._fallback = CallableObject(callback)
+        return callback
+
+    def resolve(self, data: str) -> Tuple[Optional[CallableObject], Optional[CallbackData]]:
+        """Найти обработчик и распакованные данные для строки callback_data"""
+        data = self._aliases.get(data, data)
+        prefix = data.split(":", 1)[0]
+        registered = self._factories.get(prefix)
+        if registered is None:
+            return self._fallback, None
+
+        factory, key_field = registered
+        try:
+            callback_data = factory.unpack(data)
+        except (TypeError, ValueError):
+            return self._fallback, None
+
+        handler = self._handlers.get((prefix, self._key_value(getattr(callback_data, key_field))))
+        if handler is None:
+            return self._fallback, None
+        return handler, callback_data
+
+    async def _dispatch(self, callback: types.CallbackQuery, **data: Any) -> Any:
+        handler, callback_data = self.resolve(callback.data or "")
+        current_route.set(handler)
+        if handler is None:
+            return None
+        return await handler.call(callback, callback_data=callback_data, **data)
@@ -0,0 +1,130 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+from config import config, LogConfig
+
+"""
+Неблокирующее логирование.
+
+Обработчики и функции БД только кладут запись в очередь (QueueHandler) -
+это быстро и не делает I/O. Форматирование в JSON, запись в файл с ротацией
+по размеру и вывод в консоль выполняет фоновый поток QueueListener.
+
+К каждой записи добавляются update_id и user_id текущего апдейта
+(их выставляет LogContextMiddleware через contextvars).
+"""
+
+update_id_var: ContextVar[Optional[int]] = ContextVar("update_id", default=None)
+user_id_var: ContextVar[Optional[int]] = ContextVar("user_id", default=None)
+
+_listener: Optional[QueueListener] = None
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    QueueHandler, который в потоке вызывающего кода только собирает данные записи:
+    контекст апдейта (contextvars недоступны в потоке записи) и текст сообщения.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.update_id = update_id_var.get()
+        record.user_id = user_id_var.get()
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # В очередь кладем без аргументов и объекта исключения - их не нужно передавать в другой поток
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("update_id", "user_id"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Читаемый формат для консоли с контекстом апдейта"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        update_id = getattr(record, "update_id", None)
+        if update_id is not None:
+            text += f" [update_id={update_id} user_id={getattr(record, 'user_id', None)}]"
+        return text
+
+
+def setup_logging(log_config: LogConfig = config.log, console: bool = True) -> QueueListener:
+    """
+    Перенастроить корневой логгер на очередь и запустить фоновый поток записи.
+    Повторный вызов ничего не делает. Поток останавливается stop_logging() или при выходе.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handlers = []
+
+    file_handler = RotatingFileHandler(
+        log_config.file,
+        maxBytes=log_config.max_bytes,
+        backupCount=log_config.backup_count,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    handlers.append(file_handler)
+
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(ContextQueueHandler(log_queue))
+    root.setLevel(log_config.level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """Дописать оставшиеся записи и остановить поток записи"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер модуля (пишет через очередь после setup_logging)"""
+    return logging.getLogger(name)
@@ -0,0 +1,32 @@
+from typing import Optional
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+
+from config import config
+
+"""
+Ответ на нажатие инлайн-кнопки одним сообщением.
+
+В режиме edit-in-place (BOT_EDIT_IN_PLACE, по умолчанию включен) результат действия
+заменяет текст сообщения с кнопками, а клавиатура остается под ним - один запрос
+editMessageText вместо нового сообщения с результатом и еще одного с меню.
+"""
+
+
+async def show(callback: types.CallbackQuery, text: str,
+               reply_markup: Optional[types.InlineKeyboardMarkup] = None) -> None:
+    """Показать результат действия по кнопке в том же сообщении (или новым, если нельзя)"""
+    message = callback.message
+    if config.bot.edit_in_place and isinstance(message, types.Message):
+        try:
+            await message.edit_text(text, reply_markup=reply_markup)
+            return
+        except TelegramBadRequest as e:
+            # Повторное нажатие той же кнопки - сообщение уже показывает этот результат
+            if "message is not modified" in str(e):
+                return
+            # Сообщение слишком старое или без текста - отправим новое
+
+    chat_id = message.chat.id if message else callback.from_user.id
+    await callback.bot.send_message(chat_id, text, reply_markup=reply_markup)